@@ -1,18 +1,18 @@
 """
 Attendance Excel Export Utility
 
-Automatically exports attendance records to Excel files.
+Builds the attendance sheet of one lecture date. The sheet is produced by the
+ATTENDANCE_EXCEL background job and downloaded through the job endpoints.
 """
-import os
+import io
 from datetime import datetime
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from django.conf import settings
 
 
 def export_attendance_to_excel(course_offering, attendance_date, attendance_records):
     """
-    Export attendance records to an Excel file.
+    Export attendance records to an Excel workbook.
     
     Args:
         course_offering: CourseOffering instance
@@ -20,18 +20,13 @@ def export_attendance_to_excel(course_offering, attendance_date, attendance_reco
         attendance_records: List of Attendance objects
         
     Returns:
-        str: Path to the generated Excel file
+        tuple: (file name, workbook content as bytes)
     """
-    # Create media/attendance directory if it doesn't exist
-    attendance_dir = os.path.join(settings.MEDIA_ROOT, 'attendance')
-    os.makedirs(attendance_dir, exist_ok=True)
-    
     # Generate filename
     date_str = attendance_date.strftime('%Y-%m-%d')
     subject_code = course_offering.subject.code if course_offering.subject else 'UNKNOWN'
     level_name = course_offering.level.get_name_display() if course_offering.level else 'UNKNOWN'
     filename = f"attendance_{subject_code}_{level_name}_{date_str}.xlsx"
-    filepath = os.path.join(attendance_dir, filename)
     
     # Create workbook
     wb = Workbook()
@@ -124,8 +119,37 @@ def export_attendance_to_excel(course_offering, attendance_date, attendance_reco
     ws.column_dimensions['D'].width = 15
     ws.column_dimensions['E'].width = 30
     
-    # Save file
-    wb.save(filepath)
-    
-    # Return relative path for URL generation
-    return os.path.join('attendance', filename)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return filename, buffer.getvalue()
+
+
+def export_attendance_for_date(course_offering, attendance_date):
+    """
+    Load the attendance taken for a course offering on one date and export it.
+
+    Returns:
+        tuple: (file name, workbook content as bytes)
+    """
+    from .models import Attendance
+
+    records = list(
+        Attendance.objects.filter(course_offering=course_offering, date=attendance_date)
+        .select_related('student')
+        .order_by('student__full_name')
+    )
+    return export_attendance_to_excel(course_offering, attendance_date, records)
+
+
+def run_attendance_excel_job(ctx):
+    """Background job: generate the attendance sheet of one lecture date"""
+    from .models import CourseOffering
+
+    course_offering = CourseOffering.objects.select_related('subject', 'level', 'doctor').get(
+        id=ctx.params['course_offering_id']
+    )
+    attendance_date = datetime.strptime(ctx.params['date'], '%Y-%m-%d').date()
+
+    filename, content = export_attendance_for_date(course_offering, attendance_date)
+    path = ctx.save_result_file(filename, content)
+    return {'file': path}
@@ -0,0 +1,22 @@
+"""
+Database helpers shared by the bulk write paths.
+"""
+from django.db import connection
+
+
+def bulk_upsert(model, objs, unique_fields, update_fields, batch_size=500):
+    """Insert or update a list of unsaved instances in batched upsert statements.
+
+    MySQL infers the conflict target from the table's unique keys and rejects an
+    explicit one, so unique_fields is only passed where the backend supports it.
+    """
+    if not objs:
+        return []
+    options = {
+        'update_conflicts': True,
+        'update_fields': update_fields,
+        'batch_size': batch_size,
+    }
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = unique_fields
+    return model.objects.bulk_create(objs, **options)
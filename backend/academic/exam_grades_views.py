@@ -6,14 +6,88 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser
 from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
 import pandas as pd
 
-from .models import ExamGrade, Student, Subject, Level, AcademicYear
+from .models import ExamGrade, PendingExamGradeCount, Student, Subject, Level, AcademicYear, BackgroundJob
+from .jobs import enqueue, job_accepted
+from .structure_cache import academic_structure
+from .spreadsheet import iter_spreadsheet, read_header, check_upload, SpreadsheetError
 from users.permissions import IsAdminRole, IsStudentAffairsRole, IsStudentRole, IsDeanRole, HasPaidTuition
 
 
 from rest_framework.permissions import IsAdminUser
 
+# Approvals update at most this many rows (in primary key order) per transaction
+APPROVE_CHUNK_SIZE = 1000
+
+
+def refresh_pending_counts(level_ids):
+    """Recount the unapproved exam grades of the given levels into PendingExamGradeCount.
+
+    One grouped query per call; (level, year) pairs left without pending
+    grades lose their row so the table only holds levels awaiting approval.
+    """
+    from .db_utils import bulk_upsert
+
+    level_ids = list(level_ids)
+    counts = list(
+        ExamGrade.objects.filter(level_id__in=level_ids, is_approved=False)
+        .values('level_id', 'academic_year_id')
+        .annotate(
+            pending=Count('id'),
+            midterm=Count('id', filter=Q(midterm_grade__isnull=False)),
+            final=Count('id', filter=Q(final_grade__isnull=False)),
+        )
+        .order_by()
+    )
+    now = timezone.now()
+    bulk_upsert(
+        PendingExamGradeCount,
+        [
+            PendingExamGradeCount(
+                level_id=row['level_id'],
+                academic_year_id=row['academic_year_id'],
+                pending_count=row['pending'],
+                midterm_count=row['midterm'],
+                final_count=row['final'],
+                updated_at=now,
+            )
+            for row in counts
+        ],
+        unique_fields=['level', 'academic_year'],
+        update_fields=['pending_count', 'midterm_count', 'final_count', 'updated_at'],
+    )
+    remaining = Q(pk__in=[])
+    for row in counts:
+        remaining |= Q(level_id=row['level_id'], academic_year_id=row['academic_year_id'])
+    PendingExamGradeCount.objects.filter(level_id__in=level_ids).exclude(remaining).delete()
+
+
+def approve_pending_grades(level):
+    """Approve the pending exam grades of a level in primary-key ordered chunks.
+
+    Each chunk is a short transaction over a bounded id range, so approving a
+    large level never holds row locks on all of its grades at once. Returns
+    the number of grades approved.
+    """
+    approved = 0
+    last_id = 0
+    while True:
+        pending = ExamGrade.objects.filter(level=level, is_approved=False, id__gt=last_id)
+        # Upper bound of this chunk; None once fewer than a chunk's worth remain
+        bound = pending.order_by('id').values_list('id', flat=True)[APPROVE_CHUNK_SIZE - 1:APPROVE_CHUNK_SIZE].first()
+        chunk = pending if bound is None else pending.filter(id__lte=bound)
+        with transaction.atomic():
+            approved += chunk.update(is_approved=True)
+        if bound is None:
+            break
+        last_id = bound
+    refresh_pending_counts([level.id])
+    return approved
+
+
 class UploadExamGradesView(APIView):
     """Student Affairs or Admin uploads exam grades for a level"""
     permission_classes = [IsStudentAffairsRole | IsAdminUser]
@@ -36,115 +110,159 @@ class UploadExamGradesView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            level = Level.objects.get(id=level_id)
-        except Level.DoesNotExist:
+        level = academic_structure().level(level_id)
+        if level is None:
             return Response({'error': 'الفرقة غير موجودة'}, status=status.HTTP_404_NOT_FOUND)
 
         if level.academic_year.status != 'OPEN':
             return Response({'error': 'العام الدراسي مغلق - لا يمكن رفع درجات'}, status=status.HTTP_400_BAD_REQUEST)
 
+        # Only the header is read here; the worker streams the rows in batches
         try:
-            df = pd.read_excel(file)
-        except Exception as e:
-            return Response({'error': f'خطأ في قراءة الملف: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
+            check_upload(file)
+            columns = read_header(file)
+        except SpreadsheetError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        if 'national_id' not in df.columns:
+        if 'national_id' not in columns:
             return Response(
                 {'error': 'الملف يجب أن يحتوي على عمود national_id'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
         # Get subject columns (all columns except national_id)
-        subject_columns = [col for col in df.columns if col != 'national_id']
+        subject_columns = [col for col in columns if col != 'national_id']
         
         # Validate subject codes
-        subjects = {}
+        subjects = {
+            subject.code: subject
+            for subject in Subject.objects.filter(
+                code__in=subject_columns,
+                level=level.name,
+                department=level.department
+            )
+        }
         for code in subject_columns:
-            try:
-                subject = Subject.objects.get(
-                    code=code,
-                    level=level.name,
-                    department=level.department
-                )
-                subjects[code] = subject
-            except Subject.DoesNotExist:
+            if code not in subjects:
                 return Response(
                     {'error': f'المادة {code} غير موجودة لهذه الفرقة'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-        success_count = 0
-        errors = []
-
-        with transaction.atomic():
-            for _, row in df.iterrows():
-                national_id = str(row['national_id']).strip()
-                
-                try:
-                    student = Student.objects.get(national_id=national_id, level=level)
-                except Student.DoesNotExist:
-                    errors.append(f'الطالب {national_id} غير موجود')
-                    continue
-
-                for subject_code, subject in subjects.items():
-                    grade_value = row.get(subject_code)
-                    
-                    if pd.isna(grade_value):
-                        continue
-
-                    try:
-                        grade_value = float(grade_value)
-                    except (ValueError, TypeError):
-                        errors.append(f'درجة غير صالحة للطالب {national_id} في {subject_code}')
-                        continue
-
-                    # Get or create ExamGrade
-                    exam_grade, created = ExamGrade.objects.get_or_create(
-                        student=student,
-                        subject=subject,
-                        academic_year=level.academic_year,
-                        defaults={
-                            'level': level,
-                            'uploaded_by': request.user,
-                        }
-                    )
-
-                    # Update the appropriate grade field
-                    if grade_type == 'midterm':
-                        exam_grade.midterm_grade = grade_value
-                    else:
-                        exam_grade.final_grade = grade_value
-                    
-                    exam_grade.is_approved = False  # Needs approval again
-                    exam_grade.uploaded_by = request.user
-                    exam_grade.save()
-                    success_count += 1
-
-        return Response({
-            'message': f'تم رفع {success_count} درجة بنجاح',
-            'errors': errors[:10] if errors else [],
-            'total_errors': len(errors)
-        })
+        job = enqueue(BackgroundJob.JobType.EXAM_GRADES_UPLOAD, request.user, params={
+            'level_id': level.id,
+            'grade_type': grade_type,
+            'subject_codes': list(subjects),
+        }, upload=file)
+        return job_accepted(job)
+
+
+def run_exam_grades_upload_job(ctx):
+    """Background job: write the exam grades of a validated upload"""
+    params = ctx.params
+    level = Level.objects.select_related('academic_year', 'department').get(id=params['level_id'])
+    grade_type = params['grade_type']
+    subjects = {
+        s.code: s for s in Subject.objects.filter(
+            code__in=params['subject_codes'], level=level.name, department=level.department
+        )
+    }
+    success_count = 0
+    errors = []
+    processed = 0
+
+    with ctx.open_upload() as f:
+        try:
+            for df in iter_spreadsheet(f):
+                # Each batch commits on its own, so a large sheet never holds one long transaction
+                with transaction.atomic():
+                    success_count += _import_exam_grade_batch(df, level, subjects, grade_type, ctx.user, errors)
+                processed += len(df)
+                ctx.progress(processed)
+        finally:
+            # Once per upload, covering every batch that was committed
+            refresh_pending_counts([level.id])
+
+    return {
+        'message': f'تم رفع {success_count} درجة بنجاح',
+        'errors': errors[:10] if errors else [],
+        'total_errors': len(errors)
+    }
+
+
+def _import_exam_grade_batch(df, level, subjects, grade_type, uploaded_by, errors):
+    """Write the grades of one batch of sheet rows; returns the number saved.
+
+    The wide sheet (national_id + one column per subject code) is melted into
+    (student, subject, grade) rows and upserted in bulk.
+    """
+    from .db_utils import bulk_upsert
+
+    codes = list(subjects)
+    frame = df[codes].copy()
+    frame['row'] = df.index
+    frame['national_id'] = df['national_id'].map(lambda v: str(v).strip())
+
+    student_ids = dict(
+        Student.objects.filter(national_id__in=set(frame['national_id']), level=level)
+        .values_list('national_id', 'id')
+    )
+    frame['student_id'] = frame['national_id'].map(student_ids)
+
+    # (row, column order, message) so errors keep the sheet order
+    batch_errors = [
+        (row, -1, f'الطالب {national_id} غير موجود')
+        for row, national_id in frame.loc[frame['student_id'].isna(), ['row', 'national_id']].itertuples(index=False)
+    ]
+
+    cells = frame[frame['student_id'].notna()].melt(
+        id_vars=['row', 'national_id', 'student_id'], value_vars=codes,
+        var_name='subject_code', value_name='grade'
+    )
+    cells = cells[cells['grade'].notna()]
+    cells['value'] = pd.to_numeric(cells['grade'], errors='coerce')
+
+    # Values that are not numbers or do not fit the grade column (max 999.99)
+    invalid = cells['value'].isna() | (cells['value'].abs() >= 1000)
+    batch_errors.extend(
+        (row, codes.index(code), f'درجة غير صالحة للطالب {national_id} في {code}')
+        for row, national_id, code in cells.loc[invalid, ['row', 'national_id', 'subject_code']].itertuples(index=False)
+    )
+    errors.extend(message for _, _, message in sorted(batch_errors, key=lambda e: (e[0], e[1])))
+
+    valid = cells[~invalid]
+    grade_field = 'midterm_grade' if grade_type == 'midterm' else 'final_grade'
+    latest = valid.drop_duplicates(['student_id', 'subject_code'], keep='last')
+
+    bulk_upsert(
+        ExamGrade,
+        [
+            ExamGrade(
+                student_id=int(student_id),
+                subject=subjects[code],
+                level=level,
+                academic_year_id=level.academic_year_id,
+                uploaded_by=uploaded_by,
+                is_approved=False,  # Needs approval again
+                **{grade_field: float(value)},
+            )
+            for student_id, code, value in latest[['student_id', 'subject_code', 'value']].itertuples(index=False)
+        ],
+        unique_fields=['student', 'subject', 'academic_year'],
+        update_fields=[grade_field, 'is_approved', 'uploaded_by', 'updated_at'],
+    )
+    return len(valid)
 
 
 class PendingExamGradesListView(APIView):
     """Admin/Dean views pending grades grouped by level"""
     permission_classes = [IsDeanRole]
+    query_budget = 3
 
     def get(self, request):
-        from django.db.models import Count, Q
-        
-        pending = ExamGrade.objects.filter(is_approved=False).values(
-            'level__id',
-            'level__name',
-            'level__department__name',
-            'academic_year__name',
-        ).annotate(
-            count=Count('id'),
-            midterm_count=Count('id', filter=Q(midterm_grade__isnull=False, is_approved=False)),
-            final_count=Count('id', filter=Q(final_grade__isnull=False, is_approved=False)),
-        ).order_by('-count')
+        pending = PendingExamGradeCount.objects.filter(pending_count__gt=0).select_related(
+            'level__department', 'academic_year'
+        ).order_by('-pending_count')
 
         result = []
         level_names = {
@@ -156,13 +274,13 @@ class PendingExamGradesListView(APIView):
         }
         for item in pending:
             result.append({
-                'level_id': item['level__id'],
-                'level_name': level_names.get(item['level__name'], item['level__name']),
-                'department': item['level__department__name'] or 'إعدادي',
-                'academic_year': item['academic_year__name'],
-                'pending_count': item['count'],
-                'midterm_count': item['midterm_count'],
-                'final_count': item['final_count'],
+                'level_id': item.level_id,
+                'level_name': level_names.get(item.level.name, item.level.name),
+                'department': item.level.department.name if item.level.department else 'إعدادي',
+                'academic_year': item.academic_year.name,
+                'pending_count': item.pending_count,
+                'midterm_count': item.midterm_count,
+                'final_count': item.final_count,
             })
 
         return Response(result)
@@ -182,7 +300,7 @@ class ApproveExamGradesView(APIView):
             # Allow Deans to approve grades even after the year is closed.
             pass
 
-        updated = ExamGrade.objects.filter(level=level, is_approved=False).update(is_approved=True)
+        updated = approve_pending_grades(level)
 
         # U9: Audit log for grade approval
         try:
@@ -210,9 +328,10 @@ class ApproveExamGradesView(APIView):
 class PendingExamGradesCountView(APIView):
     """Get total count of pending grades for dashboard badge"""
     permission_classes = [IsDeanRole]
+    query_budget = 3
 
     def get(self, request):
-        count = ExamGrade.objects.filter(is_approved=False).count()
+        count = PendingExamGradeCount.objects.aggregate(total=Sum('pending_count'))['total'] or 0
         return Response({'pending_grades_count': count})
 
 
@@ -0,0 +1,59 @@
+"""
+Versioned Redis snapshots of the Student Affairs grades grid.
+
+Each (academic_year, level) has a version counter that grade and attendance
+writes bump through grade_engine.refresh_summaries_for(). A grid snapshot
+is stored under its (academic_year, level, department, specialization) scope
+together with the version it was built at, so a bump makes every department
+and specialization view of that level rebuild on its next poll.
+"""
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Safety net for changes that don't go through the grade write paths
+# (student imports, subject edits, ...)
+GRID_SNAPSHOT_TTL = 60 * 10
+
+
+def _version_key(academic_year_id, level_id):
+    return f'sa_grades:version:{academic_year_id}:{level_id}'
+
+
+def _snapshot_key(academic_year_id, level_id, department_id, specialization_id, version):
+    return f'sa_grades:grid:{academic_year_id}:{level_id}:{department_id or "-"}:{specialization_id or "-"}:{version}'
+
+
+def grid_version(academic_year_id, level_id):
+    """Current version counter of a level's grades grid"""
+    # Seed with a timestamp so a flushed counter never reuses an old version
+    return cache.get_or_set(_version_key(academic_year_id, level_id), lambda: int(time.time() * 1000), timeout=None)
+
+
+def bump_grid_versions(scopes):
+    """Invalidate the grid snapshots of the given (academic_year_id, level_id) pairs"""
+    for academic_year_id, level_id in set(scopes):
+        key = _version_key(academic_year_id, level_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, int(time.time() * 1000), timeout=None)
+
+
+def get_grid_snapshot(academic_year_id, level_id, department_id, specialization_id, build):
+    """Return (etag, payload) for a grid scope, calling build() only on a cache miss"""
+    version = grid_version(academic_year_id, level_id)
+    key = _snapshot_key(academic_year_id, level_id, department_id, specialization_id, version)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        payload = build()
+        body = json.dumps(payload, cls=DjangoJSONEncoder, sort_keys=True)
+        snapshot = {
+            'etag': '"%s"' % hashlib.md5(body.encode()).hexdigest(),
+            'data': payload,
+        }
+        cache.set(key, snapshot, timeout=GRID_SNAPSHOT_TTL)
+    return snapshot['etag'], snapshot['data']
@@ -0,0 +1,195 @@
+"""
+Set-based grade calculation.
+
+StudentGrade.attendance_grade() counts PRESENT attendance rows for its own
+(student, course_offering) pair, so rendering a grid of grades costs one COUNT
+query per cell. The helpers here load the grading templates and the attendance
+counts for a whole batch of grades in a couple of aggregate queries, prime the
+StudentGrade instances with them, and return the computed breakdown for each
+(student, offering) pair.
+
+The breakdowns are also materialized into StudentGradeSummary so read-heavy
+views can select them directly. Write paths call refresh_summaries_for() with
+the (offering, student) pairs they touched, which also invalidates the cached
+grades grid of the affected levels and updates the students' standings
+(see standing.py). Changes that reweight every grade of an offering at once
+(its grading template, or the template's weights) go through
+refresh_offerings_on_commit().
+"""
+from django.db import transaction
+from django.db.models import Count, prefetch_related_objects
+
+from .db_utils import bulk_upsert
+from .grade_cache import bump_grid_versions
+from .models import Attendance, CourseOffering, StudentGrade, StudentGradeSummary
+
+SUMMARY_FIELDS = [
+    'student', 'course_offering', 'attendance_grade', 'quizzes_grade', 'midterm',
+    'practical', 'final', 'coursework', 'total_grade', 'max_total', 'updated_at',
+]
+
+
+def present_counts(offering_ids, student_ids=None):
+    """Return {(student_id, offering_id): present_count} in a single GROUP BY query"""
+    offering_ids = list(offering_ids)
+    if not offering_ids:
+        return {}
+
+    rows = Attendance.objects.filter(
+        course_offering_id__in=offering_ids,
+        status=Attendance.AttendanceStatus.PRESENT
+    )
+    if student_ids is not None:
+        rows = rows.filter(student_id__in=list(student_ids))
+
+    rows = rows.order_by().values('student_id', 'course_offering_id').annotate(present=Count('id'))
+    return {(r['student_id'], r['course_offering_id']): r['present'] for r in rows}
+
+
+def prime_grades(grades):
+    """Attach grading templates and attendance counts to StudentGrade instances.
+
+    Accepts a queryset or a list and returns a list. After priming, the model's
+    attendance_grade(), coursework and total_grade() run without further queries.
+    """
+    if hasattr(grades, 'select_related'):
+        grades = list(grades.select_related('course_offering__grading_template'))
+    else:
+        grades = list(grades)
+        prefetch_related_objects(grades, 'course_offering__grading_template')
+
+    # Only grades without a manual attendance value need the attendance table
+    needs_count = [g for g in grades if g.attendance is None]
+    counts = present_counts(
+        {g.course_offering_id for g in needs_count},
+        {g.student_id for g in needs_count},
+    ) if needs_count else {}
+
+    for g in grades:
+        g._present_count = counts.get((g.student_id, g.course_offering_id), 0)
+    return grades
+
+
+def grade_breakdown(grade):
+    """Computed grade components for one (primed) StudentGrade"""
+    template = grade.course_offering.grading_template
+    attendance = float(grade.attendance_grade())
+    quizzes = float(grade.quizzes_grade())
+    midterm = float(grade.midterm) if grade.midterm is not None else None
+    practical = float(grade.practical) if grade.practical is not None else None
+    final = float(grade.final) if grade.final is not None else None
+
+    coursework = attendance + quizzes + (midterm or 0.0)
+    return {
+        'student_id': grade.student_id,
+        'course_offering_id': grade.course_offering_id,
+        'attendance': attendance,
+        'quizzes': quizzes,
+        'midterm': midterm,
+        'practical': practical,
+        'final': final,
+        'coursework': coursework,
+        'total': coursework + (practical or 0.0) + (final or 0.0),
+        'max_total': max_total(template),
+    }
+
+
+def grade_breakdowns(grades):
+    """Return {(student_id, offering_id): breakdown} for a queryset or list of grades"""
+    return {
+        (g.student_id, g.course_offering_id): grade_breakdown(g)
+        for g in prime_grades(grades)
+    }
+
+
+def max_total(template):
+    """Maximum attainable total for an offering's grading template"""
+    if not template:
+        return 100
+    return (
+        float(template.attendance_weight or 0) + float(template.quizzes_weight or 0)
+        + float(template.midterm_weight or 0) + float(template.practical_weight or 0)
+        + float(template.final_weight or 0)
+    )
+
+
+def breakdowns_for_offering(course_offering):
+    """Breakdowns for every graded student in one course offering"""
+    return grade_breakdowns(StudentGrade.objects.filter(course_offering=course_offering))
+
+
+def breakdowns_for_level(level, academic_year=None):
+    """Breakdowns for every grade recorded against a level's offerings"""
+    grades = StudentGrade.objects.filter(course_offering__level=level)
+    if academic_year is not None:
+        grades = grades.filter(course_offering__academic_year=academic_year)
+    return grade_breakdowns(grades)
+
+
+def breakdowns_for_students(students, offerings=None):
+    """Breakdowns for a set of students, optionally limited to some offerings"""
+    grades = StudentGrade.objects.filter(student__in=students)
+    if offerings is not None:
+        grades = grades.filter(course_offering__in=offerings)
+    return grade_breakdowns(grades)
+
+
+def refresh_summaries(grades):
+    """Recompute and upsert StudentGradeSummary rows for a queryset or list of grades"""
+    grades = prime_grades(grades)
+    rows = []
+    for g in grades:
+        b = grade_breakdown(g)
+        rows.append(StudentGradeSummary(
+            grade_id=g.pk,
+            student_id=g.student_id,
+            course_offering_id=g.course_offering_id,
+            attendance_grade=round(b['attendance'], 2),
+            quizzes_grade=round(b['quizzes'], 2),
+            midterm=b['midterm'],
+            practical=b['practical'],
+            final=b['final'],
+            coursework=round(b['coursework'], 2),
+            total_grade=round(b['total'], 2),
+            max_total=b['max_total'],
+        ))
+    bulk_upsert(StudentGradeSummary, rows, unique_fields=['grade'], update_fields=SUMMARY_FIELDS)
+    return len(rows)
+
+
+def refresh_summaries_for(course_offering_ids, student_ids=None):
+    """Refresh the summaries of the given offerings, optionally limited to some students"""
+    course_offering_ids = list(course_offering_ids)
+    if not course_offering_ids:
+        return 0
+    grades = StudentGrade.objects.filter(course_offering_id__in=course_offering_ids)
+    if student_ids is not None:
+        grades = grades.filter(student_id__in=list(student_ids))
+    refreshed = refresh_summaries(grades)
+
+    bump_grid_versions(
+        CourseOffering.objects.filter(id__in=course_offering_ids).values_list('academic_year_id', 'level_id')
+    )
+
+    from .standing import refresh_standings_for
+    refresh_standings_for(course_offering_ids, student_ids)
+    return refreshed
+
+
+def refresh_offerings_on_commit(course_offering_ids):
+    """Refresh every summary of the given offerings once the current transaction commits"""
+    course_offering_ids = list(course_offering_ids)
+    if course_offering_ids:
+        transaction.on_commit(lambda: refresh_summaries_for(course_offering_ids))
+
+
+def summaries_for(grades):
+    """Return {(student_id, offering_id): StudentGradeSummary} for a StudentGrade queryset.
+
+    Grades written before the summary table existed are materialized on first read.
+    """
+    missing = grades.filter(summary__isnull=True)
+    if missing.exists():
+        refresh_summaries(missing)
+    summaries = StudentGradeSummary.objects.filter(grade__in=grades.values('pk'))
+    return {(s.student_id, s.course_offering_id): s for s in summaries}
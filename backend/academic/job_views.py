@@ -0,0 +1,65 @@
+"""
+Status and download endpoints for background jobs
+"""
+import os
+
+from django.http import FileResponse
+from rest_framework import status, permissions
+from rest_framework.views import APIView
+from rest_framework.response import Response
+
+from .jobs import job_storage
+from .models import BackgroundJob
+from .serializers import BackgroundJobSerializer
+
+
+def _visible_jobs(user):
+    """Users see their own jobs; admins see all of them"""
+    qs = BackgroundJob.objects.all()
+    if getattr(user, 'role', None) != 'ADMIN' and not user.is_superuser:
+        qs = qs.filter(created_by=user)
+    return qs
+
+
+class JobListView(APIView):
+    """Recent background jobs of the current user"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        qs = _visible_jobs(request.user)
+        job_type = request.query_params.get('job_type')
+        if job_type:
+            qs = qs.filter(job_type=job_type)
+        return Response(BackgroundJobSerializer(qs[:50], many=True).data)
+
+
+class JobStatusView(APIView):
+    """Status, progress and result of one background job"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        try:
+            job = _visible_jobs(request.user).get(pk=pk)
+        except BackgroundJob.DoesNotExist:
+            return Response({'error': 'المهمة غير موجودة'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(BackgroundJobSerializer(job).data)
+
+
+class JobDownloadView(APIView):
+    """Download the file produced by a finished job"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        try:
+            job = _visible_jobs(request.user).get(pk=pk)
+        except BackgroundJob.DoesNotExist:
+            return Response({'error': 'المهمة غير موجودة'}, status=status.HTTP_404_NOT_FOUND)
+
+        if job.status != BackgroundJob.Status.SUCCEEDED or not job.result_file:
+            return Response({'error': 'الملف غير جاهز بعد'}, status=status.HTTP_409_CONFLICT)
+
+        return FileResponse(
+            job_storage().open(job.result_file, 'rb'),
+            as_attachment=True,
+            filename=os.path.basename(job.result_file),
+        )
@@ -0,0 +1,221 @@
+"""
+Background jobs for heavy academic operations.
+
+Views create a BackgroundJob with enqueue() and answer with job_accepted()
+straight away. The `run_jobs` management command pops job ids from a Redis list
+and runs the handler registered for the job type. Handlers receive a
+JobContext for reading their inputs and reporting progress, and return a
+JSON-serializable result that the job status endpoint exposes.
+"""
+import logging
+import os
+import time
+import uuid
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, storages
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = 'academic:jobs:queue'
+
+# Files kept between a preview and the upload that follows it
+PREVIEW_UPLOAD_DIR = 'previews'
+# Outlives the preview tokens that point at them; older files are purged by the worker
+PREVIEW_UPLOAD_TTL = 60 * 60
+# Uploads handed to jobs; run_job deletes them, this only catches jobs that never finished
+JOB_UPLOAD_DIR = 'uploads'
+JOB_UPLOAD_TTL = 24 * 60 * 60
+
+# job_type -> handler(ctx) returning the job result
+HANDLERS = {
+    BackgroundJob.JobType.STUDENT_UPLOAD: 'academic.student_affairs_views.run_student_upload_job',
+    BackgroundJob.JobType.DOCTOR_UPLOAD: 'academic.staff_affairs_views.run_doctor_upload_job',
+    BackgroundJob.JobType.EXAM_GRADES_UPLOAD: 'academic.exam_grades_views.run_exam_grades_upload_job',
+    BackgroundJob.JobType.ACADEMIC_EXPORT: 'academic.export_views.run_academic_export_job',
+    BackgroundJob.JobType.CERTIFICATE_ZIP: 'academic.student_affairs_views.run_certificate_zip_job',
+    BackgroundJob.JobType.ATTENDANCE_EXCEL: 'academic.attendance_export.run_attendance_excel_job',
+    BackgroundJob.JobType.RESULT_PUBLISH: 'academic.result_cards.run_result_publish_job',
+}
+
+
+@lru_cache(maxsize=None)
+def job_storage():
+    """Private storage for job uploads and results (never under MEDIA_ROOT).
+
+    Files in it are only reachable through JobDownloadView, which checks that
+    the job belongs to the requesting user.
+    """
+    if 'jobs' in settings.STORAGES:
+        return storages['jobs']
+    return FileSystemStorage(location=settings.JOB_FILES_ROOT)
+
+
+def queue_connection():
+    """Redis connection holding the job queue"""
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+class JobContext:
+    """Inputs and progress reporting for a running job"""
+
+    # Minimum seconds between progress writes
+    REPORT_INTERVAL = 1.0
+
+    def __init__(self, job):
+        self.job = job
+        self.params = job.params
+        self._last_report = 0.0
+
+    @property
+    def user(self):
+        return self.job.created_by
+
+    def open_upload(self):
+        """Open the file that was stored with the job when it was enqueued"""
+        return job_storage().open(self.params['upload_path'], 'rb')
+
+    def progress(self, processed, total=None, message=None):
+        """Record how many rows have been processed (throttled)"""
+        self.job.processed_rows = processed
+        fields = ['processed_rows']
+        if total is not None and total != self.job.total_rows:
+            self.job.total_rows = total
+            fields.append('total_rows')
+        if message is not None and message != self.job.message:
+            self.job.message = message[:255]
+            fields.append('message')
+
+        now = time.monotonic()
+        if len(fields) > 1 or now - self._last_report >= self.REPORT_INTERVAL:
+            self._last_report = now
+            self.job.save(update_fields=fields)
+
+    def save_result_file(self, name, content):
+        """Store a generated file for download through the job endpoints"""
+        path = job_storage().save(f'results/{self.job.id}/{name}', ContentFile(content))
+        self.job.result_file = path
+        return path
+
+
+def store_upload(upload, directory=JOB_UPLOAD_DIR):
+    """Copy an uploaded file to the private job storage; returns its storage path.
+
+    The original file name is kept at the end of the path, so readers that go
+    by the extension can open the stored file.
+    """
+    upload.seek(0)
+    return job_storage().save(f'{directory}/{uuid.uuid4().hex}_{os.path.basename(upload.name)}', upload)
+
+
+def purge_stale_uploads(max_age_seconds=PREVIEW_UPLOAD_TTL):
+    """Delete previewed uploads that were never used, and uploads left behind by
+    jobs that never finished; returns how many files were removed"""
+    return (
+        _purge_directory(PREVIEW_UPLOAD_DIR, max_age_seconds)
+        + _purge_directory(JOB_UPLOAD_DIR, max(max_age_seconds, JOB_UPLOAD_TTL))
+    )
+
+
+def _purge_directory(directory, max_age_seconds):
+    storage = job_storage()
+    try:
+        _, names = storage.listdir(directory)
+    except (FileNotFoundError, NotImplementedError):
+        return 0
+    cutoff = timezone.now() - timedelta(seconds=max_age_seconds)
+    removed = 0
+    for name in names:
+        path = f'{directory}/{name}'
+        try:
+            if storage.get_modified_time(path) < cutoff:
+                storage.delete(path)
+                removed += 1
+        except Exception:
+            continue
+    return removed
+
+
+def enqueue(job_type, user, params=None, upload=None, file_name=''):
+    """Create a job and push it onto the Redis queue once the transaction commits.
+
+    An uploaded file is copied to the private job storage so the worker can read it.
+    """
+    params = dict(params or {})
+    if upload is not None:
+        params['upload_path'] = store_upload(upload)
+        file_name = file_name or os.path.basename(upload.name)
+
+    job = BackgroundJob.objects.create(
+        job_type=job_type,
+        created_by=user,
+        params=params,
+        file_name=file_name[:255],
+    )
+    transaction.on_commit(lambda: push(job.id))
+    return job
+
+
+def push(job_id):
+    """Hand a job id to the workers"""
+    try:
+        queue_connection().lpush(QUEUE_KEY, job_id)
+    except Exception:
+        # The worker also sweeps PENDING jobs, so a lost push only delays the job
+        logger.warning('Could not push job %s to the queue', job_id, exc_info=True)
+
+
+def job_accepted(job, **extra):
+    """202 response pointing the client at the job status endpoint"""
+    data = {
+        'message': 'تم استلام الطلب وجاري المعالجة في الخلفية',
+        'job_id': job.id,
+        'job_type': job.job_type,
+        'status': job.status,
+        'status_url': reverse('job-status', args=[job.id]),
+    }
+    data.update(extra)
+    return Response(data, status=status.HTTP_202_ACCEPTED)
+
+
+def run_job(job_id):
+    """Claim a PENDING job and run its handler. Returns False if it was already taken."""
+    claimed = BackgroundJob.objects.filter(
+        id=job_id, status=BackgroundJob.Status.PENDING
+    ).update(status=BackgroundJob.Status.RUNNING, started_at=timezone.now())
+    if not claimed:
+        return False
+
+    job = BackgroundJob.objects.select_related('created_by').get(id=job_id)
+    ctx = JobContext(job)
+    try:
+        handler = import_string(HANDLERS[job.job_type])
+        job.result = handler(ctx)
+        job.status = BackgroundJob.Status.SUCCEEDED
+        job.processed_rows = max(job.processed_rows, job.total_rows)
+    except Exception as e:
+        logger.exception('Job %s (%s) failed', job.id, job.job_type)
+        job.status = BackgroundJob.Status.FAILED
+        job.error = str(e)
+    finally:
+        job.finished_at = timezone.now()
+        job.save()
+        upload_path = job.params.get('upload_path')
+        if upload_path:
+            try:
+                job_storage().delete(upload_path)
+            except Exception:
+                pass
+    return True
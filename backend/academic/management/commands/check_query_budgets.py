@@ -0,0 +1,201 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.test import Client, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from academic.models import CourseOffering, Quiz, Student, StudentQuizAttempt, StudentStanding, Term
+from academic.structure_cache import academic_structure
+from bsu_backend.query_counter import QueryBudgetExceeded, assert_max_queries, query_budget_of
+from users.models import User
+
+
+def _staff(role):
+    return lambda: User.objects.filter(role=role, is_active=True).order_by('id').first()
+
+
+def _quiz_student():
+    student = Student.objects.filter(
+        user__isnull=False, has_paid_tuition=True, level__course_offerings__quizzes__isnull=False
+    ).select_related('user').order_by('id').first()
+    return student and student.user
+
+
+def _grades_grid_params():
+    offering = CourseOffering.objects.filter(level__students__isnull=False).select_related('level').order_by('-id').first()
+    return offering and {
+        'academic_year': offering.academic_year_id,
+        'level': offering.level_id,
+        'department': offering.level.department_id or '',
+    }
+
+
+def _publishing_params():
+    term = Term.objects.select_related('academic_year').order_by('-id').first()
+    return term and {'year': term.academic_year.name, 'term': term.name, 'level': 'FIRST'}
+
+
+def _ranking_params():
+    standing = StudentStanding.objects.order_by('-id').first()
+    return standing and {'term': standing.term_id, 'level': standing.level_id, 'limit': 50}
+
+
+def _results_params():
+    student = Student.objects.order_by('-id').first()
+    return student and {'national_id': student.national_id}
+
+
+def _query(params_factory):
+    """Request factory for a GET without URL arguments"""
+    def factory():
+        params = params_factory()
+        return None if params is None else ({}, params)
+    return factory
+
+
+def _quiz_sample():
+    """(quiz, student) for an active untimed quiz and a student of its level who hasn't taken it"""
+    quiz = Quiz.objects.filter(
+        Q(time_limit_minutes__isnull=True) | Q(time_limit_minutes=0),
+        is_active=True, questions__choices__isnull=False,
+    ).select_related('course_offering').order_by('id').first()
+    if quiz is None:
+        return None, None
+    student = Student.objects.filter(
+        user__isnull=False, has_paid_tuition=True,
+        level_id=quiz.course_offering.level_id, academic_year_id=quiz.course_offering.academic_year_id,
+    ).exclude(quiz_attempts__quiz=quiz).select_related('user').order_by('id').first()
+    return (quiz, student) if student else (None, None)
+
+
+def _quiz_taker():
+    _, student = _quiz_sample()
+    return student and student.user
+
+
+def _quiz_doctor():
+    quiz, _ = _quiz_sample()
+    return quiz and quiz.course_offering.doctor
+
+
+def _quiz_request(attempt=None, data=lambda quiz: {}):
+    """Request factory for a quiz endpoint; attempt is None, 'open' or 'submitted'"""
+    def factory():
+        quiz, student = _quiz_sample()
+        if quiz is None:
+            return None
+        if attempt == 'open':
+            StudentQuizAttempt.objects.create(quiz=quiz, student=student)
+        elif attempt == 'submitted':
+            StudentQuizAttempt.objects.create(
+                quiz=quiz, student=student, submitted_at=timezone.now(), score=0, is_graded=True,
+                status=StudentQuizAttempt.AttemptStatus.GRADED,
+            )
+        return {'quiz_id': quiz.id}, data(quiz)
+    return factory
+
+
+def _quiz_answers(quiz):
+    return {'answers': [
+        {'question_id': question.id, 'choice_id': question.choices.order_by('id').first().id}
+        for question in quiz.questions.filter(choices__isnull=False).distinct()
+    ]}
+
+
+# label -> (url name, method, user factory or None for anonymous, request factory)
+#
+# A request factory returns (url kwargs, query params or JSON body), or None when
+# the database has no sample data. It runs in the same transaction as the
+# request, which is rolled back afterwards, so it may create rows.
+ENDPOINTS = {
+    'graduate-database': ('graduate-database', 'GET', _staff('GRADUATE_AFFAIRS'), _query(dict)),
+    'certificate-list': ('certificate-list', 'GET', _staff('GRADUATE_AFFAIRS'), _query(dict)),
+    'public-staff': ('public-staff', 'GET', None, _query(dict)),
+    'student-quizzes': ('student-quizzes', 'GET', _quiz_student, _query(dict)),
+    'quiz-attempt': ('quiz-attempt', 'GET', _quiz_taker, _quiz_request()),
+    'quiz-autosave': ('quiz-autosave', 'POST', _quiz_taker, _quiz_request('open', lambda quiz: {'answers': []})),
+    'quiz-submit': ('quiz-attempt', 'POST', _quiz_taker, _quiz_request('open', _quiz_answers)),
+    'student-quiz-results': ('student-quiz-results', 'GET', _quiz_taker, _quiz_request('submitted')),
+    'quiz-results': ('quiz-results', 'GET', _quiz_doctor, _quiz_request('submitted', lambda quiz: {'report': 1})),
+    'student-affairs-grades': ('student-affairs-grades', 'GET', _staff('STUDENT_AFFAIRS'), _query(_grades_grid_params)),
+    'publish-status': ('publish-status', 'GET', _staff('DEAN'), _query(_publishing_params)),
+    'results-query': ('results-query', 'GET', None, _query(_results_params)),
+    'class-ranking': ('class-ranking', 'GET', _staff('DEAN'), _query(_ranking_params)),
+    'pending-exam-grades': ('pending-exam-grades', 'GET', _staff('DEAN'), _query(dict)),
+    'pending-exam-grades-count': ('pending-exam-grades-count', 'GET', _staff('DEAN'), _query(dict)),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Request the budgeted API endpoints against the current (seeded) database and fail '
+        'when one runs more queries than its view\'s query_budget or repeats a query shape. '
+        'Each request runs with an empty local-memory cache so the uncached path is measured, '
+        'and in a transaction that is rolled back so POST checks leave no data behind.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', action='append', choices=sorted(ENDPOINTS), help='Only check this endpoint (repeatable)')
+        parser.add_argument('--strict', action='store_true', help='Fail endpoints that have no sample data instead of skipping them')
+
+    def handle(self, *args, **options):
+        self.strict = options['strict']
+        failures = [name for name in options['endpoint'] or ENDPOINTS if not self._check(name)]
+        if failures:
+            raise CommandError(f'{len(failures)} endpoints failed their query budget: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS('All endpoints within their query budgets'))
+
+    def _check(self, name):
+        """Request one endpoint; returns False when it fails"""
+        # A fresh cache per endpoint: no warm snapshots, sessions or throttle history
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'query-budget-{name}',
+        }}), transaction.atomic():
+            try:
+                return self._request(name, *ENDPOINTS[name])
+            finally:
+                # Nothing the sample data or the request wrote is kept
+                transaction.set_rollback(True)
+
+    def _request(self, name, url_name, method, user_factory, request_factory):
+        user = user_factory() if user_factory else None
+        request = request_factory()
+        if (user_factory and user is None) or request is None:
+            if self.strict:
+                self.stdout.write(self.style.ERROR(f'FAIL  {name}: no sample data'))
+                return False
+            self.stdout.write(self.style.WARNING(f'SKIP  {name}: no sample data'))
+            return True
+
+        url_kwargs, data = request
+        url = reverse(url_name, kwargs=url_kwargs)
+        budget = query_budget_of(resolve(url).func, method)
+        if budget is None:
+            self.stdout.write(self.style.ERROR(f'FAIL  {name}: view declares no {method} query_budget'))
+            return False
+
+        # The structure lookup table is warm in every long-running process
+        academic_structure()
+        client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        if user is not None:
+            client.force_login(user)
+        try:
+            with assert_max_queries(budget, label=name) as collector:
+                if method == 'GET':
+                    response = client.get(url, data)
+                else:
+                    response = client.generic(method, url, json.dumps(data), content_type='application/json')
+        except QueryBudgetExceeded as e:
+            self.stdout.write(self.style.ERROR(f'FAIL  {e}'))
+            return False
+
+        if response.status_code >= 400:
+            self.stdout.write(self.style.ERROR(f'FAIL  {name}: HTTP {response.status_code}'))
+            return False
+        self.stdout.write(self.style.SUCCESS(f'OK    {name}: {collector.count}/{budget} queries'))
+        return True
@@ -0,0 +1,166 @@
+import json
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+
+from academic.models import (
+    Attendance, AuditLog, CourseOffering, ExamGrade, Student, StudentGrade,
+)
+from graduate_affairs.models import GraduateRequest, Notification
+
+
+def _sample(model, *fields):
+    """Field values of one existing row, used as realistic filter parameters"""
+    return model.objects.order_by('-pk').values(*fields).first()
+
+
+def _student_scope():
+    row = _sample(Student, 'level_id', 'academic_year_id', 'department_id', 'specialization_id')
+    return row and Student.objects.filter(**row)
+
+
+def _doctor_offerings():
+    row = _sample(CourseOffering, 'doctor_id', 'academic_year_id')
+    return row and CourseOffering.objects.filter(**row)
+
+
+def _level_term_offerings():
+    row = _sample(CourseOffering, 'level_id', 'academic_year_id', 'term_id')
+    return row and CourseOffering.objects.filter(**row)
+
+
+def _present_counts():
+    row = _sample(Attendance, 'course_offering_id')
+    return row and Attendance.objects.filter(
+        course_offering_id__in=[row['course_offering_id']], status=Attendance.AttendanceStatus.PRESENT
+    ).order_by().values('student_id', 'course_offering_id').annotate(present=Count('id'))
+
+
+def _attendance_of_day():
+    row = _sample(Attendance, 'course_offering_id', 'date')
+    return row and Attendance.objects.filter(**row)
+
+
+def _offering_grades():
+    row = _sample(StudentGrade, 'course_offering_id')
+    return row and StudentGrade.objects.filter(**row)
+
+
+def _pending_exam_grades():
+    row = _sample(ExamGrade, 'level_id')
+    return row and ExamGrade.objects.filter(level_id=row['level_id'], is_approved=False)
+
+
+def _assignment_history():
+    return AuditLog.objects.filter(
+        action__in=[AuditLog.ActionType.DOCTOR_ASSIGNMENT, AuditLog.ActionType.DOCTOR_UNASSIGNMENT]
+    ).order_by('-created_at')[:200]
+
+
+def _recent_audit_logs():
+    return AuditLog.objects.order_by('-created_at')[:100]
+
+
+def _unread_notifications():
+    row = _sample(Notification, 'recipient_id')
+    return row and Notification.objects.filter(recipient_id=row['recipient_id'], is_read=False)
+
+
+def _graduate_requests():
+    row = _sample(GraduateRequest, 'status', 'request_type')
+    return row and GraduateRequest.objects.filter(**row)
+
+
+def _own_graduate_requests():
+    row = _sample(GraduateRequest, 'graduate_id')
+    return row and GraduateRequest.objects.filter(**row).order_by('-created_at')
+
+
+# name -> builder returning the query shape a hot view runs (None without sample data)
+HOT_QUERIES = {
+    'student class list': _student_scope,
+    'doctor courses': _doctor_offerings,
+    'level term offerings': _level_term_offerings,
+    'attendance present counts': _present_counts,
+    'attendance of a day': _attendance_of_day,
+    'grades of an offering': _offering_grades,
+    'pending exam grades': _pending_exam_grades,
+    'assignment history': _assignment_history,
+    'recent audit logs': _recent_audit_logs,
+    'unread notifications': _unread_notifications,
+    'graduate requests by status': _graduate_requests,
+    'own graduate requests': _own_graduate_requests,
+}
+
+
+def _mysql_full_scans(plan):
+    """Tables read with access_type ALL anywhere in a MySQL/MariaDB JSON plan"""
+    scans = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if node.get('access_type') == 'ALL':
+                scans.append(node.get('table_name', '?'))
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(json.loads(plan))
+    return scans
+
+
+def _sqlite_full_scans(plan):
+    """Tables SQLite scans without an index ("SCAN t" rather than "SEARCH t USING INDEX")"""
+    scans = []
+    for line in plan.splitlines():
+        match = re.search(r'\bSCAN (\w+)', line)
+        if match and 'INDEX' not in line:
+            scans.append(match.group(1))
+    return scans
+
+
+class Command(BaseCommand):
+    help = (
+        'EXPLAIN the query shapes of the hot academic views and flag full table scans. '
+        'Run against a database seeded with production-sized data: on near-empty '
+        'tables the optimizer prefers scans regardless of the available indexes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--query', action='append', choices=sorted(HOT_QUERIES), help='Only check this query (repeatable)')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the full plan of every query')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'mysql':
+            explain_format, find_scans = 'json', _mysql_full_scans
+        elif connection.vendor == 'sqlite':
+            explain_format, find_scans = None, _sqlite_full_scans
+        else:
+            raise CommandError(f'Unsupported database backend: {connection.vendor}')
+
+        flagged = []
+        for name in options['query'] or HOT_QUERIES:
+            queryset = HOT_QUERIES[name]()
+            if queryset is None:
+                self.stdout.write(self.style.WARNING(f'SKIP  {name}: no sample rows'))
+                continue
+
+            plan = queryset.explain(format=explain_format)
+            scans = find_scans(plan)
+            if scans:
+                flagged.append(name)
+                self.stdout.write(self.style.ERROR(f'SCAN  {name}: full scan of {", ".join(scans)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'OK    {name}'))
+            if options['verbose_plans'] or scans:
+                self.stdout.write(f'      {queryset.query}')
+                if options['verbose_plans']:
+                    self.stdout.write(plan)
+
+        if flagged:
+            raise CommandError(f'{len(flagged)} hot queries use full table scans: {", ".join(flagged)}')
+        self.stdout.write(self.style.SUCCESS('No full table scans in the hot query registry'))
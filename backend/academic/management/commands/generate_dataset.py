@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from academic.models import AcademicYear
+from academic.synthetic_data import delete_dataset, generate_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a synthetic faculty-scale academic year (students, offerings, attendance, '
+        'quizzes, grades, certificates, graduate requests) for load and query-budget testing'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', default='2030-2031', help='Name of the academic year to create (default 2030-2031)')
+        parser.add_argument('--scale', type=float, default=1.0, help='Volume multiplier; 1.0 is about 19,000 students')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; also tags the synthetic accounts')
+        parser.add_argument('--weeks', type=int, default=14, help='Teaching weeks of attendance in the first term')
+        parser.add_argument('--replace', action='store_true', help='Delete an existing dataset with this year and seed first')
+        parser.add_argument('--allow-production', action='store_true', help='Run even when DEBUG is off')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['allow_production']:
+            raise CommandError('Refusing to generate synthetic data with DEBUG off; pass --allow-production to override')
+        if options['scale'] <= 0 or options['weeks'] <= 0:
+            raise CommandError('--scale and --weeks must be positive')
+
+        year = options['year']
+        if AcademicYear.objects.filter(name=year).exists():
+            if not options['replace']:
+                raise CommandError(f'Academic year "{year}" already exists; pass --replace to regenerate it')
+            delete_dataset(year, options['seed'])
+            self.stdout.write(f'Deleted the existing dataset of {year}')
+
+        counts = generate_dataset(
+            year, scale=options['scale'], seed=options['seed'], weeks=options['weeks'], log=self.stdout.write
+        )
+        for kind, count in counts.items():
+            self.stdout.write(f'  {kind}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Generated the synthetic academic year {year}'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from academic.models import AcademicYear, CourseOffering, StudentGrade
+from academic.grade_engine import refresh_summaries
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the StudentGradeSummary table for an academic year'
+
+    def add_arguments(self, parser):
+        parser.add_argument('academic_year', type=str, help='Academic year name (e.g. 2024-2025) or id')
+        parser.add_argument('--batch-size', type=int, default=50, help='Course offerings per batch')
+
+    def handle(self, *args, **options):
+        value = options['academic_year']
+        year = AcademicYear.objects.filter(name=value).first()
+        if year is None and value.isdigit():
+            year = AcademicYear.objects.filter(id=int(value)).first()
+        if year is None:
+            raise CommandError(f'Academic year "{value}" not found')
+
+        offering_ids = list(
+            CourseOffering.objects.filter(academic_year=year).order_by('id').values_list('id', flat=True)
+        )
+        batch_size = max(1, options['batch_size'])
+        total = 0
+        for start in range(0, len(offering_ids), batch_size):
+            batch = offering_ids[start:start + batch_size]
+            total += refresh_summaries(StudentGrade.objects.filter(course_offering_id__in=batch))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {total} grade summaries across {len(offering_ids)} course offerings for {year.name}'
+        ))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from academic.models import AcademicYear, CourseOffering
+from academic.standing import refresh_standings_for
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the StudentStanding table (totals, cumulative totals and ranks) for an academic year'
+
+    def add_arguments(self, parser):
+        parser.add_argument('academic_year', type=str, help='Academic year name (e.g. 2024-2025) or id')
+
+    def handle(self, *args, **options):
+        value = options['academic_year']
+        year = AcademicYear.objects.filter(name=value).first()
+        if year is None and value.isdigit():
+            year = AcademicYear.objects.filter(id=int(value)).first()
+        if year is None:
+            raise CommandError(f'Academic year "{value}" not found')
+
+        offering_ids = list(CourseOffering.objects.filter(academic_year=year).values_list('id', flat=True))
+        total = refresh_standings_for(offering_ids)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {total} student standings across {len(offering_ids)} course offerings for {year.name}'
+        ))
@@ -0,0 +1,112 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from academic.jobs import QUEUE_KEY, purge_stale_uploads, queue_connection, run_job
+from academic.models import BackgroundJob
+from academic.quiz_deadlines import sweep_expired_attempts
+
+
+class Command(BaseCommand):
+    help = (
+        'Run the background job worker (heavy uploads, exports and file generation). '
+        'Alongside the jobs a maintenance thread closes timed quiz attempts whose deadline '
+        'has passed.'
+    )
+
+    # Seconds between purges of unused preview and job uploads
+    PURGE_INTERVAL = 60 * 10
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument('--poll', type=int, default=5, help='Seconds to block waiting for a job')
+        parser.add_argument(
+            '--stale-minutes', type=int, default=60,
+            help='RUNNING jobs older than this are marked FAILED on startup'
+        )
+        parser.add_argument(
+            '--quiz-sweep-interval', type=int, default=10,
+            help='Seconds between sweeps of expired quiz attempts (0 disables the sweep)'
+        )
+
+    def handle(self, *args, **options):
+        self._fail_interrupted(options['stale_minutes'])
+        conn = queue_connection()
+        self.stdout.write(self.style.SUCCESS('Job worker started'))
+
+        quiz_sweep_interval = options['quiz_sweep_interval']
+        if options['once']:
+            if quiz_sweep_interval:
+                self._maintain()
+        elif quiz_sweep_interval:
+            # Deadlines keep being enforced while a long job runs
+            threading.Thread(
+                target=self._maintenance_loop, args=(quiz_sweep_interval,),
+                name='job-maintenance', daemon=True,
+            ).start()
+
+        last_purge = 0.0
+        while True:
+            item = conn.brpop(QUEUE_KEY, timeout=options['poll'])
+            close_old_connections()
+            if item:
+                self._run(int(item[1]))
+                continue
+
+            # Queue idle: drop previewed uploads nobody committed
+            if time.monotonic() - last_purge >= self.PURGE_INTERVAL:
+                last_purge = time.monotonic()
+                purge_stale_uploads()
+
+            # Pick up jobs whose push was lost
+            ran = False
+            for job_id in self._orphaned_ids(0 if options['once'] else 30):
+                ran = self._run(job_id) or ran
+            if options['once'] and not ran:
+                return
+
+    def _run(self, job_id):
+        ran = run_job(job_id)
+        if ran:
+            job = BackgroundJob.objects.get(id=job_id)
+            self.stdout.write(f'Job #{job.id} {job.job_type}: {job.status}')
+        close_old_connections()
+        return ran
+
+    def _maintenance_loop(self, quiz_sweep_interval):
+        while True:
+            self._maintain()
+            time.sleep(quiz_sweep_interval)
+
+    def _maintain(self):
+        close_old_connections()
+        self._sweep_quiz_deadlines()
+        close_old_connections()
+
+    def _sweep_quiz_deadlines(self):
+        try:
+            timed_out = sweep_expired_attempts()
+        except Exception as e:
+            self.stderr.write(f'Quiz deadline sweep failed: {e}')
+            return
+        if timed_out:
+            self.stdout.write(f'Timed out {timed_out} expired quiz attempts')
+
+    def _orphaned_ids(self, min_age_seconds):
+        cutoff = timezone.now() - timedelta(seconds=min_age_seconds)
+        return list(
+            BackgroundJob.objects.filter(status=BackgroundJob.Status.PENDING, created_at__lt=cutoff)
+            .order_by('created_at').values_list('id', flat=True)[:20]
+        )
+
+    def _fail_interrupted(self, stale_minutes):
+        cutoff = timezone.now() - timedelta(minutes=stale_minutes)
+        count = BackgroundJob.objects.filter(
+            status=BackgroundJob.Status.RUNNING, started_at__lt=cutoff
+        ).update(status=BackgroundJob.Status.FAILED, error='Worker interrupted', finished_at=timezone.now())
+        if count:
+            self.stdout.write(self.style.WARNING(f'Marked {count} interrupted jobs as failed'))
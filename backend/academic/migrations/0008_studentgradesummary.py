@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0007_merge_20260701_1106'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentGradeSummary',
+            fields=[
+                ('grade', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='academic.studentgrade')),
+                ('attendance_grade', models.DecimalField(decimal_places=2, default=0, max_digits=6)),
+                ('quizzes_grade', models.DecimalField(decimal_places=2, default=0, max_digits=6)),
+                ('midterm', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('practical', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('final', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('coursework', models.DecimalField(decimal_places=2, default=0, max_digits=6)),
+                ('total_grade', models.DecimalField(decimal_places=2, default=0, max_digits=6)),
+                ('max_total', models.DecimalField(decimal_places=2, default=100, max_digits=6)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course_offering', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grade_summaries', to='academic.courseoffering')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grade_summaries', to='academic.student')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['course_offering', 'student'], name='academic_st_course__1bb4a1_idx'), models.Index(fields=['student', 'course_offering'], name='academic_st_student_2aacdd_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0008_studentgradesummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackgroundJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_type', models.CharField(choices=[('STUDENT_UPLOAD', 'رفع طلاب'), ('DOCTOR_UPLOAD', 'رفع أعضاء هيئة تدريس'), ('EXAM_GRADES_UPLOAD', 'رفع درجات الامتحانات'), ('ACADEMIC_EXPORT', 'تصدير البيانات الأكاديمية'), ('CERTIFICATE_ZIP', 'رفع شهادات (ZIP)'), ('ATTENDANCE_EXCEL', 'ملف حضور Excel')], max_length=30)),
+                ('status', models.CharField(choices=[('PENDING', 'في الانتظار'), ('RUNNING', 'قيد التنفيذ'), ('SUCCEEDED', 'تم بنجاح'), ('FAILED', 'فشل')], default='PENDING', max_length=10)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('file_name', models.CharField(blank=True, max_length=255)),
+                ('total_rows', models.IntegerField(default=0)),
+                ('processed_rows', models.IntegerField(default=0)),
+                ('message', models.CharField(blank=True, max_length=255)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('result_file', models.CharField(blank=True, max_length=500)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='background_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='academic_ba_status_c4d72f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0009_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='backgroundjob',
+            name='job_type',
+            field=models.CharField(choices=[('STUDENT_UPLOAD', 'رفع طلاب'), ('DOCTOR_UPLOAD', 'رفع أعضاء هيئة تدريس'), ('EXAM_GRADES_UPLOAD', 'رفع درجات الامتحانات'), ('ACADEMIC_EXPORT', 'تصدير البيانات الأكاديمية'), ('CERTIFICATE_ZIP', 'رفع شهادات (ZIP)'), ('ATTENDANCE_EXCEL', 'ملف حضور Excel'), ('RESULT_PUBLISH', 'تجهيز النتائج المنشورة')], max_length=30),
+        ),
+    ]
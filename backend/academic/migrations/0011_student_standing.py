@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0010_result_publish_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentStanding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('courses', models.IntegerField(default=0)),
+                ('graded_courses', models.IntegerField(default=0)),
+                ('is_complete', models.BooleanField(default=False)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('max_total', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('percentage', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('cumulative_total', models.DecimalField(decimal_places=2, default=0, max_digits=9)),
+                ('cumulative_max', models.DecimalField(decimal_places=2, default=0, max_digits=9)),
+                ('cumulative_percentage', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('rank_in_level', models.IntegerField(blank=True, null=True)),
+                ('rank_in_department', models.IntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('academic_year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='academic.academicyear')),
+                ('department', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='academic.department')),
+                ('level', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='academic.level')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='academic.student')),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='academic.term')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'level', 'rank_in_department'], name='academic_st_term_id_0a9fe2_idx'), models.Index(fields=['term', 'rank_in_level'], name='academic_st_term_id_1fefb7_idx')],
+                'unique_together': {('student', 'term')},
+            },
+        ),
+    ]
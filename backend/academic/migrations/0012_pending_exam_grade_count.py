@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def count_pending_grades(apps, schema_editor):
+    ExamGrade = apps.get_model('academic', 'ExamGrade')
+    PendingExamGradeCount = apps.get_model('academic', 'PendingExamGradeCount')
+    counts = (
+        ExamGrade.objects.filter(is_approved=False)
+        .values('level_id', 'academic_year_id')
+        .annotate(
+            pending=Count('id'),
+            midterm=Count('id', filter=Q(midterm_grade__isnull=False)),
+            final=Count('id', filter=Q(final_grade__isnull=False)),
+        )
+        .order_by()
+    )
+    PendingExamGradeCount.objects.bulk_create([
+        PendingExamGradeCount(
+            level_id=row['level_id'],
+            academic_year_id=row['academic_year_id'],
+            pending_count=row['pending'],
+            midterm_count=row['midterm'],
+            final_count=row['final'],
+        )
+        for row in counts
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0011_student_standing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingExamGradeCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pending_count', models.IntegerField(default=0)),
+                ('midterm_count', models.IntegerField(default=0)),
+                ('final_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('academic_year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pending_exam_grade_counts', to='academic.academicyear')),
+                ('level', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pending_exam_grade_counts', to='academic.level')),
+            ],
+            options={
+                'unique_together': {('level', 'academic_year')},
+            },
+        ),
+        migrations.RunPython(count_pending_grades, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic', '0012_pending_exam_grade_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['course_offering', 'status', 'student'], name='academic_at_course__9ed0b0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['course_offering', 'date'], name='academic_at_course__3d61c9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['action', 'created_at'], name='academic_au_action_bfc39c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['created_at'], name='academic_au_created_9f4ad9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='courseoffering',
+            index=models.Index(fields=['doctor', 'academic_year'], name='academic_co_doctor__b3e502_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='courseoffering',
+            index=models.Index(fields=['level', 'academic_year', 'term'], name='academic_co_level_i_317b22_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='examgrade',
+            index=models.Index(fields=['level', 'is_approved'], name='academic_ex_level_i_5521e5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['level', 'academic_year', 'department', 'specialization'], name='academic_st_level_i_251be5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentgrade',
+            index=models.Index(fields=['course_offering', 'student'], name='academic_st_course__2161db_idx'),
+        ),
+    ]
@@ -225,6 +225,12 @@ class Student(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Class lists: level + year, narrowed by department and specialization
+            models.Index(fields=['level', 'academic_year', 'department', 'specialization']),
+        ]
+
     def __str__(self):
         return f"{self.full_name} ({self.national_id})"
 
@@ -263,6 +269,10 @@ class CourseOffering(models.Model):
 
     class Meta:
         unique_together = ('subject', 'academic_year', 'term', 'level', 'specialization')
+        indexes = [
+            models.Index(fields=['doctor', 'academic_year']),
+            models.Index(fields=['level', 'academic_year', 'term']),
+        ]
 
     def __str__(self):
         dept = self.level.department.name if self.level.department else 'Prep'
@@ -324,6 +334,11 @@ class Attendance(models.Model):
 
     class Meta:
         unique_together = ('student', 'course_offering', 'date')
+        indexes = [
+            # Present counts per (student, offering) are read from the index alone
+            models.Index(fields=['course_offering', 'status', 'student']),
+            models.Index(fields=['course_offering', 'date']),
+        ]
 
     def __str__(self):
         return f"{self.student.full_name} - {self.date}: {self.get_status_display()}"
@@ -356,6 +371,9 @@ class StudentGrade(models.Model):
 
     class Meta:
         unique_together = ('student', 'course_offering')
+        indexes = [
+            models.Index(fields=['course_offering', 'student']),
+        ]
 
     def attendance_grade(self):
         """Calculate attendance grade based on presence"""
@@ -365,10 +383,13 @@ class StudentGrade(models.Model):
         if not self.course_offering.grading_template:
             return 0
         total_sessions = self.course_offering.grading_template.attendance_slots
-        present_count = self.student.attendance_records.filter(
-            course_offering=self.course_offering,
-            status=Attendance.AttendanceStatus.PRESENT
-        ).count()
+        # Set in bulk by grade_engine.prime_grades() to avoid a COUNT per grade
+        present_count = getattr(self, '_present_count', None)
+        if present_count is None:
+            present_count = self.student.attendance_records.filter(
+                course_offering=self.course_offering,
+                status=Attendance.AttendanceStatus.PRESENT
+            ).count()
         if total_sessions == 0:
             return 0
         weight = float(self.course_offering.grading_template.attendance_weight)
@@ -395,6 +416,65 @@ class StudentGrade(models.Model):
         return f"{self.student.full_name} - {self.course_offering.subject.name}: {self.total_grade()}"
 
 
+class StudentGradeSummary(models.Model):
+    """Precomputed grade components for a StudentGrade, refreshed by grade_engine on writes"""
+    grade = models.OneToOneField(StudentGrade, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='grade_summaries')
+    course_offering = models.ForeignKey(CourseOffering, on_delete=models.CASCADE, related_name='grade_summaries')
+    attendance_grade = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    quizzes_grade = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    midterm = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    practical = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    final = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    coursework = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    total_grade = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    max_total = models.DecimalField(max_digits=6, decimal_places=2, default=100)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['course_offering', 'student']),
+            models.Index(fields=['student', 'course_offering']),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} - {self.course_offering_id}: {self.total_grade}"
+
+
+class StudentStanding(models.Model):
+    """Per-term and cumulative totals of a student with their rank, maintained by academic.standing"""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='standings')
+    academic_year = models.ForeignKey(AcademicYear, on_delete=models.CASCADE, related_name='standings')
+    term = models.ForeignKey(Term, on_delete=models.CASCADE, related_name='standings')
+    level = models.ForeignKey(Level, on_delete=models.CASCADE, related_name='standings')
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, null=True, blank=True, related_name='standings')
+    # Term totals against Subject.max_grade
+    courses = models.IntegerField(default=0)
+    graded_courses = models.IntegerField(default=0)
+    is_complete = models.BooleanField(default=False)  # Every course of the term has a final grade
+    total = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    max_total = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    percentage = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    # All terms of the student up to and including this one
+    cumulative_total = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    cumulative_max = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    cumulative_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    # Rank by cumulative percentage among complete standings of the term
+    rank_in_level = models.IntegerField(null=True, blank=True)  # Same level name across departments
+    rank_in_department = models.IntegerField(null=True, blank=True)  # Same level of the same department
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('student', 'term')
+        indexes = [
+            models.Index(fields=['term', 'level', 'rank_in_department']),
+            models.Index(fields=['term', 'rank_in_level']),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} - {self.term_id}: {self.cumulative_percentage}%"
+
+
 # Legacy model - keeping for backward compatibility
 class TeachingAssignment(models.Model):
     """Doctor assigned to teach a subject - DEPRECATED, use CourseOffering"""
@@ -434,11 +514,30 @@ class ExamGrade(models.Model):
 
     class Meta:
         unique_together = ('student', 'subject', 'academic_year')
+        indexes = [
+            models.Index(fields=['level', 'is_approved']),
+        ]
 
     def __str__(self):
         return f"{self.student.full_name} - {self.subject.code}: M={self.midterm_grade}, F={self.final_grade}"
 
 
+class PendingExamGradeCount(models.Model):
+    """Unapproved ExamGrade rows per level and year, maintained by the upload and approve paths"""
+    level = models.ForeignKey(Level, on_delete=models.CASCADE, related_name='pending_exam_grade_counts')
+    academic_year = models.ForeignKey(AcademicYear, on_delete=models.CASCADE, related_name='pending_exam_grade_counts')
+    pending_count = models.IntegerField(default=0)
+    midterm_count = models.IntegerField(default=0)  # Pending rows with a midterm grade
+    final_count = models.IntegerField(default=0)  # Pending rows with a final grade
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('level', 'academic_year')
+
+    def __str__(self):
+        return f"{self.level_id} ({self.academic_year_id}): {self.pending_count} pending"
+
+
 class Certificate(models.Model):
     """Graduation certificates for students"""
     student = models.ForeignKey(
@@ -488,6 +587,12 @@ class AuditLog(models.Model):
     details = models.JSONField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['action', 'created_at']),
+            models.Index(fields=['created_at']),
+        ]
+
     def __str__(self):
         return f"{self.action} by {self.performed_by.username} at {self.created_at}"
 
@@ -707,3 +812,56 @@ class UploadHistory(models.Model):
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = 'Upload histories'
+
+
+class BackgroundJob(models.Model):
+    """Heavy operation queued on Redis and executed by the `run_jobs` worker"""
+    class JobType(models.TextChoices):
+        STUDENT_UPLOAD = 'STUDENT_UPLOAD', 'رفع طلاب'
+        DOCTOR_UPLOAD = 'DOCTOR_UPLOAD', 'رفع أعضاء هيئة تدريس'
+        EXAM_GRADES_UPLOAD = 'EXAM_GRADES_UPLOAD', 'رفع درجات الامتحانات'
+        ACADEMIC_EXPORT = 'ACADEMIC_EXPORT', 'تصدير البيانات الأكاديمية'
+        CERTIFICATE_ZIP = 'CERTIFICATE_ZIP', 'رفع شهادات (ZIP)'
+        ATTENDANCE_EXCEL = 'ATTENDANCE_EXCEL', 'ملف حضور Excel'
+        RESULT_PUBLISH = 'RESULT_PUBLISH', 'تجهيز النتائج المنشورة'
+
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'في الانتظار'
+        RUNNING = 'RUNNING', 'قيد التنفيذ'
+        SUCCEEDED = 'SUCCEEDED', 'تم بنجاح'
+        FAILED = 'FAILED', 'فشل'
+
+    job_type = models.CharField(max_length=30, choices=JobType.choices)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='background_jobs'
+    )
+    params = models.JSONField(default=dict, blank=True)
+    file_name = models.CharField(max_length=255, blank=True)
+    # UploadHistory-style progress counters
+    total_rows = models.IntegerField(default=0)
+    processed_rows = models.IntegerField(default=0)
+    message = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    result_file = models.CharField(max_length=500, blank=True)  # Path in default_storage
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def progress(self):
+        if self.status == self.Status.SUCCEEDED:
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(100, int(self.processed_rows * 100 / self.total_rows))
+
+    def __str__(self):
+        return f"{self.get_job_type_display()} #{self.id} ({self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
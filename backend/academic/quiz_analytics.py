@@ -0,0 +1,179 @@
+"""
+Results report of a quiz for its doctor.
+
+The report holds the attempt list QuizResultsView has always returned plus
+the quiz's item analysis: score summary (mean, median, range), a score
+histogram and, per question, the correct rate, average points, the
+distribution of the selected choices and the discrimination index (the
+correct rate of the top DISCRIMINATION_GROUP of graded attempts minus that of
+the bottom group). It is built from three queries: the attempts, one GROUP BY
+over the answers per question and one per (question, choice). Questions,
+choices and the answer key come from the compiled quiz (see quiz_cache.py).
+
+Reports are cached under the quiz's payload version and a results version
+that submissions, timeouts, grading and new attempts bump through
+bump_quiz_results().
+"""
+import statistics
+import time
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, Q
+
+from .models import StudentQuizAnswer, StudentQuizAttempt
+from .quiz_cache import quiz_version
+
+# Safety net for changes that don't bump the results version (admin edits, ...)
+QUIZ_REPORT_TTL = 60 * 10
+
+HISTOGRAM_BINS = 10
+
+# Share of graded attempts in the upper and lower groups of the discrimination index
+DISCRIMINATION_GROUP = 0.27
+
+
+def _results_version_key(quiz_id):
+    return f'quiz:results:version:{quiz_id}'
+
+
+def _report_key(quiz_id, version):
+    return f'quiz:report:{quiz_id}:{version}'
+
+
+def _results_version(quiz_id):
+    return cache.get_or_set(_results_version_key(quiz_id), lambda: int(time.time() * 1000), timeout=None)
+
+
+def bump_quiz_results(quiz_ids):
+    """Invalidate the cached reports of the given quizzes"""
+    for quiz_id in set(quiz_ids):
+        key = _results_version_key(quiz_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, int(time.time() * 1000), timeout=None)
+
+
+def _histogram(scores, total_points):
+    """Counts of scores in HISTOGRAM_BINS equal-width bins over [0, total_points]"""
+    if total_points <= 0:
+        return []
+    width = total_points / HISTOGRAM_BINS
+    counts = [0] * HISTOGRAM_BINS
+    for score in scores:
+        index = min(max(int(score / width), 0), HISTOGRAM_BINS - 1)
+        counts[index] += 1
+    return [
+        {'from': round(i * width, 2), 'to': round((i + 1) * width, 2), 'count': count}
+        for i, count in enumerate(counts)
+    ]
+
+
+def _summary(attempts, submitted, scores):
+    return {
+        'attempts': len(attempts),
+        'submitted': submitted,
+        'graded': len(scores),
+        'mean': round(statistics.fmean(scores), 2) if scores else None,
+        'median': round(statistics.median(scores), 2) if scores else None,
+        'highest': max(scores) if scores else None,
+        'lowest': min(scores) if scores else None,
+    }
+
+
+def build_quiz_report(quiz_id, compiled):
+    """Compute the results report of a quiz"""
+    total_points = compiled['payload']['total_points']
+    attempts = list(
+        StudentQuizAttempt.objects.filter(quiz_id=quiz_id).order_by('id')
+        .values('id', 'student_id', 'student__full_name', 'score', 'submitted_at', 'is_graded')
+    )
+    graded = sorted(
+        (a for a in attempts if a['submitted_at'] and a['is_graded'] and a['score'] is not None),
+        key=lambda a: a['score'],
+    )
+    scores = [float(a['score']) for a in graded]
+    submitted = sum(1 for a in attempts if a['submitted_at'])
+
+    answers = StudentQuizAnswer.objects.filter(attempt__quiz_id=quiz_id, attempt__submitted_at__isnull=False)
+    correct = Q(points_earned=F('question__points'))
+    aggregates = {
+        'answered': Count('id'),
+        'correct': Count('id', filter=correct),
+        'average_points': Avg('points_earned'),
+    }
+    group_size = max(round(len(graded) * DISCRIMINATION_GROUP), 1) if len(graded) >= 2 else 0
+    if group_size:
+        lower = [a['id'] for a in graded[:group_size]]
+        upper = [a['id'] for a in graded[-group_size:]]
+        aggregates['upper_correct'] = Count('id', filter=correct & Q(attempt_id__in=upper))
+        aggregates['lower_correct'] = Count('id', filter=correct & Q(attempt_id__in=lower))
+    question_stats = {
+        row['question_id']: row
+        for row in answers.order_by().values('question_id').annotate(**aggregates)
+    }
+    choice_counts = {
+        (row['question_id'], row['selected_choice_id']): row['count']
+        for row in answers.filter(selected_choice__isnull=False).order_by()
+        .values('question_id', 'selected_choice_id').annotate(count=Count('id'))
+    }
+
+    questions = []
+    for question in compiled['payload']['questions']:
+        key = compiled['answer_key'][question['id']]
+        row = question_stats.get(question['id'], {})
+        discrimination = None
+        if group_size:
+            discrimination = round((row.get('upper_correct', 0) - row.get('lower_correct', 0)) / group_size, 2)
+        average_points = row.get('average_points')
+        questions.append({
+            'question_id': question['id'],
+            'question_text': question['question_text'],
+            'question_type': question['question_type'],
+            'points': question['points'],
+            'answered': row.get('answered', 0),
+            # Unanswered questions of a submitted attempt count as incorrect
+            'correct_rate': round(row.get('correct', 0) / submitted, 2) if submitted else None,
+            'average_points': round(float(average_points), 2) if average_points is not None else None,
+            'discrimination': discrimination,
+            'choices': [
+                {
+                    'id': choice['id'],
+                    'choice_text': choice['choice_text'],
+                    'is_correct': key['choices'].get(choice['id'], False),
+                    'count': choice_counts.get((question['id'], choice['id']), 0),
+                }
+                for choice in question['choices']
+            ],
+        })
+
+    return {
+        'quiz_id': quiz_id,
+        'total_points': total_points,
+        'attempts': [
+            {
+                'attempt_id': a['id'],
+                'student_id': a['student_id'],
+                'student_name': a['student__full_name'],
+                'score': float(a['score']) if a['score'] is not None else None,
+                'total_points': total_points,
+                'submitted_at': a['submitted_at'],
+                'is_graded': a['is_graded'],
+            }
+            for a in attempts
+        ],
+        'summary': _summary(attempts, submitted, scores),
+        'histogram': _histogram(scores, total_points),
+        'questions': questions,
+    }
+
+
+def get_quiz_report(quiz_id, compiled):
+    """Cached results report of a quiz, rebuilt after submissions, grading or quiz edits"""
+    version = f'{quiz_version(quiz_id)}:{_results_version(quiz_id)}'
+    key = _report_key(quiz_id, version)
+    report = cache.get(key)
+    if report is None:
+        report = build_quiz_report(quiz_id, compiled)
+        cache.set(key, report, timeout=QUIZ_REPORT_TTL)
+    return report
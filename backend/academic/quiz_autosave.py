@@ -0,0 +1,115 @@
+"""
+Autosave buffer of in-progress quiz answers.
+
+While a student takes a quiz the browser periodically sends the answers
+given so far to QuizAutosaveView. They are kept in a Redis hash per
+(quiz, student) — one field per question — instead of the database, so an
+exam full of students autosaving costs no MySQL writes. Loading the quiz
+again after a crash restores the buffered answers.
+
+The buffer is merged into the final submission (answers sent with the
+submit win) and written to StudentQuizAnswer in the same bulk upsert; an
+attempt closed by the deadline sweep is graded from its buffer.
+"""
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Refreshed on every save; an abandoned untimed attempt keeps its answers this long
+AUTOSAVE_TTL = 60 * 60 * 24
+
+
+def _buffer_key(quiz_id, student_id):
+    return f'academic:quiz:autosave:{quiz_id}:{student_id}'
+
+
+def buffer_connection():
+    """Redis connection holding the autosave hashes"""
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+def _answer_fields(answer_data):
+    if 'essay_answer' in answer_data:
+        return {'essay_answer': str(answer_data.get('essay_answer') or '')}
+    return {'choice_id': answer_data.get('choice_id')}
+
+
+def save_answers(quiz_id, student_id, answer_key, answers):
+    """Buffer answers to questions of the quiz; returns how many were saved.
+
+    Raises the Redis client's error when the buffer can't be written.
+    """
+    fields = {}
+    for answer_data in answers:
+        try:
+            question_id = int(answer_data.get('question_id'))
+        except (TypeError, ValueError):
+            continue
+        if question_id in answer_key:
+            fields[question_id] = json.dumps(_answer_fields(answer_data))
+    if not fields:
+        return 0
+
+    key = _buffer_key(quiz_id, student_id)
+    pipe = buffer_connection().pipeline()
+    pipe.hset(key, mapping=fields)
+    pipe.expire(key, AUTOSAVE_TTL)
+    pipe.execute()
+    return len(fields)
+
+
+def _decode(raw):
+    answers = []
+    for question_id, value in raw.items():
+        try:
+            answers.append({'question_id': int(question_id), **json.loads(value)})
+        except (TypeError, ValueError):
+            continue
+    return answers
+
+
+def buffered_answers_many(pairs):
+    """{(quiz_id, student_id): [answer dicts]} for many attempts in one round trip.
+
+    A Redis failure is logged and treated as an empty buffer: submissions
+    still go through with the answers they carry.
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return {}
+    try:
+        pipe = buffer_connection().pipeline()
+        for quiz_id, student_id in pairs:
+            pipe.hgetall(_buffer_key(quiz_id, student_id))
+        results = pipe.execute()
+    except Exception:
+        logger.warning('Could not read the quiz autosave buffer', exc_info=True)
+        return {pair: [] for pair in pairs}
+    return {pair: _decode(raw) for pair, raw in zip(pairs, results)}
+
+
+def buffered_answers(quiz_id, student_id):
+    """The buffered answers of one attempt"""
+    return buffered_answers_many([(quiz_id, student_id)])[(quiz_id, student_id)]
+
+
+def merge_answers(buffered, submitted):
+    """Buffered answers overridden by the ones sent with the submission"""
+    merged = {}
+    for answer_data in list(buffered) + list(submitted):
+        merged[str(answer_data.get('question_id'))] = answer_data
+    return list(merged.values())
+
+
+def clear_answers_many(pairs):
+    """Drop the buffers of submitted attempts"""
+    pairs = list(pairs)
+    if not pairs:
+        return
+    try:
+        buffer_connection().delete(*[_buffer_key(quiz_id, student_id) for quiz_id, student_id in pairs])
+    except Exception:
+        # The TTL removes them eventually
+        pass
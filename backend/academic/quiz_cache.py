@@ -0,0 +1,156 @@
+"""
+Precompiled, student-safe quiz payloads.
+
+When a quiz opens every enrolled student requests it within the same minute.
+Instead of rebuilding the question list per student, the quiz is compiled
+once into the payload StudentQuizAttemptView serves (questions and choices,
+never is_correct) and stored in Redis under a per-quiz version counter. Each
+process also keeps the payloads it has served, keyed by that version, so a
+quiz start costs one Redis round trip per request. The compiled record also
+carries the answer key quiz_grading scores submissions against; it never
+leaves the server.
+
+QuizViewSet and BulkQuizImportView call recompile_quiz() after creating or
+editing a quiz, which bumps the version and stores the new payload once the
+transaction commits; deleting a quiz calls invalidate_quiz(). Payloads are
+shared between requests and must be treated as read-only.
+"""
+import threading
+import time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Quiz
+
+# Safety net for edits made outside the API (admin site, shell)
+QUIZ_PAYLOAD_TTL = 60 * 30
+
+# Payloads kept in process memory per thread
+LOCAL_PAYLOAD_LIMIT = 64
+
+_local = threading.local()
+
+
+def _version_key(quiz_id):
+    return f'quiz:payload:version:{quiz_id}'
+
+
+def _payload_key(quiz_id, version):
+    return f'quiz:compiled:{quiz_id}:{version}'
+
+
+def quiz_version(quiz_id):
+    """Current version counter of a quiz's compiled payload"""
+    # Seed with a timestamp so a flushed counter never reuses an old version
+    return cache.get_or_set(_version_key(quiz_id), lambda: int(time.time() * 1000), timeout=None)
+
+
+def _bump(quiz_id):
+    key = _version_key(quiz_id)
+    try:
+        version = cache.incr(key)
+    except ValueError:
+        version = int(time.time() * 1000)
+        cache.set(key, version, timeout=None)
+    _local_payloads().pop(quiz_id, None)
+    return version
+
+
+def _local_payloads():
+    payloads = getattr(_local, 'payloads', None)
+    if payloads is None:
+        payloads = _local.payloads = {}
+    return payloads
+
+
+def compile_quiz(quiz_id):
+    """Build the cached record of a quiz (None if it doesn't exist).
+
+    'payload' is exactly what a student receives; 'answer_key' maps question
+    ids to their type, points and {choice_id: is_correct}; the other keys are
+    used by the views to check access without loading the quiz row.
+    """
+    from .quiz_views import get_relative_url
+
+    quiz = Quiz.objects.filter(id=quiz_id).prefetch_related('questions__choices').first()
+    if quiz is None:
+        return None
+
+    questions = []
+    answer_key = {}
+    for q in quiz.questions.all():
+        question_data = {
+            'id': q.id,
+            'question_text': q.question_text,
+            'question_type': q.question_type,
+            'question_image': get_relative_url(q.question_image),
+            'points': float(q.points),
+            'choices': [],
+        }
+        key = {'question_type': q.question_type, 'points': Decimal(q.points), 'choices': {}}
+        if q.question_type == 'MCQ':
+            for choice in q.choices.all():
+                question_data['choices'].append({
+                    'id': choice.id,
+                    'choice_text': choice.choice_text,
+                })
+                key['choices'][choice.id] = choice.is_correct
+        questions.append(question_data)
+        answer_key[q.id] = key
+
+    return {
+        'is_active': quiz.is_active,
+        'course_offering_id': quiz.course_offering_id,
+        'has_essay': any(key['question_type'] == 'ESSAY' for key in answer_key.values()),
+        'answer_key': answer_key,
+        'payload': {
+            'quiz_id': quiz.id,
+            'title': quiz.title,
+            'description': quiz.description,
+            'total_points': float(quiz.total_points),
+            'time_limit_minutes': quiz.time_limit_minutes,
+            'image': get_relative_url(quiz.image),
+            'questions': questions,
+        },
+    }
+
+
+def get_compiled_quiz(quiz_id):
+    """Compiled record of a quiz (process memory, then Redis, then the database)"""
+    version = quiz_version(quiz_id)
+    payloads = _local_payloads()
+    local = payloads.get(quiz_id)
+    if local is not None and local[0] == version:
+        return local[1]
+
+    key = _payload_key(quiz_id, version)
+    compiled = cache.get(key)
+    if compiled is None:
+        compiled = compile_quiz(quiz_id)
+        if compiled is None:
+            return None
+        cache.set(key, compiled, timeout=QUIZ_PAYLOAD_TTL)
+
+    if len(payloads) >= LOCAL_PAYLOAD_LIMIT:
+        payloads.clear()
+    payloads[quiz_id] = (version, compiled)
+    return compiled
+
+
+def _recompile(quiz_id):
+    version = _bump(quiz_id)
+    compiled = compile_quiz(quiz_id)
+    if compiled is not None:
+        cache.set(_payload_key(quiz_id, version), compiled, timeout=QUIZ_PAYLOAD_TTL)
+
+
+def recompile_quiz(quiz_id):
+    """Rebuild a quiz's payload after the current transaction commits"""
+    transaction.on_commit(lambda: _recompile(quiz_id))
+
+
+def invalidate_quiz(quiz_id):
+    """Drop a quiz's cached payload after the current transaction commits"""
+    transaction.on_commit(lambda: _bump(quiz_id))
@@ -0,0 +1,94 @@
+"""
+Server-side deadlines of timed quiz attempts.
+
+An attempt of a quiz with time_limit_minutes must be submitted by
+started_at + time limit (plus DEADLINE_GRACE_SECONDS for the browser's own
+auto-submit to arrive). When StudentQuizAttemptView hands out a timed quiz
+it registers the attempt in a Redis sorted set scored by its deadline and
+stores the deadline under the (quiz, student) pair, so a late submit is
+recognized with one cache read and the attempt is closed on the spot.
+
+The job worker (run_jobs) calls sweep_expired_attempts() from its own thread,
+so long jobs don't hold it up: it pops the attempts whose deadline has passed
+from the sorted set in batches and closes the ones still open with the
+TIMEOUT status, grading whatever was answered. Only expired entries are
+read, never the attempts table.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+DEADLINES_KEY = 'academic:quiz:deadlines'
+
+# Allowance for the browser's auto-submit to reach the server
+DEADLINE_GRACE_SECONDS = 30
+
+SWEEP_BATCH_SIZE = 200
+
+
+def _deadline_key(quiz_id, student_id):
+    return f'quiz:deadline:{quiz_id}:{student_id}'
+
+
+def deadlines_connection():
+    """Redis connection holding the deadline sorted set"""
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+def attempt_deadline(attempt, time_limit_minutes):
+    """When an attempt's time runs out (None for quizzes without a time limit)"""
+    if not time_limit_minutes:
+        return None
+    return attempt.started_at + timedelta(minutes=time_limit_minutes)
+
+
+def track_attempt(attempt, time_limit_minutes):
+    """Register an open attempt of a timed quiz; safe to call on every quiz load"""
+    deadline = attempt_deadline(attempt, time_limit_minutes)
+    if deadline is None:
+        return None
+    expires = deadline.timestamp() + DEADLINE_GRACE_SECONDS
+    # Outlives the sweep by far; a submitted attempt is rejected by the database anyway
+    cache.set(_deadline_key(attempt.quiz_id, attempt.student_id), expires, timeout=time_limit_minutes * 60 + 60 * 60 * 24)
+    try:
+        deadlines_connection().zadd(DEADLINES_KEY, {attempt.id: expires})
+    except Exception:
+        # Without the sorted set entry the attempt is still closed when it's submitted late
+        logger.warning('Could not register the deadline of quiz attempt %s', attempt.id, exc_info=True)
+    return deadline
+
+
+def deadline_passed(quiz_id, student_id):
+    """Whether the student's attempt of a quiz is past its deadline (no database access)"""
+    expires = cache.get(_deadline_key(quiz_id, student_id))
+    return expires is not None and time.time() > expires
+
+
+def clear_deadline(attempt):
+    """Take a submitted attempt out of the sweep"""
+    try:
+        deadlines_connection().zrem(DEADLINES_KEY, attempt.id)
+    except Exception:
+        pass
+
+
+def sweep_expired_attempts(batch_size=SWEEP_BATCH_SIZE, now=None):
+    """Close the open attempts whose deadline has passed. Returns how many were timed out."""
+    from .models import StudentQuizAttempt
+    from .quiz_grading import expire_attempts
+
+    conn = deadlines_connection()
+    now = now or time.time()
+    timed_out = 0
+    while True:
+        ids = conn.zrangebyscore(DEADLINES_KEY, '-inf', now, start=0, num=batch_size)
+        if not ids:
+            return timed_out
+        attempts = list(StudentQuizAttempt.objects.filter(id__in=[int(i) for i in ids], submitted_at__isnull=True))
+        timed_out += expire_attempts(attempts)
+        conn.zrem(DEADLINES_KEY, *ids)
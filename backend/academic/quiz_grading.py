@@ -0,0 +1,147 @@
+"""
+Auto-grading of quiz submissions.
+
+A submission is scored in memory against the answer key of the compiled quiz
+(see quiz_cache.py): no question or choice rows are read while grading. The
+attempt is closed with a conditional UPDATE, so a submission racing another
+one for the same attempt is rejected instead of being graded twice, and all
+of its StudentQuizAnswer rows are written with one bulk upsert in the same
+transaction. Answers autosaved during the attempt (see quiz_autosave.py)
+are merged into the submission. Attempts that run out of time are closed the
+same way, in batches, by expire_attempts() (see quiz_deadlines.py).
+
+Attempt scores do not feed StudentGrade (the doctor enters the quizzes
+grade), so closing an attempt leaves the grade summaries and standings alone.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .db_utils import bulk_upsert
+from .models import StudentQuizAnswer, StudentQuizAttempt
+from .quiz_analytics import bump_quiz_results
+from .quiz_autosave import buffered_answers, buffered_answers_many, clear_answers_many, merge_answers
+from .quiz_cache import get_compiled_quiz
+from .quiz_deadlines import clear_deadline
+
+
+def _as_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def grade_answers(attempt_id, answer_key, answers):
+    """Score submitted answers in memory.
+
+    Returns (unsaved StudentQuizAnswer rows, points earned on MCQ questions).
+    Answers to questions outside the quiz are ignored; the last answer given
+    for a question wins.
+    """
+    by_question = {}
+    for answer_data in answers:
+        question_id = _as_id(answer_data.get('question_id'))
+        if question_id in answer_key:
+            by_question[question_id] = answer_data
+
+    rows = []
+    total_score = Decimal(0)
+    for question_id, answer_data in by_question.items():
+        key = answer_key[question_id]
+        answer = StudentQuizAnswer(attempt_id=attempt_id, question_id=question_id)
+        if key['question_type'] == 'MCQ':
+            choice_id = _as_id(answer_data.get('choice_id'))
+            if choice_id in key['choices']:
+                answer.selected_choice_id = choice_id
+                if key['choices'][choice_id]:
+                    answer.points_earned = key['points']
+                    total_score += key['points']
+                else:
+                    answer.points_earned = 0
+        else:
+            # Essay - save answer, doctor grades later
+            answer.essay_answer = answer_data.get('essay_answer') or ''
+        rows.append(answer)
+    return rows, total_score
+
+
+def _outcome(compiled, total_score):
+    """(score, is_graded, status) of a graded submission"""
+    if compiled['has_essay']:
+        # Essay/Mixed quiz: score is None until doctor grades
+        return None, False, StudentQuizAttempt.AttemptStatus.SUBMITTED
+    # MCQ-only quiz: auto-grade immediately
+    return total_score, True, StudentQuizAttempt.AttemptStatus.GRADED
+
+
+def _close(attempt, submitted_at, score, is_graded, status):
+    """Conditionally close an open attempt; False if it was already submitted"""
+    closed = StudentQuizAttempt.objects.filter(id=attempt.id, submitted_at__isnull=True).update(
+        submitted_at=submitted_at, score=score, is_graded=is_graded, status=status,
+    )
+    if closed:
+        attempt.submitted_at = submitted_at
+        attempt.score = score
+        attempt.is_graded = is_graded
+        attempt.status = status
+    return bool(closed)
+
+
+def _save_answers(rows):
+    bulk_upsert(
+        StudentQuizAnswer, rows,
+        unique_fields=['attempt', 'question'],
+        update_fields=['selected_choice', 'essay_answer', 'points_earned'],
+    )
+
+
+def submit_attempt(attempt, compiled, answers):
+    """Grade and close an attempt; returns False if it was already submitted.
+
+    The submitted answers take precedence over autosaved ones. On success the
+    attempt instance is updated in place.
+    """
+    answers = merge_answers(buffered_answers(attempt.quiz_id, attempt.student_id), answers)
+    rows, total_score = grade_answers(attempt.id, compiled['answer_key'], answers)
+    score, is_graded, status = _outcome(compiled, total_score)
+
+    with transaction.atomic():
+        if not _close(attempt, timezone.now(), score, is_graded, status):
+            return False
+        _save_answers(rows)
+
+    clear_deadline(attempt)
+    clear_answers_many([(attempt.quiz_id, attempt.student_id)])
+    bump_quiz_results([attempt.quiz_id])
+    return True
+
+
+def expire_attempts(attempts):
+    """Close open attempts that ran out of time with the TIMEOUT status.
+
+    Whatever was autosaved is graded like a submission. Returns how many
+    attempts were closed.
+    """
+    now = timezone.now()
+    buffers = buffered_answers_many((attempt.quiz_id, attempt.student_id) for attempt in attempts)
+    closed = 0
+    with transaction.atomic():
+        rows = []
+        for attempt in attempts:
+            compiled = get_compiled_quiz(attempt.quiz_id)
+            if compiled is None:
+                continue
+            answers = buffers[(attempt.quiz_id, attempt.student_id)]
+            graded, total_score = grade_answers(attempt.id, compiled['answer_key'], answers)
+            score, is_graded, _ = _outcome(compiled, total_score)
+            if _close(attempt, now, score, is_graded, StudentQuizAttempt.AttemptStatus.TIMEOUT):
+                rows.extend(graded)
+                closed += 1
+        _save_answers(rows)
+
+    clear_answers_many(buffers)
+    if closed:
+        bump_quiz_results(attempt.quiz_id for attempt in attempts)
+    return closed
@@ -1,6 +1,8 @@
 """
 Quiz API Views for doctors to create quizzes and students to take them
 """
+from datetime import timedelta
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -14,6 +16,11 @@ from .models import (
     CourseOffering, Student
 )
 from .serializers import QuizSerializer
+from .quiz_analytics import bump_quiz_results, get_quiz_report
+from .quiz_autosave import buffered_answers, save_answers
+from .quiz_cache import get_compiled_quiz, invalidate_quiz, recompile_quiz
+from .quiz_deadlines import DEADLINE_GRACE_SECONDS, attempt_deadline, deadline_passed, track_attempt
+from .quiz_grading import expire_attempts, submit_attempt
 from users.permissions import IsDoctorRole, IsStudentRole, HasPaidTuition
 
 
@@ -63,6 +70,10 @@ class QuizViewSet(viewsets.ModelViewSet):
         
         return queryset.order_by('-created_at')
 
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        recompile_quiz(serializer.instance.id)
+
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         self.perform_destroy(instance)
@@ -217,12 +228,14 @@ class QuizViewSet(viewsets.ModelViewSet):
                         order=j + 1
                     )
         
+        recompile_quiz(quiz.id)
         return Response({'id': quiz.id, 'message': 'تم إنشاء الكويز بنجاح'}, status=status.HTTP_201_CREATED)
 
     def destroy(self, request, pk=None):
         try:
             quiz = Quiz.objects.get(pk=pk, course_offering__doctor=request.user)
             quiz.delete()
+            invalidate_quiz(pk)
             return Response({'message': 'تم حذف الكويز'})
         except Quiz.DoesNotExist:
             return Response({'error': 'الكويز غير موجود'}, status=status.HTTP_404_NOT_FOUND)
@@ -231,6 +244,7 @@ class QuizViewSet(viewsets.ModelViewSet):
 class StudentQuizListView(APIView):
     """List quizzes available for the student"""
     permission_classes = [IsStudentRole, HasPaidTuition]
+    query_budget = 6
 
     def get(self, request):
         try:
@@ -239,16 +253,22 @@ class StudentQuizListView(APIView):
             return Response({'error': 'الطالب غير موجود'}, status=status.HTTP_404_NOT_FOUND)
         
         # Get active quizzes for student's level
-        quizzes = Quiz.objects.filter(
+        quizzes = list(Quiz.objects.filter(
             is_active=True,
-            course_offering__level=student.level,
-            course_offering__academic_year=student.academic_year
-        ).select_related('course_offering', 'course_offering__subject')
+            course_offering__level_id=student.level_id,
+            course_offering__academic_year_id=student.academic_year_id
+        ).select_related('course_offering', 'course_offering__subject').annotate(
+            question_count=db_models.Count('questions')
+        ))
+        attempts = {
+            attempt.quiz_id: attempt
+            for attempt in StudentQuizAttempt.objects.filter(student=student, quiz__in=[q.id for q in quizzes])
+        }
         
         data = []
         for quiz in quizzes:
             # Check if student has attempted
-            attempt = StudentQuizAttempt.objects.filter(student=student, quiz=quiz).first()
+            attempt = attempts.get(quiz.id)
             
             data.append({
                 'id': quiz.id,
@@ -258,7 +278,7 @@ class StudentQuizListView(APIView):
                 'total_points': float(quiz.total_points),
                 'time_limit_minutes': quiz.time_limit_minutes,
                 'subject_name': quiz.course_offering.subject.name,
-                'question_count': quiz.questions.count(),
+                'question_count': quiz.question_count,
                 'attempted': attempt is not None,
                 'score': float(attempt.score) if attempt and attempt.score else None,
                 'submitted_at': attempt.submitted_at if attempt else None,
@@ -271,62 +291,64 @@ class StudentQuizAttemptView(APIView):
     """Start or submit a quiz attempt"""
     permission_classes = [IsStudentRole, HasPaidTuition]
 
+    # Including a cold compile of the quiz (3 queries) and the attempt write's savepoint
+    query_budget = {'GET': 9, 'POST': 10}
+
     def get(self, request, quiz_id):
         """Get quiz for taking (start attempt if not started)"""
+        # Served from the precompiled payload: a quiz start only touches the attempt row
+        compiled = get_compiled_quiz(quiz_id)
         try:
-            student = Student.objects.get(user=request.user)
-            quiz = Quiz.objects.get(id=quiz_id, is_active=True)
-        except (Student.DoesNotExist, Quiz.DoesNotExist):
+            student = request.user.student_profile
+        except Student.DoesNotExist:
+            student = None
+        if student is None or compiled is None or not compiled['is_active']:
             return Response({'error': 'غير موجود'}, status=status.HTTP_404_NOT_FOUND)
         
         # Check or create attempt
         attempt, created = StudentQuizAttempt.objects.get_or_create(
             student=student,
-            quiz=quiz
+            quiz_id=quiz_id
         )
         
+        if created:
+            bump_quiz_results([attempt.quiz_id])
+        
         if attempt.submitted_at:
             return Response({'error': 'لقد قمت بحل هذا الكويز مسبقاً'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Build quiz data for student
-        questions = []
-        for q in quiz.questions.all():
-            question_data = {
-                'id': q.id,
-                'question_text': q.question_text,
-                'question_type': q.question_type,
-                'question_image': get_relative_url(q.question_image),
-                'points': float(q.points),
-                'choices': []
-            }
-            if q.question_type == 'MCQ':
-                for choice in q.choices.all():
-                    question_data['choices'].append({
-                        'id': choice.id,
-                        'choice_text': choice.choice_text,
-                    })
-            questions.append(question_data)
+        deadline = track_attempt(attempt, compiled['payload']['time_limit_minutes'])
+        if deadline and timezone.now() > deadline + timedelta(seconds=DEADLINE_GRACE_SECONDS):
+            return Response({'error': 'انتهى وقت الكويز'}, status=status.HTTP_400_BAD_REQUEST)
         
         return Response({
             'attempt_id': attempt.id,
-            'quiz_id': quiz.id,
-            'title': quiz.title,
-            'description': quiz.description,
-            'total_points': float(quiz.total_points),
-            'time_limit_minutes': quiz.time_limit_minutes,
-            'image': get_relative_url(quiz.image),
-            'questions': questions,
+            **compiled['payload'],
             'started_at': attempt.started_at,
+            'expires_at': deadline,
+            'saved_answers': buffered_answers(quiz_id, student.id),
         })
 
     def post(self, request, quiz_id):
         """Submit quiz answers"""
+        compiled = get_compiled_quiz(quiz_id)
         try:
-            student = Student.objects.get(user=request.user)
-            quiz = Quiz.objects.get(id=quiz_id)
-            attempt = StudentQuizAttempt.objects.get(student=student, quiz=quiz)
-        except (Student.DoesNotExist, Quiz.DoesNotExist, StudentQuizAttempt.DoesNotExist):
+            student = request.user.student_profile
+        except Student.DoesNotExist:
+            student = None
+        if student is not None and deadline_passed(quiz_id, student.id):
+            # Close it now instead of leaving it to the deadline sweep (a no-op if already closed)
+            expire_attempts(list(
+                StudentQuizAttempt.objects.filter(student=student, quiz_id=quiz_id, submitted_at__isnull=True)
+            ))
+            return Response({'error': 'انتهى وقت الكويز'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            attempt = StudentQuizAttempt.objects.get(student=student, quiz_id=quiz_id)
+        except StudentQuizAttempt.DoesNotExist:
+            attempt = None
+        if attempt is None or compiled is None:
             return Response({'error': 'غير موجود'}, status=status.HTTP_404_NOT_FOUND)
+        total_points = compiled['payload']['total_points']
         
         if attempt.submitted_at:
             # Self-healing: If submitted but status is IN_PROGRESS (from previous bug), fix it
@@ -337,115 +359,104 @@ class StudentQuizAttemptView(APIView):
                     'message': 'تم تحديث الحالة بنجاح',
                     'status': attempt.status,
                     'score': attempt.score if attempt.is_graded else None,
-                    'total_points': float(quiz.total_points),
+                    'total_points': total_points,
                 })
             return Response({'error': 'لقد قمت بحل هذا الكويز مسبقاً'}, status=status.HTTP_400_BAD_REQUEST)
         
-        answers = request.data.get('answers', [])
-        total_score = 0
-        
-        for answer_data in answers:
-            question_id = answer_data.get('question_id')
-            try:
-                question = QuizQuestion.objects.get(id=question_id, quiz=quiz)
-            except QuizQuestion.DoesNotExist:
-                continue
-            
-            answer, _ = StudentQuizAnswer.objects.get_or_create(
-                attempt=attempt,
-                question=question
-            )
-            
-            if question.question_type == 'MCQ':
-                choice_id = answer_data.get('choice_id')
-                if choice_id:
-                    try:
-                        choice = QuizChoice.objects.get(id=choice_id, question=question)
-                        answer.selected_choice = choice
-                        if choice.is_correct:
-                            answer.points_earned = question.points
-                            total_score += float(question.points)
-                        else:
-                            answer.points_earned = 0
-                    except QuizChoice.DoesNotExist:
-                        pass
-            else:
-                # Essay - save answer, doctor grades later
-                answer.essay_answer = answer_data.get('essay_answer', '')
-            
-            answer.save()
-        
-        # Mark attempt as submitted
-        attempt.submitted_at = timezone.now()
-        
-        # Check if quiz has any essay questions
-        has_essay = quiz.questions.filter(question_type='ESSAY').exists()
+        # Attempts whose deadline isn't tracked (started before a cache flush) are checked here
+        deadline = attempt_deadline(attempt, compiled['payload']['time_limit_minutes'])
+        if deadline and timezone.now() > deadline + timedelta(seconds=DEADLINE_GRACE_SECONDS):
+            expire_attempts([attempt])
+            return Response({'error': 'انتهى وقت الكويز'}, status=status.HTTP_400_BAD_REQUEST)
         
-        if has_essay:
-            # Essay/Mixed quiz: score is None until doctor grades
-            attempt.score = None
-            attempt.is_graded = False
-            attempt.status = StudentQuizAttempt.AttemptStatus.SUBMITTED
-        else:
-            # MCQ-only quiz: auto-grade immediately
-            attempt.score = total_score
-            attempt.is_graded = True
-            attempt.status = StudentQuizAttempt.AttemptStatus.GRADED
-            
-        attempt.save()
+        answers = request.data.get('answers', [])
+        if not submit_attempt(attempt, compiled, answers):
+            return Response({'error': 'لقد قمت بحل هذا الكويز مسبقاً'}, status=status.HTTP_400_BAD_REQUEST)
         
         return Response({
             'message': 'تم تسليم الكويز بنجاح',
             'status': attempt.status,
-            'score': total_score if attempt.is_graded else None,
-            'total_points': float(quiz.total_points),
+            'score': float(attempt.score) if attempt.is_graded else None,
+            'total_points': total_points,
         })
 
 
+class QuizAutosaveView(APIView):
+    """Buffer the answers of an in-progress attempt (Redis only, no database writes)"""
+    permission_classes = [IsStudentRole, HasPaidTuition]
+    # 3 once the quiz is compiled
+    query_budget = 6
+
+    def post(self, request, quiz_id):
+        compiled = get_compiled_quiz(quiz_id)
+        try:
+            student = request.user.student_profile
+        except Student.DoesNotExist:
+            student = None
+        if student is None or compiled is None or not compiled['is_active']:
+            return Response({'error': 'غير موجود'}, status=status.HTTP_404_NOT_FOUND)
+        if deadline_passed(quiz_id, student.id):
+            return Response({'error': 'انتهى وقت الكويز'}, status=status.HTTP_400_BAD_REQUEST)
+        # Only an attempt the student started and has not submitted takes answers
+        # (one lookup on the (student, quiz) unique index)
+        if not StudentQuizAttempt.objects.filter(
+            student=student, quiz_id=quiz_id, status=StudentQuizAttempt.AttemptStatus.IN_PROGRESS
+        ).exists():
+            return Response({'error': 'لا توجد محاولة جارية لهذا الكويز'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        answers = request.data.get('answers', [])
+        if not isinstance(answers, list):
+            return Response({'error': 'صيغة الإجابات غير صحيحة'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            saved = save_answers(quiz_id, student.id, compiled['answer_key'], answers)
+        except Exception:
+            return Response({'error': 'تعذر حفظ الإجابات مؤقتاً'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        
+        return Response({'saved': saved, 'saved_at': timezone.now()})
+
+
 class QuizResultsView(APIView):
-    """View quiz results - Doctor views all attempts, Student views their own"""
+    """View quiz results - Doctor views all attempts, Student views their own.
+
+    Doctors get the attempt list, or with ?report=1 the whole cached results
+    report including the item analysis (see quiz_analytics.py).
+    """
+    query_budget = 8
     
     def get(self, request, quiz_id):
-        try:
-            quiz = Quiz.objects.get(id=quiz_id)
-        except Quiz.DoesNotExist:
+        compiled = get_compiled_quiz(quiz_id)
+        if compiled is None:
             return Response({'error': 'الكويز غير موجود'}, status=status.HTTP_404_NOT_FOUND)
         
         user = request.user
         
         if hasattr(user, 'role') and user.role == 'DOCTOR':
             # Doctor sees all attempts
-            attempts = StudentQuizAttempt.objects.filter(quiz=quiz).select_related('student')
-            data = []
-            for attempt in attempts:
-                data.append({
-                    'attempt_id': attempt.id,
-                    'student_id': attempt.student.id,
-                    'student_name': attempt.student.full_name,
-                    'score': float(attempt.score) if attempt.score else None,
-                    'total_points': float(quiz.total_points),
-                    'submitted_at': attempt.submitted_at,
-                    'is_graded': attempt.is_graded,
-                })
-            return Response(data)
+            report = get_quiz_report(quiz_id, compiled)
+            if request.query_params.get('report'):
+                return Response(report)
+            return Response(report['attempts'])
         
         elif hasattr(user, 'role') and user.role == 'STUDENT':
             # Student sees their own result with details
             try:
-                student = Student.objects.get(user=user)
-                attempt = StudentQuizAttempt.objects.get(student=student, quiz=quiz)
+                attempt = StudentQuizAttempt.objects.get(student=user.student_profile, quiz_id=quiz_id)
             except (Student.DoesNotExist, StudentQuizAttempt.DoesNotExist):
                 return Response({'error': 'لم تقم بحل هذا الكويز'}, status=status.HTTP_404_NOT_FOUND)
             
+            answer_key = compiled['answer_key']
+            user_answers = {a.question_id: a for a in attempt.answers.all()}
+            
             # Build detailed response
             questions_data = []
-            for question in quiz.questions.all().order_by('order'):
+            for question in compiled['payload']['questions']:
+                key = answer_key[question['id']]
                 q_data = {
-                    'id': question.id,
-                    'question_text': question.question_text,
-                    'question_image': get_relative_url(question.question_image),
-                    'question_type': question.question_type,
-                    'points': float(question.points),
+                    'id': question['id'],
+                    'question_text': question['question_text'],
+                    'question_image': question['question_image'],
+                    'question_type': question['question_type'],
+                    'points': question['points'],
                     'user_answer': None,
                     'is_correct': False,
                     'earned_points': 0,
@@ -453,14 +464,15 @@ class QuizResultsView(APIView):
                 }
                 
                 # Get user's answer for this question
-                try:
-                    user_ans_obj = StudentQuizAnswer.objects.get(attempt=attempt, question=question)
-                    q_data['earned_points'] = float(user_ans_obj.points_earned)
-                    q_data['is_correct'] = user_ans_obj.points_earned == question.points
+                user_ans_obj = user_answers.get(question['id'])
+                if user_ans_obj is not None:
+                    if user_ans_obj.points_earned is not None:
+                        q_data['earned_points'] = float(user_ans_obj.points_earned)
+                    q_data['is_correct'] = user_ans_obj.points_earned == key['points']
                     
-                    if question.question_type == 'MCQ':
+                    if question['question_type'] == 'MCQ':
                         q_data['user_answer'] = {
-                            'choice_id': user_ans_obj.selected_choice.id if user_ans_obj.selected_choice else None
+                            'choice_id': user_ans_obj.selected_choice_id
                         }
                     else:
                         q_data['user_answer'] = {
@@ -469,16 +481,14 @@ class QuizResultsView(APIView):
                         # For essay, check if graded
                         if not attempt.is_graded:
                             q_data['pending_review'] = True
-                except StudentQuizAnswer.DoesNotExist:
-                    pass
 
                 # Add choices if MCQ
-                if question.question_type == 'MCQ':
-                    for choice in question.choices.all().order_by('order'):
+                if question['question_type'] == 'MCQ':
+                    for choice in question['choices']:
                         q_data['choices'].append({
-                            'id': choice.id,
-                            'choice_text': choice.choice_text,
-                            'is_correct': choice.is_correct
+                            'id': choice['id'],
+                            'choice_text': choice['choice_text'],
+                            'is_correct': key['choices'].get(choice['id'], False)
                         })
                 
                 questions_data.append(q_data)
@@ -486,17 +496,20 @@ class QuizResultsView(APIView):
             # Calculate counts in python to be safe
             correct_count = 0
             wrong_count = 0
-            for ans in attempt.answers.all().select_related('question'):
-                if ans.points_earned == ans.question.points:
+            for ans in user_answers.values():
+                key = answer_key.get(ans.question_id)
+                if key is None:
+                    continue
+                if ans.points_earned == key['points']:
                     correct_count += 1
                 elif ans.points_earned == 0:
                     wrong_count += 1
 
             return Response({
-                'id': quiz.id,
-                'title': quiz.title,
+                'id': quiz_id,
+                'title': compiled['payload']['title'],
                 'score': float(attempt.score) if attempt.score is not None else None,
-                'total_points': float(quiz.total_points),
+                'total_points': compiled['payload']['total_points'],
                 'submitted_at': attempt.submitted_at,
                 'is_graded': attempt.is_graded,
                 'correct_count': correct_count,
@@ -616,6 +629,7 @@ class BulkQuizImportView(APIView):
                             order=c_idx + 1
                         )
 
+                recompile_quiz(quiz.id)
                 created_count += 1
             except Exception as e:
                 errors.append({
@@ -738,6 +752,7 @@ class GradeQuizAttemptView(APIView):
         attempt.is_graded = True
         attempt.status = StudentQuizAttempt.AttemptStatus.GRADED
         attempt.save()
+        bump_quiz_results([quiz.id])
 
         return Response({
             'message': 'تم حفظ الدرجات بنجاح',
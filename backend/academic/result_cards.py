@@ -0,0 +1,280 @@
+"""
+Public result cards served by StudentResultsQueryView.
+
+A result card is the whole response of the public results lookup for one
+student. Cards are built set-based (terms, publishing flags, offerings and
+grade summaries are loaded once for a batch of students) and cached in Redis
+under the student's national_id.
+
+A cached card records the version it was built at: the grades grid version
+of its (academic_year, level), which grade writes bump through
+grade_engine.refresh_summaries_for(), and a publishing version bumped when a
+ResultPublishing row of that level is published or unpublished.
+
+Publishing a scope enqueues a RESULT_PUBLISH job that pre-renders the cards
+of every affected student in batches into the cache, and an XLSX transcript
+of the scope can be produced for download. The first lookups after results
+go live are then served without touching the database. Cards are only ever
+served through the lookup, so unpublishing takes effect at once.
+"""
+import io
+import time
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from .grade_cache import grid_version
+from .grade_engine import summaries_for
+from .models import CourseOffering, ResultPublishing, Student, StudentGrade, Term
+
+# Safety net for changes that don't bump a version (student imports, subject edits, ...)
+RESULT_CARD_TTL = 60 * 30
+# Cards pre-rendered on publication stay cached through result day
+PUBLISHED_CARD_TTL = 60 * 60 * 24
+
+PRECOMPUTE_CHUNK_SIZE = 500
+
+
+def _card_key(national_id):
+    return f'results:card:{national_id}'
+
+
+def _publish_version_key(academic_year_id, level_id):
+    return f'results:version:{academic_year_id}:{level_id}'
+
+
+def _card_version(academic_year_id, level_id):
+    publish_version = cache.get_or_set(
+        _publish_version_key(academic_year_id, level_id), lambda: int(time.time() * 1000), timeout=None
+    )
+    return f'{grid_version(academic_year_id, level_id)}:{publish_version}'
+
+
+def bump_publish_version(academic_year_id, level_id):
+    """Invalidate the cached result cards of a level after a publishing change"""
+    key = _publish_version_key(academic_year_id, level_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), timeout=None)
+
+
+def _grade_row(offering, summary):
+    return {
+        'subject_name': offering.subject.name,
+        'subject_code': offering.subject.code,
+        'attendance': float(summary.attendance_grade),
+        'quizzes': float(summary.quizzes_grade),
+        'coursework': float(summary.coursework),
+        'midterm': float(summary.midterm) if summary.midterm is not None else None,
+        'final': float(summary.final),
+        'total': float(summary.total_grade),
+        'max_grade': offering.subject.max_grade,
+    }
+
+
+def student_offerings(offerings, student, level):
+    """The offerings of a level that apply to a student (department and specialization)"""
+    return [
+        o for o in offerings
+        if not (student.department_id and level.department_id and o.subject.department_id != student.department_id)
+        and not (student.specialization_id and o.specialization_id != student.specialization_id)
+    ]
+
+
+def build_result_cards(students):
+    """Return {student_id: card} for students of one academic year and level"""
+    students = list(students)
+    if not students:
+        return {}
+    academic_year = students[0].academic_year
+    level = students[0].level
+
+    terms = list(Term.objects.filter(academic_year=academic_year).order_by('id'))
+    published = {
+        (p.term_id, p.specialization_id): p.is_published
+        for p in ResultPublishing.objects.filter(academic_year=academic_year, level=level)
+    }
+    offerings = list(
+        CourseOffering.objects.filter(academic_year=academic_year, level=level).select_related('subject')
+    )
+    summaries = summaries_for(
+        StudentGrade.objects.filter(student__in=[s.id for s in students], course_offering__in=offerings)
+    ) if offerings else {}
+
+    cards = {}
+    for student in students:
+        card = {
+            'student': {
+                'full_name': student.full_name,
+                'national_id': student.national_id,
+                'level': level.get_name_display(),
+                'department': student.department.name if student.department else 'إعدادي',
+                'academic_year': academic_year.name
+            },
+            'terms': []
+        }
+
+        own_offerings = student_offerings(offerings, student, level)
+
+        for term in terms:
+            # A specialization's own publishing row wins over the level-wide one
+            if (term.id, student.specialization_id) in published:
+                is_published = published[(term.id, student.specialization_id)]
+            else:
+                is_published = published.get((term.id, None), False)
+
+            term_data = {
+                'term_name': term.get_name_display(),
+                'is_published': is_published,
+                'is_fully_graded': False,
+                'courses': []
+            }
+
+            term_offerings = [o for o in own_offerings if o.term_id == term.id]
+            if term_offerings:
+                courses = []
+                for offering in term_offerings:
+                    summary = summaries.get((student.id, offering.id))
+                    if not summary or summary.final is None:
+                        break
+                    courses.append(_grade_row(offering, summary))
+                else:
+                    term_data['is_fully_graded'] = True
+                    # Only include courses if both published and fully graded
+                    if is_published:
+                        term_data['courses'] = courses
+
+            card['terms'].append(term_data)
+        cards[student.id] = card
+    return cards
+
+
+def get_result_card(national_id):
+    """Return the card of a national ID (None if unknown), building it on a cache miss"""
+    cached = cache.get(_card_key(national_id))
+    if cached is not None and cached['version'] == _card_version(*cached['scope']):
+        return cached['data']
+
+    student = Student.objects.select_related(
+        'level', 'academic_year', 'department'
+    ).filter(national_id=national_id).first()
+    if student is None:
+        return None
+
+    scope = (student.academic_year_id, student.level_id)
+    version = _card_version(*scope)
+    card = build_result_cards([student])[student.id]
+    cache.set(_card_key(national_id), {'scope': scope, 'version': version, 'data': card}, timeout=RESULT_CARD_TTL)
+    return card
+
+
+def precompute_result_cards(students, published=False, on_card=None, progress=None):
+    """Build and cache the result cards of the given students (grouped per year and level).
+
+    Cards built for a publication are kept for PUBLISHED_CARD_TTL.
+    on_card(student, card) is called for every card built. Returns the number
+    of cards built.
+    """
+    students = students.select_related('level', 'academic_year', 'department').order_by('academic_year_id', 'level_id', 'id')
+    timeout = PUBLISHED_CARD_TTL if published else RESULT_CARD_TTL
+    built = 0
+    batch = []
+
+    def flush():
+        scope = (batch[0].academic_year_id, batch[0].level_id)
+        version = _card_version(*scope)
+        cards = build_result_cards(batch)
+        entries = {}
+        for s in batch:
+            if on_card:
+                on_card(s, cards[s.id])
+            entries[_card_key(s.national_id)] = {'scope': scope, 'version': version, 'data': cards[s.id]}
+        cache.set_many(entries, timeout=timeout)
+        return len(batch)
+
+    for student in students.iterator(chunk_size=PRECOMPUTE_CHUNK_SIZE):
+        if batch and (
+            len(batch) >= PRECOMPUTE_CHUNK_SIZE
+            or (student.academic_year_id, student.level_id) != (batch[0].academic_year_id, batch[0].level_id)
+        ):
+            built += flush()
+            batch = []
+            if progress:
+                progress(built)
+        batch.append(student)
+    if batch:
+        built += flush()
+    return built
+
+
+def publishing_students(publishings):
+    """Students whose result cards the given ResultPublishing rows affect"""
+    scopes = Q(pk__in=[])
+    for pub in publishings:
+        scope = Q(academic_year_id=pub.academic_year_id, level_id=pub.level_id)
+        if pub.specialization_id:
+            scope &= Q(specialization_id=pub.specialization_id)
+        scopes |= scope
+    return Student.objects.filter(scopes)
+
+
+TRANSCRIPT_HEADERS = [
+    'national_id', 'full_name', 'term', 'subject_code', 'subject_name',
+    'coursework', 'midterm', 'final', 'total', 'max_grade',
+]
+
+
+def run_result_publish_job(ctx):
+    """Pre-render the result cards (and optionally an XLSX transcript) of published scopes.
+
+    The transcript holds every student's grades, so it is kept in the private
+    job storage and only handed out through the job download endpoint.
+    """
+    from openpyxl import Workbook
+
+    publishings = list(
+        ResultPublishing.objects.select_related('academic_year', 'term', 'level')
+        .filter(id__in=ctx.params['publishing_ids']).order_by('id')
+    )
+    if not publishings:
+        return {'students': 0}
+    students = publishing_students(publishings)
+    term_names = {pub.term.get_name_display() for pub in publishings}
+    total = students.count()
+    ctx.progress(0, total, 'جاري تجهيز النتائج')
+
+    sheet = None
+    if ctx.params.get('transcripts'):
+        wb = Workbook(write_only=True)
+        sheet = wb.create_sheet('Results')
+        sheet.append(TRANSCRIPT_HEADERS)
+
+    def add_transcript_rows(student, card):
+        for term in card['terms']:
+            if term['term_name'] not in term_names:
+                continue
+            for course in term['courses']:
+                sheet.append([
+                    student.national_id, student.full_name, term['term_name'],
+                    course['subject_code'], course['subject_name'], course['coursework'],
+                    course['midterm'], course['final'], course['total'], course['max_grade'],
+                ])
+
+    built = precompute_result_cards(
+        students,
+        published=True,
+        on_card=add_transcript_rows if sheet is not None else None,
+        progress=lambda processed: ctx.progress(processed, total),
+    )
+
+    result = {'students': built}
+    if sheet is not None:
+        output = io.BytesIO()
+        wb.save(output)
+        pub = publishings[0]
+        scope = pub.level.name if len(publishings) == 1 else f'{len(publishings)}_levels'
+        file_name = f'results_{pub.academic_year.name}_{scope}_{pub.term.name}.xlsx'
+        ctx.save_result_file(file_name, output.getvalue())
+        result['file_name'] = file_name
+    return result
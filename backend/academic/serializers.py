@@ -1,10 +1,12 @@
+from django.db import models
 from rest_framework import serializers
 from .models import (
     Department, Specialization, AcademicYear, Level, Subject,
     Student, TeachingAssignment, ExamGrade, Certificate,
     Term, GradingTemplate, CourseOffering, Lecture, Attendance, StudentGrade,
-    Quiz, AuditLog, ContactMessage, Announcement, UploadHistory
+    Quiz, AuditLog, ContactMessage, Announcement, UploadHistory, BackgroundJob
 )
+from .grade_engine import prime_grades
 
 
 class DepartmentSerializer(serializers.ModelSerializer):
@@ -207,6 +209,14 @@ class AttendanceSerializer(serializers.ModelSerializer):
         return None
 
 
+class StudentGradeListSerializer(serializers.ListSerializer):
+    """Primes all grades with attendance counts in bulk before serializing them"""
+
+    def to_representation(self, data):
+        items = data.all() if isinstance(data, models.manager.BaseManager) else data
+        return super().to_representation(prime_grades(items))
+
+
 class StudentGradeSerializer(serializers.ModelSerializer):
     student_name = serializers.CharField(source='student.full_name', read_only=True)
     student_national_id = serializers.CharField(source='student.national_id', read_only=True)
@@ -240,6 +250,7 @@ class StudentGradeSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at',
         ]
         read_only_fields = ['coursework']
+        list_serializer_class = StudentGradeListSerializer
 
     def get_attendance_grade(self, obj):
         if obj.attendance is not None:
@@ -400,3 +411,24 @@ class UploadHistorySerializer(serializers.ModelSerializer):
         full = f"{u.first_name} {u.last_name}".strip()
         return full or u.username
 
+
+
+class BackgroundJobSerializer(serializers.ModelSerializer):
+    job_type_display = serializers.CharField(source='get_job_type_display', read_only=True)
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    progress = serializers.IntegerField(read_only=True)
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = BackgroundJob
+        fields = [
+            'id', 'job_type', 'job_type_display', 'status', 'status_display',
+            'file_name', 'total_rows', 'processed_rows', 'progress', 'message',
+            'result', 'error', 'download_url', 'created_at', 'started_at', 'finished_at',
+        ]
+
+    def get_download_url(self, obj):
+        if not obj.result_file or obj.status != BackgroundJob.Status.SUCCEEDED:
+            return None
+        from django.urls import reverse
+        return reverse('job-download', args=[obj.id])
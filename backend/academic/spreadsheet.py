@@ -0,0 +1,170 @@
+"""
+Bounded-memory reader for uploaded CSV/Excel sheets.
+
+XLSX files are read with openpyxl in read_only mode and CSV files with
+pandas' chunked reader, so an upload is turned into DataFrame batches
+without holding the raw bytes, a full workbook and a full DataFrame in
+memory at once. Size and row limits are enforced while reading.
+
+Batches keep the sheet position in their index (row N of the sheet is
+index N - 2), so importers can keep reporting "صف {index + 2}".
+"""
+from django.conf import settings
+import pandas as pd
+
+BATCH_SIZE = 1000
+
+# Upload limits (overridable in settings)
+MAX_UPLOAD_BYTES = getattr(settings, 'UPLOAD_MAX_BYTES', 20 * 1024 * 1024)
+MAX_UPLOAD_ROWS = getattr(settings, 'UPLOAD_MAX_ROWS', 50000)
+
+# Columns always read as text so IDs keep their digits
+TEXT_COLUMNS = ('national_id',)
+
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+
+
+class SpreadsheetError(ValueError):
+    """The upload cannot be read or breaks the limits (message is user facing)"""
+
+
+def check_upload(file, max_bytes=None, name=None):
+    """Reject unsupported or oversized files before reading them"""
+    name = (name or getattr(file, 'name', '') or '').lower()
+    if not name.endswith(SUPPORTED_EXTENSIONS):
+        raise SpreadsheetError('صيغة الملف غير مدعومة. استخدم CSV أو Excel.')
+
+    max_bytes = max_bytes or MAX_UPLOAD_BYTES
+    size = getattr(file, 'size', None)
+    if size is not None and size > max_bytes:
+        raise SpreadsheetError(
+            f'حجم الملف ({size // (1024 * 1024)} ميجابايت) يتجاوز الحد المسموح '
+            f'({max_bytes // (1024 * 1024)} ميجابايت)'
+        )
+
+
+def _normalize_header(header):
+    return [str(col).strip() if col is not None else f'Unnamed: {i}' for i, col in enumerate(header)]
+
+
+def _finish_batch(rows, header, start, text_columns=TEXT_COLUMNS):
+    """DataFrame for a batch of raw rows; blank rows are dropped"""
+    df = pd.DataFrame(rows, columns=header, index=range(start, start + len(rows)), dtype=object)
+    for col in text_columns:
+        if col in df.columns:
+            df[col] = df[col].map(_as_text)
+    return df.dropna(how='all')
+
+
+def _as_text(value):
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = str(value).strip()
+    return text or None
+
+
+def _iter_xlsx(file, batch_size, text_columns):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = _normalize_header(header)
+        width = len(header)
+
+        batch, start, position = [], 0, 0
+        for values in rows:
+            values = list(values[:width]) + [None] * (width - len(values))
+            values = [None if isinstance(v, str) and not v.strip() else v for v in values]
+            batch.append(values)
+            position += 1
+            if len(batch) >= batch_size:
+                yield _finish_batch(batch, header, start, text_columns)
+                batch, start = [], position
+        if batch:
+            yield _finish_batch(batch, header, start, text_columns)
+    finally:
+        wb.close()
+
+
+def _iter_csv(file, batch_size, text_columns):
+    reader = pd.read_csv(
+        file, chunksize=batch_size, dtype={col: str for col in text_columns},
+        skip_blank_lines=True,
+    )
+    for chunk in reader:
+        chunk.columns = _normalize_header(chunk.columns)
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        for col in text_columns:
+            if col in chunk.columns:
+                chunk[col] = chunk[col].map(_as_text)
+        yield chunk.dropna(how='all')
+
+
+def _iter_xls(file, batch_size, text_columns):
+    # Legacy .xls has no streaming reader; it is still bounded by the size limit
+    df = pd.read_excel(file, dtype=object)
+    for start in range(0, len(df), batch_size):
+        rows = df.iloc[start:start + batch_size]
+        yield _finish_batch(rows.where(rows.notna(), None).values.tolist(), _normalize_header(df.columns), start, text_columns)
+
+
+def iter_spreadsheet(file, batch_size=BATCH_SIZE, max_rows=None, max_bytes=None, name=None,
+                     text_columns=TEXT_COLUMNS):
+    """Yield the rows of an uploaded sheet as DataFrame batches.
+
+    Cells are kept as read (object dtype, empty cells are None); columns in
+    text_columns are normalized to strings. Raises SpreadsheetError for
+    unsupported or oversized files and when the sheet has more than
+    max_rows data rows.
+    """
+    check_upload(file, max_bytes, name)
+    name = (name or getattr(file, 'name', '') or '').lower()
+    max_rows = max_rows or MAX_UPLOAD_ROWS
+    file.seek(0)
+
+    if name.endswith('.csv'):
+        batches = _iter_csv(file, batch_size, text_columns)
+    elif name.endswith('.xlsx'):
+        batches = _iter_xlsx(file, batch_size, text_columns)
+    else:
+        batches = _iter_xls(file, batch_size, text_columns)
+
+    total = 0
+    try:
+        for batch in batches:
+            total += len(batch)
+            if total > max_rows:
+                raise SpreadsheetError(f'عدد الصفوف في الملف يتجاوز الحد المسموح ({max_rows} صف)')
+            yield batch
+    except SpreadsheetError:
+        raise
+    except Exception as e:
+        raise SpreadsheetError(f'خطأ في قراءة الملف: {str(e)}') from e
+
+
+def read_header(file, name=None):
+    """Column names of an uploaded sheet, reading only the first row"""
+    name = (name or getattr(file, 'name', '') or '').lower()
+    file.seek(0)
+    try:
+        if name.endswith('.csv'):
+            return _normalize_header(pd.read_csv(file, nrows=0).columns)
+        if name.endswith('.xlsx'):
+            from openpyxl import load_workbook
+            wb = load_workbook(file, read_only=True, data_only=True)
+            try:
+                header = next(wb.active.iter_rows(max_row=1, values_only=True), ())
+            finally:
+                wb.close()
+            return _normalize_header(header)
+        return _normalize_header(pd.read_excel(file, nrows=0).columns)
+    except Exception as e:
+        raise SpreadsheetError(f'خطأ في قراءة الملف: {str(e)}') from e
+    finally:
+        file.seek(0)
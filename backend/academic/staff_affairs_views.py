@@ -9,13 +9,16 @@ from django.db import transaction
 from django.db.models import Q
 from django.contrib.auth import get_user_model
 import pandas as pd
-import io
 
 from .models import (
     AuditLog, TeachingAssignment, Subject, Level, AcademicYear,
-    Term, GradingTemplate, CourseOffering, Specialization, UploadHistory
+    Term, GradingTemplate, CourseOffering, Specialization, UploadHistory, BackgroundJob
 )
+from .grade_engine import refresh_offerings_on_commit
+from .jobs import enqueue, job_accepted
+from .spreadsheet import iter_spreadsheet, read_header, check_upload, SpreadsheetError
 from users.permissions import IsStaffAffairsRole, IsDoctorRole, IsHODRole, IsStaffAffairsOrHODRole
+from users.hashers import make_initial_password
 
 User = get_user_model()
 
@@ -37,26 +40,23 @@ class UploadDoctorsView(APIView):
             )
 
         try:
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(io.BytesIO(file.read()))
-            elif file.name.endswith(('.xlsx', '.xls')):
-                df = pd.read_excel(io.BytesIO(file.read()))
-            else:
-                return Response(
-                    {'error': 'Unsupported file format. Use CSV or Excel.'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            # Only the header is read here; the worker streams the rows
+            try:
+                check_upload(file)
+                columns = read_header(file)
+            except SpreadsheetError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
             required_columns = ['national_id', 'full_name']
-            missing_columns = [col for col in required_columns if col not in df.columns]
+            missing_columns = [col for col in required_columns if col not in columns]
             if missing_columns:
                 return Response(
                     {'error': f'Missing required columns: {missing_columns}'}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            results = self._process_doctors(df, request.user)
-            return Response(results, status=status.HTTP_201_CREATED)
+            job = enqueue(BackgroundJob.JobType.DOCTOR_UPLOAD, request.user, upload=file)
+            return job_accepted(job)
 
         except Exception as e:
             return Response(
@@ -64,38 +64,43 @@ class UploadDoctorsView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    def _process_doctors(self, df, performed_by):
+    def _process_doctors(self, batches, performed_by, progress=None):
         created_count = 0
         skipped_count = 0
+        total_rows = 0
         errors = []
 
-        for index, row in df.iterrows():
-            try:
-                with transaction.atomic():
-                    national_id = str(row['national_id']).strip()
-                    full_name = str(row['full_name']).strip()
-                    email = str(row.get('email', '')).strip() if pd.notna(row.get('email')) else ''
-
-                    # Check for duplicates
-                    if User.objects.filter(national_id=national_id).exists():
-                        skipped_count += 1
-                        continue
-
-                    # Create doctor user account
-                    User.objects.create_user(
-                        username=national_id,
-                        password=national_id,
-                        first_name=full_name.split()[0] if full_name else '',
-                        last_name=' '.join(full_name.split()[1:]) if len(full_name.split()) > 1 else '',
-                        national_id=national_id,
-                        email=email,
-                        role='DOCTOR',
-                        first_login_required=True
-                    )
-                    created_count += 1
+        for df in batches:
+            for index, row in df.iterrows():
+                try:
+                    with transaction.atomic():
+                        national_id = str(row['national_id']).strip()
+                        full_name = str(row['full_name']).strip()
+                        email = str(row.get('email', '')).strip() if pd.notna(row.get('email')) else ''
+
+                        # Check for duplicates
+                        if User.objects.filter(national_id=national_id).exists():
+                            skipped_count += 1
+                            continue
+
+                        # Create doctor user account
+                        User.objects.create(
+                            username=national_id,
+                            password=make_initial_password(national_id),
+                            first_name=full_name.split()[0] if full_name else '',
+                            last_name=' '.join(full_name.split()[1:]) if len(full_name.split()) > 1 else '',
+                            national_id=national_id,
+                            email=User.objects.normalize_email(email),
+                            role='DOCTOR',
+                            first_login_required=True
+                        )
+                        created_count += 1
 
-            except Exception as e:
-                errors.append(f"Row {index + 2}: {str(e)}")
+                except Exception as e:
+                    errors.append(f"Row {index + 2}: {str(e)}")
+            total_rows += len(df)
+            if progress:
+                progress(total_rows)
 
         # Create audit log
         try:
@@ -118,7 +123,7 @@ class UploadDoctorsView(APIView):
                 upload_type='DOCTOR',
                 file_name='doctors_upload',
                 uploaded_by=performed_by,
-                total_rows=len(df),
+                total_rows=total_rows,
                 created_count=created_count,
                 updated_count=0,
                 error_count=len(errors),
@@ -134,6 +139,15 @@ class UploadDoctorsView(APIView):
         }
 
 
+def run_doctor_upload_job(ctx):
+    """Background job: create the doctor accounts of a validated upload"""
+    with ctx.open_upload() as f:
+        # Rows are streamed in bounded batches, like the other importers
+        return UploadDoctorsView()._process_doctors(
+            iter_spreadsheet(f), ctx.user, progress=ctx.progress
+        )
+
+
 class UploadStaffAffairsUsersView(APIView):
     """
     Upload Student Affairs users via Excel/CSV file.
@@ -151,25 +165,26 @@ class UploadStaffAffairsUsersView(APIView):
             )
 
         try:
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(io.BytesIO(file.read()))
-            elif file.name.endswith(('.xlsx', '.xls')):
-                df = pd.read_excel(io.BytesIO(file.read()))
-            else:
-                return Response(
-                    {'error': 'Unsupported file format. Use CSV or Excel.'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            try:
+                check_upload(file)
+                columns = read_header(file)
+            except SpreadsheetError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
             required_columns = ['national_id', 'full_name']
-            missing_columns = [col for col in required_columns if col not in df.columns]
+            missing_columns = [col for col in required_columns if col not in columns]
             if missing_columns:
                 return Response(
                     {'error': f'Missing required columns: {missing_columns}'}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            results = self._process_staff(df, request.user)
+            # Rows are read in bounded batches; a file over the limits is rejected as a whole
+            try:
+                with transaction.atomic():
+                    results = self._process_staff(iter_spreadsheet(file), request.user)
+            except SpreadsheetError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
             return Response(results, status=status.HTTP_201_CREATED)
 
         except Exception as e:
@@ -178,38 +193,41 @@ class UploadStaffAffairsUsersView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    def _process_staff(self, df, performed_by):
+    def _process_staff(self, batches, performed_by):
         created_count = 0
         skipped_count = 0
+        total_rows = 0
         errors = []
 
-        for index, row in df.iterrows():
-            try:
-                with transaction.atomic():
-                    national_id = str(row['national_id']).strip()
-                    full_name = str(row['full_name']).strip()
-                    email = str(row.get('email', '')).strip() if pd.notna(row.get('email')) else ''
-
-                    # Check for duplicates
-                    if User.objects.filter(national_id=national_id).exists():
-                        skipped_count += 1
-                        continue
-
-                    # Create student affairs user account
-                    User.objects.create_user(
-                        username=national_id,
-                        password=national_id,
-                        first_name=full_name.split()[0] if full_name else '',
-                        last_name=' '.join(full_name.split()[1:]) if len(full_name.split()) > 1 else '',
-                        national_id=national_id,
-                        email=email,
-                        role='STUDENT_AFFAIRS',
-                        first_login_required=True
-                    )
-                    created_count += 1
+        for df in batches:
+            total_rows += len(df)
+            for index, row in df.iterrows():
+                try:
+                    with transaction.atomic():
+                        national_id = str(row['national_id']).strip()
+                        full_name = str(row['full_name']).strip()
+                        email = str(row.get('email', '')).strip() if pd.notna(row.get('email')) else ''
+
+                        # Check for duplicates
+                        if User.objects.filter(national_id=national_id).exists():
+                            skipped_count += 1
+                            continue
+
+                        # Create student affairs user account
+                        User.objects.create(
+                            username=national_id,
+                            password=make_initial_password(national_id),
+                            first_name=full_name.split()[0] if full_name else '',
+                            last_name=' '.join(full_name.split()[1:]) if len(full_name.split()) > 1 else '',
+                            national_id=national_id,
+                            email=User.objects.normalize_email(email),
+                            role='STUDENT_AFFAIRS',
+                            first_login_required=True
+                        )
+                        created_count += 1
 
-            except Exception as e:
-                errors.append(f"Row {index + 2}: {str(e)}")
+                except Exception as e:
+                    errors.append(f"Row {index + 2}: {str(e)}")
 
         # Create audit log
         try:
@@ -232,7 +250,7 @@ class UploadStaffAffairsUsersView(APIView):
                 upload_type='STAFF',
                 file_name='staff_upload',
                 uploaded_by=performed_by,
-                total_rows=len(df),
+                total_rows=total_rows,
                 created_count=created_count,
                 updated_count=0,
                 error_count=len(errors),
@@ -436,6 +454,10 @@ class AssignDoctorToSubjectView(APIView):
             }
         )
 
+        # A re-assignment can change the grading template of existing grades
+        if not created:
+            refresh_offerings_on_commit([offering.id])
+
         # Log audit trail for doctor assignment
         try:
             doctor_name = f"{doctor.first_name} {doctor.last_name}".strip()
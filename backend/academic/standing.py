@@ -0,0 +1,200 @@
+"""
+Per-student standing: term totals, cumulative totals and class rank.
+
+StudentStanding keeps one row per (student, term) with the term total against
+Subject.max_grade, the cumulative total over all of the student's terms up to
+that one, and the rank by cumulative percentage. Rows are derived from
+StudentGradeSummary only; grade_engine.refresh_summaries_for() calls
+refresh_standings_for() with the offerings and students it touched, so a grade
+edit updates the affected students' rows and re-ranks their groups from the
+standing table without recomputing anyone's grades.
+
+Ranks use competition ranking (1, 2, 2, 4) and only cover standings where
+every course of the term has a final grade:
+  rank_in_department  same term and Level row (levels belong to a department)
+  rank_in_level       same term and level name across all departments
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import F
+from django.utils import timezone
+
+from .db_utils import bulk_upsert
+from .models import CourseOffering, Level, Student, StudentGradeSummary, StudentStanding
+from .result_cards import student_offerings
+
+TERM_FIELDS = [
+    'academic_year', 'level', 'department', 'courses', 'graded_courses', 'is_complete',
+    'total', 'max_total', 'percentage', 'updated_at',
+]
+
+CENT = Decimal('0.01')
+
+
+def _percentage(total, maximum):
+    if not maximum:
+        return Decimal('0.00')
+    return (Decimal(total) * 100 / Decimal(maximum)).quantize(CENT)
+
+
+def refresh_standings_for(course_offering_ids, student_ids=None):
+    """Recompute the standings touched by grade changes in the given offerings.
+
+    Returns the number of (student, term) rows written.
+    """
+    scopes = set(
+        CourseOffering.objects.filter(id__in=list(course_offering_ids))
+        .values_list('academic_year_id', 'term_id', 'level_id')
+    )
+    if student_ids is not None:
+        student_ids = set(student_ids)
+
+    written = 0
+    touched_students = set()
+    for academic_year_id, term_id, level_id in scopes:
+        students = _refresh_term(academic_year_id, term_id, level_id, student_ids)
+        written += len(students)
+        touched_students |= students
+    if student_ids is not None:
+        touched_students |= student_ids
+
+    if touched_students:
+        groups = _refresh_cumulative(touched_students)
+        groups |= {(term_id, level_id) for _, term_id, level_id in scopes}
+        rerank(groups)
+    return written
+
+
+def _refresh_term(academic_year_id, term_id, level_id, student_ids=None):
+    """Upsert the term rows of one (year, term, level) scope; returns the student ids written"""
+    level = Level.objects.get(id=level_id)
+    offerings = list(
+        CourseOffering.objects.filter(academic_year_id=academic_year_id, term_id=term_id, level_id=level_id)
+        .select_related('subject')
+    )
+    summaries = StudentGradeSummary.objects.filter(course_offering__in=offerings)
+    if student_ids is not None:
+        summaries = summaries.filter(student_id__in=student_ids)
+
+    graded = defaultdict(dict)  # student_id -> {offering_id: (total_grade, final)}
+    for student_id, offering_id, total_grade, final in summaries.values_list(
+        'student_id', 'course_offering_id', 'total_grade', 'final'
+    ):
+        graded[student_id][offering_id] = (total_grade, final)
+
+    # Students without any grade left in the scope lose their row
+    stale = StudentStanding.objects.filter(term_id=term_id, level_id=level_id).exclude(student_id__in=list(graded))
+    if student_ids is not None:
+        stale = stale.filter(student_id__in=student_ids)
+    stale.delete()
+
+    now = timezone.now()
+    rows = []
+    students = Student.objects.filter(id__in=list(graded)).only('id', 'department_id', 'specialization_id')
+    for student in students:
+        own = student_offerings(offerings, student, level)
+        total = max_total = Decimal('0')
+        graded_courses = finals = 0
+        for offering in own:
+            grade = graded[student.id].get(offering.id)
+            if grade is None:
+                continue
+            total += grade[0]
+            max_total += offering.subject.max_grade
+            graded_courses += 1
+            if grade[1] is not None:
+                finals += 1
+        rows.append(StudentStanding(
+            student_id=student.id,
+            academic_year_id=academic_year_id,
+            term_id=term_id,
+            level_id=level_id,
+            department_id=level.department_id,
+            courses=len(own),
+            graded_courses=graded_courses,
+            is_complete=bool(own) and finals == len(own),
+            total=total,
+            max_total=max_total,
+            percentage=_percentage(total, max_total),
+            updated_at=now,
+        ))
+    bulk_upsert(StudentStanding, rows, unique_fields=['student', 'term'], update_fields=TERM_FIELDS)
+    return {row.student_id for row in rows}
+
+
+def _refresh_cumulative(student_ids):
+    """Recompute the cumulative columns of the students' standings.
+
+    Returns the (term_id, level_id) groups whose cumulative values changed.
+    """
+    standings = StudentStanding.objects.filter(student_id__in=list(student_ids)).order_by(
+        'student_id', 'academic_year__name', 'term__name'
+    )
+    changed = []
+    student_id = None
+    running_total = running_max = Decimal('0')
+    for standing in standings:
+        if standing.student_id != student_id:
+            student_id = standing.student_id
+            running_total = running_max = Decimal('0')
+        running_total += standing.total
+        running_max += standing.max_total
+        values = (running_total, running_max, _percentage(running_total, running_max))
+        if values != (standing.cumulative_total, standing.cumulative_max, standing.cumulative_percentage):
+            standing.cumulative_total, standing.cumulative_max, standing.cumulative_percentage = values
+            changed.append(standing)
+
+    StudentStanding.objects.bulk_update(
+        changed, ['cumulative_total', 'cumulative_max', 'cumulative_percentage'], batch_size=500
+    )
+    return {(s.term_id, s.level_id) for s in changed}
+
+
+def _competition_ranks(standings):
+    """{standing id: rank} by cumulative percentage for complete standings"""
+    ranks = {}
+    ordered = sorted((s for s in standings if s.is_complete), key=lambda s: s.cumulative_percentage, reverse=True)
+    previous = None
+    for position, standing in enumerate(ordered, start=1):
+        if standing.cumulative_percentage != previous:
+            rank = position
+            previous = standing.cumulative_percentage
+        ranks[standing.id] = rank
+    return ranks
+
+
+def rerank(groups):
+    """Recompute both ranks for the (term_id, level_id) groups from the standing table"""
+    names_by_id = dict(Level.objects.filter(id__in={level_id for _, level_id in groups}).values_list('id', 'name'))
+    level_names = defaultdict(set)  # term_id -> level names to re-rank
+    for term_id, level_id in groups:
+        if level_id in names_by_id:
+            level_names[term_id].add(names_by_id[level_id])
+
+    for term_id, names in level_names.items():
+        standings = list(
+            StudentStanding.objects.filter(term_id=term_id, level__name__in=names)
+            .annotate(level_name=F('level__name'))
+            .only('id', 'level_id', 'is_complete', 'cumulative_percentage', 'rank_in_level', 'rank_in_department')
+        )
+        by_level = defaultdict(list)
+        by_name = defaultdict(list)
+        for standing in standings:
+            by_level[standing.level_id].append(standing)
+            by_name[standing.level_name].append(standing)
+
+        level_ranks = {}
+        for group in by_name.values():
+            level_ranks.update(_competition_ranks(group))
+        department_ranks = {}
+        for group in by_level.values():
+            department_ranks.update(_competition_ranks(group))
+
+        changed = []
+        for standing in standings:
+            ranks = (level_ranks.get(standing.id), department_ranks.get(standing.id))
+            if ranks != (standing.rank_in_level, standing.rank_in_department):
+                standing.rank_in_level, standing.rank_in_department = ranks
+                changed.append(standing)
+        StudentStanding.objects.bulk_update(changed, ['rank_in_level', 'rank_in_department'], batch_size=500)
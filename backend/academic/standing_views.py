@@ -0,0 +1,96 @@
+"""
+Class ranking and cumulative standing endpoints (Dean and Student Affairs)
+"""
+from rest_framework import status
+from rest_framework.views import APIView
+from rest_framework.response import Response
+
+from .models import Student, StudentStanding
+from .structure_cache import academic_structure
+from users.permissions import IsDeanRole, IsStudentAffairsRole
+
+RANKING_DEFAULT_LIMIT = 10
+RANKING_MAX_LIMIT = 500
+
+
+def _standing_data(standing):
+    return {
+        'student_id': standing.student_id,
+        'national_id': standing.student.national_id,
+        'full_name': standing.student.full_name,
+        'academic_year': standing.academic_year.name,
+        'term': standing.term.get_name_display(),
+        'level': standing.level.get_name_display(),
+        'department': standing.department.name if standing.department else 'عام',
+        'courses': standing.courses,
+        'graded_courses': standing.graded_courses,
+        'is_complete': standing.is_complete,
+        'total': float(standing.total),
+        'max_total': float(standing.max_total),
+        'percentage': float(standing.percentage),
+        'cumulative_total': float(standing.cumulative_total),
+        'cumulative_max': float(standing.cumulative_max),
+        'cumulative_percentage': float(standing.cumulative_percentage),
+        'rank_in_level': standing.rank_in_level,
+        'rank_in_department': standing.rank_in_department,
+    }
+
+
+class ClassRankingView(APIView):
+    """Top students of a level for a term, read from the maintained standings.
+
+    GET ?term=<id>&level=<id>[&scope=department|level][&limit=10]
+    scope=department ranks within the level's department (default),
+    scope=level ranks the same level name across all departments.
+    """
+    permission_classes = [IsDeanRole | IsStudentAffairsRole]
+    query_budget = 3
+
+    def get(self, request):
+        structure = academic_structure()
+        term = structure.term(request.query_params.get('term'))
+        level = structure.level(request.query_params.get('level'))
+        if term is None or level is None:
+            return Response({'error': 'يجب تحديد الفصل الدراسي والفرقة'}, status=status.HTTP_400_BAD_REQUEST)
+
+        scope = request.query_params.get('scope', 'department')
+        if scope not in ('department', 'level'):
+            return Response({'error': 'scope يجب أن يكون department أو level'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = int(request.query_params.get('limit', RANKING_DEFAULT_LIMIT))
+        except ValueError:
+            limit = RANKING_DEFAULT_LIMIT
+        limit = max(1, min(limit, RANKING_MAX_LIMIT))
+
+        standings = StudentStanding.objects.filter(term=term).select_related(
+            'student', 'academic_year', 'term', 'level', 'department'
+        )
+        if scope == 'department':
+            standings = standings.filter(level=level, rank_in_department__isnull=False).order_by('rank_in_department', 'student_id')
+        else:
+            standings = standings.filter(level__name=level.name, rank_in_level__isnull=False).order_by('rank_in_level', 'student_id')
+
+        return Response({
+            'term': term.get_name_display(),
+            'academic_year': term.academic_year.name,
+            'level': level.get_name_display(),
+            'scope': scope,
+            'results': [_standing_data(s) for s in standings[:limit]],
+        })
+
+
+class StudentStandingView(APIView):
+    """Term-by-term and cumulative standing of one student"""
+    permission_classes = [IsDeanRole | IsStudentAffairsRole]
+
+    def get(self, request, student_id):
+        try:
+            student = Student.objects.get(id=student_id)
+        except Student.DoesNotExist:
+            return Response({'error': 'طالب غير موجود'}, status=status.HTTP_404_NOT_FOUND)
+
+        standings = StudentStanding.objects.filter(student=student).select_related(
+            'student', 'academic_year', 'term', 'level', 'department'
+        ).order_by('academic_year__name', 'term__name')
+        return Response([_standing_data(s) for s in standings])
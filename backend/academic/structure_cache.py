@@ -0,0 +1,178 @@
+"""
+Cached lookup table of the academic structure.
+
+Academic years, terms, levels, departments and specializations change a few
+times a year but are resolved from ids or names on almost every request. The
+whole structure is loaded in a handful of queries, stored in Redis under a
+version counter and kept in process memory; each process re-checks the
+version at most every LOCAL_RECHECK_SECONDS.
+
+Write paths for these models call invalidate_academic_structure(), which bumps
+the version once the transaction commits. Returned instances are shared
+between requests and must be treated as read-only.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import AcademicYear, Department, Level, Specialization, Term
+
+VERSION_KEY = 'academic:structure:version'
+
+# Safety net for changes made outside the API (admin site, shell, migrations)
+STRUCTURE_TTL = 60 * 60
+
+# How long a process trusts its in-memory copy before re-checking the version
+LOCAL_RECHECK_SECONDS = 5
+
+_local = threading.local()
+
+
+def _snapshot_key(version):
+    return f'academic:structure:{version}'
+
+
+def _as_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class AcademicStructure:
+    """In-memory indexes over one snapshot of the academic structure"""
+
+    def __init__(self, years, terms, levels, departments, specializations):
+        self.years = {y.id: y for y in years}
+        self.years_by_name = {y.name: y for y in years}
+        self.terms = {t.id: t for t in terms}
+        self.terms_by_name = {(t.academic_year_id, t.name): t for t in terms}
+        self.levels = {l.id: l for l in levels}
+        self.departments = {d.id: d for d in departments}
+        self.departments_by_name = {d.name: d for d in departments}
+        self.specializations = {s.id: s for s in specializations}
+
+        self.levels_by_name = {}
+        for level in levels:
+            key = (level.name, level.department_id, level.academic_year_id)
+            self.levels_by_name.setdefault(key, level)
+
+        self.department_specializations = {}
+        for spec in specializations:
+            self.department_specializations.setdefault(spec.department_id, []).append(spec)
+
+    def year(self, pk):
+        return self.years.get(_as_id(pk))
+
+    def year_named(self, name):
+        return self.years_by_name.get(name)
+
+    def term(self, pk):
+        return self.terms.get(_as_id(pk))
+
+    def term_named(self, academic_year_id, name):
+        return self.terms_by_name.get((academic_year_id, name))
+
+    def level(self, pk):
+        return self.levels.get(_as_id(pk))
+
+    def level_named(self, name, department_id, academic_year_id):
+        """Level by its name within a department (None for levels without one) and year"""
+        return self.levels_by_name.get((name, department_id, academic_year_id))
+
+    def department(self, pk):
+        return self.departments.get(_as_id(pk))
+
+    def department_named(self, name):
+        return self.departments_by_name.get(name)
+
+    def specialization(self, pk):
+        return self.specializations.get(_as_id(pk))
+
+    def specializations_of(self, department_id):
+        return list(self.department_specializations.get(department_id, ()))
+
+
+def _load():
+    departments = list(Department.objects.order_by('id'))
+    years = list(AcademicYear.objects.order_by('id'))
+    terms = list(Term.objects.order_by('id'))
+    levels = list(Level.objects.order_by('id'))
+    specializations = list(Specialization.objects.order_by('id'))
+
+    # Wire up the foreign keys from the snapshot instead of lazy queries
+    departments_by_id = {d.id: d for d in departments}
+    years_by_id = {y.id: y for y in years}
+    for term in terms:
+        term.academic_year = years_by_id[term.academic_year_id]
+    for level in levels:
+        level.academic_year = years_by_id[level.academic_year_id]
+        level.department = departments_by_id.get(level.department_id)
+    for spec in specializations:
+        spec.department = departments_by_id[spec.department_id]
+
+    return {
+        'years': years,
+        'terms': terms,
+        'levels': levels,
+        'departments': departments,
+        'specializations': specializations,
+    }
+
+
+def _current_version():
+    return cache.get_or_set(VERSION_KEY, lambda: int(time.time() * 1000), timeout=None)
+
+
+def academic_structure():
+    """Current AcademicStructure (process memory, then Redis, then the database)"""
+    now = time.monotonic()
+    local = getattr(_local, 'structure', None)
+    if local is not None and now - local['checked'] < LOCAL_RECHECK_SECONDS:
+        return local['structure']
+
+    version = _current_version()
+    if local is not None and local['version'] == version:
+        local['checked'] = now
+        return local['structure']
+
+    key = _snapshot_key(version)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = _load()
+        cache.set(key, snapshot, timeout=STRUCTURE_TTL)
+
+    structure = AcademicStructure(**snapshot)
+    _local.structure = {'version': version, 'structure': structure, 'checked': now}
+    return structure
+
+
+def _bump():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, int(time.time() * 1000), timeout=None)
+    _local.structure = None
+
+
+def invalidate_academic_structure():
+    """Drop the cached structure after the current transaction commits"""
+    transaction.on_commit(_bump)
+
+
+class InvalidatesAcademicStructure:
+    """ViewSet mixin invalidating the structure cache on create, update and delete"""
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        invalidate_academic_structure()
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        invalidate_academic_structure()
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        invalidate_academic_structure()
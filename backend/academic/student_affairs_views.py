@@ -5,16 +5,21 @@ from rest_framework import status, generics, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
-from django.db import transaction
 from django.db.models import Q
 from django.contrib.auth import get_user_model
 import pandas as pd
 import io
+import json
 import os
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 
-from .models import Student, Level, AcademicYear, Department, Specialization, AuditLog, UploadHistory, Certificate
+from .models import Student, Level, AcademicYear, Department, Specialization, AuditLog, UploadHistory, Certificate, BackgroundJob
+from .grade_engine import summaries_for, max_total
+from .grade_cache import get_grid_snapshot
+from .structure_cache import academic_structure
+from .jobs import PREVIEW_UPLOAD_DIR, enqueue, job_accepted, job_storage, store_upload
+from .spreadsheet import iter_spreadsheet, read_header, check_upload, SpreadsheetError
 from users.permissions import IsStudentAffairsRole, IsStudentRole
 
 User = get_user_model()
@@ -232,10 +237,277 @@ def match_specialization(csv_spec, specialization):
     return False
 
 
+# Preview: error messages / row diagnostics returned at most
+PREVIEW_MAX_ERRORS = 50
+PREVIEW_MAX_DIAGNOSTICS = 500
+
+# Previewed uploads kept for the upload that follows (seconds)
+STUDENT_UPLOAD_TOKEN_TTL = 1800
+STUDENT_UPLOAD_SELECTIONS = ('department_id', 'academic_year_id', 'level_id', 'specialization_id')
+
+STUDENT_REQUIRED_COLUMNS = ['national_id', 'full_name', 'department', 'level']
+# Validated rows handed to the import job (one JSON list per line)
+STUDENT_ROW_FIELDS = ('row_number', 'national_id', 'full_name', 'email', 'level', 'specialization')
+
+LEVELS_WITHOUT_SPECIALIZATIONS = ['FIRST', 'الفرقة الأولى', 'PREPARATORY', 'الفرقة الإعدادية', 'PREP']
+
+
+def _requires_specialization(csv_level):
+    """Students of every level except the first/preparatory one need a specialization"""
+    return bool(csv_level) and not any(
+        ls in csv_level.upper() or ls in csv_level for ls in LEVELS_WITHOUT_SPECIALIZATIONS
+    )
+
+
+def _validate_student_rows(df, department, level, specialization=None):
+    """Validate all rows of a student upload.
+
+    Lookups are loaded once and each distinct department/level/specialization
+    value is matched once. Returns (per-row diagnostics, error counts by kind).
+    """
+    def column(name):
+        if name not in df.columns:
+            return [''] * len(df)
+        return [str(v).strip() if pd.notna(v) else '' for v in df[name]]
+
+    national_ids = [str(v).strip() if pd.notna(v) else '' for v in df['national_id']]
+    full_names = [str(v).strip() if pd.notna(v) else '' for v in df['full_name']]
+    departments = column('department')
+    levels = column('level')
+    specializations = column('specialization')
+    emails = column('email')
+
+    dept_ok = {v: match_department(v, department) for v in set(departments)}
+
+    if level:
+        level_ok = {v: match_level(v, level) for v in set(levels)}
+    else:
+        levels_by_id = academic_structure().levels
+        level_names = {l.name.lower() for l in levels_by_id.values()}
+        level_ids = {str(pk) for pk in levels_by_id}
+        level_ok = {
+            v: (v.lower() in level_names or v.replace(' ', '_').lower() in level_names or v in level_ids)
+            for v in set(levels)
+        }
+
+    specs = academic_structure().specializations_of(department.id)
+    spec_ok = {v: any(match_specialization(v, spec) for spec in specs) for v in set(specializations) if v}
+    selected_ok = {
+        v: match_specialization(v, specialization) for v in set(specializations) if v
+    } if specialization else {}
+
+    diagnostics = []
+    error_summary = {}
+
+    def add(row_errors, kind, message):
+        row_errors.append(message)
+        error_summary[kind] = error_summary.get(kind, 0) + 1
+
+    for i, index in enumerate(df.index):
+        row_errors = []
+        national_id, csv_dept, csv_level, csv_spec = national_ids[i], departments[i], levels[i], specializations[i]
+
+        # Validate national_id
+        if not national_id or len(national_id) < 10:
+            add(row_errors, 'national_id', 'الرقم القومي غير صالح')
+
+        # Validate department match
+        if not dept_ok[csv_dept]:
+            add(row_errors, 'department', f'القسم "{csv_dept}" لا يطابق "{department.name}"')
+
+        # Validate level match / existence
+        if not level_ok[csv_level]:
+            if level:
+                add(row_errors, 'level', f'الفرقة "{csv_level}" لا تطابق "{level.get_name_display()}"')
+            else:
+                add(row_errors, 'level', f'الفرقة "{csv_level}" غير موجودة')
+
+        # Validate specialization: required for departments that have them (e.g. Electrical)
+        # and, when one is selected in the UI, the file must agree with it
+        if specs:
+            if not csv_spec:
+                if _requires_specialization(csv_level):
+                    add(row_errors, 'specialization', 'التخصص مطلوب للهندسة الكهربية للفرق الثانية والثالثة والرابعة')
+            elif not spec_ok[csv_spec]:
+                add(row_errors, 'specialization', f'التخصص "{csv_spec}" غير موجود في قسم {department.name}')
+            elif specialization and not selected_ok[csv_spec]:
+                add(row_errors, 'specialization', f'التخصص "{csv_spec}" لا يطابق التخصص المحدد "{specialization.name}"')
+        elif csv_spec:
+            if not specialization:
+                add(row_errors, 'specialization', f'التخصص "{csv_spec}" موجود في الملف ولكن لم يتم اختيار تخصص في الواجهة')
+            elif not selected_ok[csv_spec]:
+                add(row_errors, 'specialization', f'التخصص "{csv_spec}" لا يطابق التخصص المحدد "{specialization.name}"')
+
+        diagnostics.append({
+            'row_number': index + 2,
+            'national_id': national_id,
+            'full_name': full_names[i],
+            'department': csv_dept,
+            'level': csv_level,
+            'specialization': csv_spec,
+            'email': emails[i],
+            'errors': row_errors
+        })
+
+    return diagnostics, error_summary
+
+
+def _scan_student_upload(file, department, level, specialization=None):
+    """Read and validate a student upload in one pass over its batches.
+
+    Returns the counts and diagnostics shown by the preview and, when every
+    row is valid, the normalized rows (STUDENT_ROW_FIELDS) the import job
+    consumes, so the file itself is never parsed again.
+    """
+    columns = read_header(file)
+    filled = {}
+    if 'department' not in columns:
+        filled['department'] = department.name
+    if 'level' not in columns and level:
+        filled['level'] = level.get_name_display()
+    found_columns = columns + list(filled)
+
+    scan = {
+        'found_columns': found_columns,
+        'missing_columns': [col for col in STUDENT_REQUIRED_COLUMNS if col not in found_columns],
+        'total_rows': 0,
+        'preview_rows': [],
+        'invalid_rows': 0,
+        'row_diagnostics': [],
+        'error_summary': {},
+        'departments': {},
+        'levels': {},
+        'specializations': {},
+        'missing_specialization_column': False,
+        'rows': [],
+    }
+    if scan['missing_columns']:
+        return scan
+
+    specs = academic_structure().specializations_of(department.id)
+    for df in iter_spreadsheet(file):
+        for col, value in filled.items():
+            df[col] = value
+        diagnostics, error_summary = _validate_student_rows(df, department, level, specialization)
+        scan['total_rows'] += len(diagnostics)
+        for kind, count in error_summary.items():
+            scan['error_summary'][kind] = scan['error_summary'].get(kind, 0) + count
+
+        for row in diagnostics:
+            if len(scan['preview_rows']) < 5:
+                scan['preview_rows'].append(row)
+            for key, values in (('department', scan['departments']), ('level', scan['levels']),
+                                ('specialization', scan['specializations'])):
+                if row[key]:
+                    values[row[key]] = None
+            if row['errors']:
+                scan['invalid_rows'] += 1
+                if len(scan['row_diagnostics']) < PREVIEW_MAX_DIAGNOSTICS:
+                    scan['row_diagnostics'].append(row)
+            elif not scan['invalid_rows']:
+                # Rows are only needed for an upload without errors
+                scan['rows'].append([row[field] for field in STUDENT_ROW_FIELDS])
+
+    if specs and 'specialization' not in columns:
+        scan['missing_specialization_column'] = any(_requires_specialization(lvl) for lvl in scan['levels'])
+    for key in ('departments', 'levels', 'specializations'):
+        scan[key] = list(scan[key])
+    if scan['invalid_rows'] or scan['missing_specialization_column']:
+        scan['rows'] = None
+    return scan
+
+
+def _student_upload_errors(scan):
+    """User facing validation messages of a scanned upload"""
+    errors = [
+        f"صف {row['row_number']}: {', '.join(row['errors'])}"
+        for row in scan['row_diagnostics'][:PREVIEW_MAX_ERRORS]
+    ]
+    if scan['invalid_rows'] > PREVIEW_MAX_ERRORS:
+        errors.append(f"... و {scan['invalid_rows'] - PREVIEW_MAX_ERRORS} صفوف أخرى بها أخطاء")
+    if scan['missing_specialization_column']:
+        errors.append(
+            'عمود specialization إلزامي للهندسة الكهربية للفرق الثانية والثالثة والرابعة. '
+            'يجب إضافة عمود specialization بقيم ece (هندسة اتصالات) أو epm (هندسة قوى)'
+        )
+    return errors
+
+
+def _student_rows_file(rows):
+    """Validated rows of an upload as the file the import job reads"""
+    content = '\n'.join(json.dumps(row, ensure_ascii=False) for row in rows)
+    return ContentFile(content.encode('utf-8'), name='students.jsonl')
+
+
+def _iter_student_rows(file, batch_size=1000):
+    """DataFrame batches of the rows stored by _student_rows_file (index = sheet row - 2)"""
+    def frame(rows):
+        df = pd.DataFrame(rows, columns=STUDENT_ROW_FIELDS)
+        df.index = df.pop('row_number') - 2
+        return df
+
+    batch = []
+    for line in file:
+        if line.strip():
+            batch.append(json.loads(line))
+        if len(batch) >= batch_size:
+            yield frame(batch)
+            batch = []
+    if batch:
+        yield frame(batch)
+
+
+def _student_upload_key(token):
+    return f'student_upload:{token}'
+
+
+def _cache_student_upload(user, data, rows, file_name, total_rows):
+    """Keep the validated rows of a preview in the private job storage; returns the upload token"""
+    import uuid
+    from django.core.cache import cache
+
+    token = uuid.uuid4().hex
+    try:
+        upload_path = store_upload(_student_rows_file(rows), PREVIEW_UPLOAD_DIR)
+    except Exception:
+        # Without the stored rows the upload simply sends the file again
+        return None
+    try:
+        cache.set(_student_upload_key(token), {
+            'user_id': user.id,
+            'selections': {key: str(data.get(key) or '') for key in STUDENT_UPLOAD_SELECTIONS},
+            'file_name': file_name,
+            'upload_path': upload_path,
+            'total_rows': total_rows,
+        }, STUDENT_UPLOAD_TOKEN_TTL)
+    except Exception:
+        job_storage().delete(upload_path)
+        return None
+    return token
+
+
+def _cached_student_upload(token, user, data):
+    """Cached preview (upload_path, file_name, total_rows), or None if expired/not matching"""
+    from django.core.cache import cache
+
+    try:
+        payload = cache.get(_student_upload_key(token))
+    except Exception:
+        payload = None
+    if not payload or payload['user_id'] != user.id:
+        return None
+    if payload['selections'] != {key: str(data.get(key) or '') for key in STUDENT_UPLOAD_SELECTIONS}:
+        return None
+    if not job_storage().exists(payload['upload_path']):
+        return None
+    return payload
+
+
 class PreviewStudentsUploadView(APIView):
     """
     Preview CSV/Excel file before actual upload.
-    Returns first 5 rows with validation results.
+    Validates every row and returns the first 5 rows, per-row diagnostics and
+    an upload token that UploadStudentsView accepts instead of the file.
     """
     parser_classes = (MultiPartParser, FormParser)
     permission_classes = [IsStudentAffairsRole]
@@ -245,6 +517,7 @@ class PreviewStudentsUploadView(APIView):
         department_id = request.data.get('department_id')
         academic_year_id = request.data.get('academic_year_id')
         level_id = request.data.get('level_id')
+        specialization_id = request.data.get('specialization_id')
 
         if not file:
             return Response({'error': 'لم يتم تحديد ملف'}, status=status.HTTP_400_BAD_REQUEST)
@@ -255,14 +528,13 @@ class PreviewStudentsUploadView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            department = Department.objects.get(id=department_id)
-        except Department.DoesNotExist:
+        structure = academic_structure()
+        department = structure.department(department_id)
+        if department is None:
             return Response({'error': 'القسم غير موجود'}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            academic_year = AcademicYear.objects.get(id=academic_year_id)
-        except AcademicYear.DoesNotExist:
+        academic_year = structure.year(academic_year_id)
+        if academic_year is None:
             return Response({'error': 'العام الدراسي غير موجود'}, status=status.HTTP_400_BAD_REQUEST)
 
         # Check if academic year is closed
@@ -274,145 +546,57 @@ class PreviewStudentsUploadView(APIView):
 
         level = None
         if level_id:
-            try:
-                level = Level.objects.get(id=level_id)
-            except Level.DoesNotExist:
+            level = structure.level(level_id)
+            if level is None:
                 return Response({'error': 'الفرقة غير موجودة'}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            # Read file
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(io.BytesIO(file.read()))
-            elif file.name.endswith(('.xlsx', '.xls')):
-                df = pd.read_excel(io.BytesIO(file.read()))
-            else:
-                return Response(
-                    {'error': 'صيغة الملف غير مدعومة. استخدم CSV أو Excel.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+        specialization = None
+        if specialization_id:
+            specialization = structure.specialization(specialization_id)
+            if specialization is None:
+                return Response({'error': 'التخصص غير موجود'}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Auto-fill missing columns from UI selections
-            if 'department' not in df.columns:
-                df['department'] = department.name
-            if 'level' not in df.columns and level:
-                df['level'] = level.get_name_display()
+        try:
+            # Read and validate every row in one pass over the file
+            try:
+                scan = _scan_student_upload(file, department, level, specialization)
+            except SpreadsheetError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Validate required columns
-            required_columns = ['national_id', 'full_name', 'department', 'level']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
+            if scan['missing_columns']:
                 return Response(
                     {
-                        'error': f'أعمدة مفقودة: {missing_columns}',
-                        'required_columns': required_columns,
-                        'found_columns': list(df.columns)
+                        'error': f"أعمدة مفقودة: {scan['missing_columns']}",
+                        'required_columns': STUDENT_REQUIRED_COLUMNS,
+                        'found_columns': scan['found_columns']
                     },
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # Validate first 5 rows
-            preview_rows = []
-            validation_errors = []
-
-            for index, row in df.head(5).iterrows():
-                row_errors = []
-
-                national_id = str(row.get('national_id', '')).strip()
-                csv_dept = str(row.get('department', '')).strip()
-                csv_level = str(row.get('level', '')).strip()
+            validation_errors = _student_upload_errors(scan)
+            can_upload = len(validation_errors) == 0
 
-                # Validate national_id
-                if not national_id or len(national_id) < 10:
-                    row_errors.append('الرقم القومي غير صالح')
-
-                # Validate department match using helper function
-                dept_match = match_department(csv_dept, department)
-                if not dept_match:
-                    row_errors.append(f'القسم "{csv_dept}" لا يطابق "{department.name}"')
-
-                # Validate level match using helper function
-                if level:
-                    if not match_level(csv_level, level):
-                        row_errors.append(f'الفرقة "{csv_level}" لا تطابق "{level.get_name_display()}"')
-                else:
-                    # Validate level exists
-                    level_exists = Level.objects.filter(
-                        Q(name__iexact=csv_level) |
-                        Q(name__iexact=csv_level.replace(' ', '_')) |
-                        Q(id=csv_level if csv_level.isdigit() else 0)
-                    ).exists()
-                    if not level_exists:
-                        row_errors.append(f'الفرقة "{csv_level}" غير موجودة')
-
-                # Validate specialization for departments that have specializations (e.g. Electrical)
-                csv_spec = str(row.get('specialization', '')).strip()
-                levels_without_specializations = ['FIRST', 'الفرقة الأولى', 'PREPARATORY', 'الفرقة الإعدادية', 'PREP']
-                
-                if department.specializations.exists():
-                    # Check if this row's level requires specialization (all except FIRST/PREP)
-                    csv_level_upper = csv_level.upper() if csv_level else ''
-                    level_is_first_or_prep = any(ls in csv_level_upper or ls in csv_level for ls in levels_without_specializations)
-                    level_requires_spec = csv_level and not level_is_first_or_prep
-                    
-                    if level_requires_spec and not csv_spec:
-                        row_errors.append('التخصص مطلوب للهندسة الكهربية للفرق الثانية والثالثة والرابعة')
-                    elif csv_spec and level_requires_spec:
-                        # Check if this specialization exists in the department
-                        valid_specs = Specialization.objects.filter(department=department)
-                        spec_valid = any(match_specialization(csv_spec, spec) for spec in valid_specs)
-                        if not spec_valid:
-                            row_errors.append(f'التخصص "{csv_spec}" غير موجود في قسم {department.name}')
-
-                preview_rows.append({
-                    'row_number': index + 2,
-                    'national_id': national_id,
-                    'full_name': str(row.get('full_name', '')),
-                    'department': csv_dept,
-                    'level': csv_level,
-                    'specialization': csv_spec,
-                    'email': str(row.get('email', '')) if pd.notna(row.get('email')) else '',
-                    'errors': row_errors
-                })
-
-                if row_errors:
-                    validation_errors.extend([f"صف {index + 2}: {', '.join(row_errors)}"])
-
-            # Validate specialization column for departments with specializations
-            if department.specializations.exists():
-                # Check if any row in CSV is from a level that requires specialization (not FIRST/PREP)
-                levels_without_specializations = ['FIRST', 'الفرقة الأولى', 'PREPARATORY', 'الفرقة الإعدادية', 'PREP']
-                
-                has_level_requiring_spec = False
-                if 'level' in df.columns:
-                    for lvl in df['level'].dropna().astype(str).str.strip().unique():
-                        lvl_upper = lvl.upper()
-                        if lvl and not any(ls in lvl_upper or ls in lvl for ls in levels_without_specializations):
-                            has_level_requiring_spec = True
-                            break
-                
-                # Only require specialization column if there are students from levels that need it
-                if has_level_requiring_spec and 'specialization' not in df.columns:
-                    validation_errors.append(
-                        'عمود specialization إلزامي للهندسة الكهربية للفرق الثانية والثالثة والرابعة. ' 
-                        'يجب إضافة عمود specialization بقيم ece (هندسة اتصالات) أو epm (هندسة قوى)'
-                    )
-
-            # Summary statistics
-            total_rows = len(df)
-            unique_departments = df['department'].dropna().astype(str).str.strip().unique().tolist()
-            unique_levels = df['level'].dropna().astype(str).str.strip().unique().tolist()
-            unique_specializations = df['specialization'].dropna().astype(str).str.strip().unique().tolist() if 'specialization' in df.columns else []
+            # Keep the validated rows so the upload can commit them without sending the file again
+            upload_token = None
+            if can_upload:
+                upload_token = _cache_student_upload(
+                    request.user, request.data, scan['rows'], file.name, scan['total_rows']
+                )
 
             return Response({
-                'total_rows': total_rows,
-                'preview_rows': preview_rows,
+                'total_rows': scan['total_rows'],
+                'preview_rows': scan['preview_rows'],
                 'validation_errors': validation_errors,
+                'invalid_rows': scan['invalid_rows'],
+                'error_summary': scan['error_summary'],
+                'row_diagnostics': scan['row_diagnostics'],
                 'selected_department': department.name,
                 'selected_level': level.get_name_display() if level else 'متعددة',
-                'csv_departments': unique_departments,
-                'csv_levels': unique_levels,
-                'csv_specializations': unique_specializations,
-                'can_upload': len(validation_errors) == 0
+                'csv_departments': scan['departments'],
+                'csv_levels': scan['levels'],
+                'csv_specializations': scan['specializations'],
+                'can_upload': can_upload,
+                'upload_token': upload_token,
             })
 
         except Exception as e:
@@ -424,6 +608,8 @@ class UploadStudentsView(APIView):
     Upload students via Excel/CSV file.
     Requires: department_id, academic_year_id, level_id from request
     Excel columns: national_id, full_name, email (optional)
+    Instead of the file, an upload_token from the preview can be sent to commit
+    the rows that were already validated.
     """
     parser_classes = (MultiPartParser, FormParser)
     permission_classes = [IsStudentAffairsRole]
@@ -434,10 +620,20 @@ class UploadStudentsView(APIView):
         academic_year_id = request.data.get('academic_year_id')
         level_id = request.data.get('level_id')  # Optional if CSV has level column
         specialization_id = request.data.get('specialization_id')
+        upload_token = request.data.get('upload_token')
 
         # Validate required params
-        if not file:
+        if not file and not upload_token:
             return Response({'error': 'لم يتم تحديد ملف'}, status=status.HTTP_400_BAD_REQUEST)
+
+        cached = None
+        if upload_token:
+            cached = _cached_student_upload(upload_token, request.user, request.data)
+            if cached is None and not file:
+                return Response(
+                    {'error': 'انتهت صلاحية المعاينة. يرجى معاينة الملف مرة أخرى'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
         
         if not department_id or not academic_year_id:
             return Response(
@@ -446,14 +642,13 @@ class UploadStudentsView(APIView):
             )
 
         # Validate department, year, level exist
-        try:
-            department = Department.objects.get(id=department_id)
-        except Department.DoesNotExist:
+        structure = academic_structure()
+        department = structure.department(department_id)
+        if department is None:
             return Response({'error': 'القسم غير موجود'}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            academic_year = AcademicYear.objects.get(id=academic_year_id)
-        except AcademicYear.DoesNotExist:
+        academic_year = structure.year(academic_year_id)
+        if academic_year is None:
             return Response({'error': 'العام الدراسي غير موجود'}, status=status.HTTP_400_BAD_REQUEST)
 
         # Check if academic year is closed
@@ -466,171 +661,83 @@ class UploadStudentsView(APIView):
         # Validate level if provided, otherwise CSV must have level column
         level = None
         if level_id:
-            try:
-                level = Level.objects.get(id=level_id)
-            except Level.DoesNotExist:
+            level = structure.level(level_id)
+            if level is None:
                 return Response({'error': 'الفرقة غير موجودة'}, status=status.HTTP_400_BAD_REQUEST)
-        else:
+        elif cached is None:
             # Check if CSV has level column for multi-level upload
-            if file.name.endswith('.csv'):
-                df_check = pd.read_csv(io.BytesIO(file.read()))
-            elif file.name.endswith(('.xlsx', '.xls')):
-                df_check = pd.read_excel(io.BytesIO(file.read()))
-            else:
-                return Response({'error': 'صيغة الملف غير مدعومة'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            if 'level' not in df_check.columns:
+            try:
+                check_upload(file)
+                columns = read_header(file)
+            except SpreadsheetError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            if 'level' not in columns:
                 return Response(
                     {'error': 'يجب اختيار الفرقة أو إضافة عمود level في الملف'}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            # Reset file pointer for later reading
-            file.seek(0)
 
         specialization = None
         if specialization_id:
-            try:
-                specialization = Specialization.objects.get(id=specialization_id)
-            except Specialization.DoesNotExist:
+            specialization = structure.specialization(specialization_id)
+            if specialization is None:
                 return Response({'error': 'التخصص غير موجود'}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            # Read file
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(io.BytesIO(file.read()))
-            elif file.name.endswith(('.xlsx', '.xls')):
-                df = pd.read_excel(io.BytesIO(file.read()))
-            else:
-                return Response(
-                    {'error': 'صيغة الملف غير مدعومة. استخدم CSV أو Excel.'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            # Auto-fill missing columns from UI selections
-            if 'department' not in df.columns:
-                df['department'] = department.name
-            if 'level' not in df.columns and level:
-                df['level'] = level.get_name_display()
+        # Per-row specializations only when the department has them and none was selected
+        allow_mixed_specializations = bool(structure.specializations_of(department.id)) and specialization is None
 
-            # Validate required columns (now requires department and level)
-            required_columns = ['national_id', 'full_name', 'department', 'level']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
-                return Response(
-                    {
-                        'error': f'أعمدة مفقودة إلزامية: {missing_columns}. يجب إضافة أعمدة department و level للتحقق من البيانات.',
-                        'required_columns': required_columns,
-                        'found_columns': list(df.columns),
-                        'note': 'الأعمدة الإلزامية: national_id, full_name, department, level. العمود email اختياري.'
-                    },
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            # Validate CSV content matches selected department using helper function
-            validation_errors = []
-            if 'department' not in df.columns:
-                validation_errors.append('عمود department مطلوب في الملف للتحقق من القسم')
-            else:
-                csv_departments = df['department'].dropna().astype(str).str.strip().unique()
-                for csv_dept in csv_departments:
-                    if not match_department(csv_dept, department):
-                        validation_errors.append(
-                            f'قسم في الملف "{csv_dept}" لا يطابق القسم المحدد "{department.name}". '
-                            f'يرجى التحقق من اختيار القسم الصحيح أو تصحيح البيانات في الملف'
-                        )
-            
-            # Validate level column - now REQUIRED
-            if 'level' not in df.columns:
-                validation_errors.append('عمود level مطلوب في الملف للتحقق من الفرقة')
+        try:
+            if cached is not None:
+                # The preview already validated the file and stored its rows
+                rows_file = job_storage().open(cached['upload_path'], 'rb')
+                file_name = cached['file_name']
+                total_rows = cached['total_rows']
             else:
-                csv_levels = df['level'].dropna().astype(str).str.strip().unique()
-                for csv_level in csv_levels:
-                    if level:  # Single level selected in UI
-                        if not match_level(csv_level, level):
-                            validation_errors.append(
-                                f'فرقة في الملف "{csv_level}" لا تطابق الفرقة المحددة "{level.get_name_display()}". '
-                                f'يرجى التحقق من اختيار الفرقة الصحيحة أو تصحيح البيانات في الملف'
-                            )
-                    else:  # Multi-level upload - just validate level exists
-                        level_exists = Level.objects.filter(
-                            Q(name__iexact=csv_level) | 
-                            Q(name__iexact=csv_level.replace(' ', '_')) |
-                            Q(id=csv_level if csv_level.isdigit() else 0)
-                        ).exists()
-                        if not level_exists:
-                            validation_errors.append(f'فرقة غير موجودة: "{csv_level}"')
-            
-            # Validate specialization column - REQUIRED for departments with specializations (all levels except FIRST/PREP)
-            # Support mixed specializations: if CSV has specialization column, use it per-row
-            allow_mixed_specializations = False
-            levels_without_specializations = ['FIRST', 'الفرقة الأولى', 'PREPARATORY', 'الفرقة الإعدادية', 'PREP']
-            
-            if department.specializations.exists():
-                # Check if any row in CSV is from a level that requires specialization (not FIRST/PREP)
-                has_level_requiring_spec = False
-                if 'level' in df.columns:
-                    for lvl in df['level'].dropna().astype(str).str.strip().unique():
-                        lvl_upper = lvl.upper()
-                        if lvl and not any(ls in lvl_upper or ls in lvl for ls in levels_without_specializations):
-                            has_level_requiring_spec = True
-                            break
-                
-                if has_level_requiring_spec and 'specialization' not in df.columns:
-                    validation_errors.append(
-                        'عمود specialization إلزامي للهندسة الكهربية للفرق الثانية والثالثة والرابعة. ' 
-                        'يجب إضافة عمود specialization بقيم ece (هندسة اتصالات) أو epm (هندسة قوى)'
+                try:
+                    scan = _scan_student_upload(file, department, level, specialization)
+                except SpreadsheetError as e:
+                    return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+                if scan['missing_columns']:
+                    return Response(
+                        {
+                            'error': f"أعمدة مفقودة إلزامية: {scan['missing_columns']}. يجب إضافة أعمدة department و level للتحقق من البيانات.",
+                            'required_columns': STUDENT_REQUIRED_COLUMNS,
+                            'found_columns': scan['found_columns'],
+                            'note': 'الأعمدة الإلزامية: national_id, full_name, department, level. العمود email اختياري.'
+                        },
+                        status=status.HTTP_400_BAD_REQUEST
                     )
-                elif 'specialization' in df.columns:
-                    # Check if all specializations in CSV are valid (only for levels that require it)
-                    csv_specializations = df['specialization'].dropna().astype(str).str.strip().unique()
-                    valid_specs = Specialization.objects.filter(department=department)
-                    for csv_spec in csv_specializations:
-                        if csv_spec:
-                            # Check if this specialization exists for this department
-                            spec_exists = any(
-                                match_specialization(csv_spec, spec) for spec in valid_specs
-                            )
-                            if not spec_exists:
-                                validation_errors.append(
-                                    f'تخصص "{csv_spec}" في الملف غير موجود في قسم {department.name}'
-                                )
-                            elif specialization:
-                                # If UI specialization selected, CSV MUST match
-                                if not match_specialization(csv_spec, specialization):
-                                    validation_errors.append(
-                                        f'تخصص في الملف "{csv_spec}" لا يطابق التخصص المحدد "{specialization.name}". '
-                                        f'يرجى اختيار التخصص الصحيح أو تصحيح الملف'
-                                    )
-                            else:
-                                # No UI specialization but CSV has it - allow mixed
-                                allow_mixed_specializations = True
-            else:
-                # For non-electrical departments, specialization is optional but must match if provided
-                if 'specialization' in df.columns:
-                    csv_specializations = df['specialization'].dropna().astype(str).str.strip().unique()
-                    for csv_spec in csv_specializations:
-                        if csv_spec:
-                            if specialization:
-                                if not match_specialization(csv_spec, specialization):
-                                    validation_errors.append(
-                                        f'تخصص في الملف "{csv_spec}" لا يطابق التخصص المحدد في الواجهة "{specialization.name}". '
-                                        f'يرجى التحقق من اختيار التخصص الصحيح أو إزالة عمود specialization من الملف'
-                                    )
-                            else:
-                                validation_errors.append(
-                                    f'عمود specialization موجود في الملف ("{csv_spec}") ولكن لم يتم اختيار تخصص في الواجهة. '
-                                    f'يرجى اختيار التخصص في الواجهة أولاً أو إزالة عمود specialization من الملف'
-                                )
-            
-            if validation_errors:
-                return Response(
-                    {'error': 'خطأ في التحقق من البيانات', 'details': validation_errors}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
 
-            # Process students with multi-level and multi-specialization support
-            results = self._process_students(df, department, academic_year, level, specialization, request.user, allow_mixed_specializations)
-            return Response(results, status=status.HTTP_201_CREATED)
+                validation_errors = _student_upload_errors(scan)
+                if validation_errors:
+                    return Response(
+                        {'error': 'خطأ في التحقق من البيانات', 'details': validation_errors}, 
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                rows_file = _student_rows_file(scan['rows'])
+                file_name = file.name
+                total_rows = scan['total_rows']
+
+            # The job imports the validated rows; the sheet is not parsed again
+            job = enqueue(BackgroundJob.JobType.STUDENT_UPLOAD, request.user, params={
+                'department_id': department.id,
+                'academic_year_id': academic_year.id,
+                'level_id': level.id if level else None,
+                'specialization_id': specialization.id if specialization else None,
+                'allow_mixed_specializations': allow_mixed_specializations,
+                'total_rows': total_rows,
+            }, upload=rows_file, file_name=file_name)
+            if cached is not None:
+                from django.core.cache import cache
+                rows_file.close()
+                try:
+                    cache.delete(_student_upload_key(upload_token))
+                    job_storage().delete(cached['upload_path'])
+                except Exception:
+                    pass
+            return job_accepted(job, total_rows=total_rows)
 
         except Exception as e:
             import traceback
@@ -642,144 +749,17 @@ class UploadStudentsView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    def _process_students(self, df, department, academic_year, default_level, default_specialization, performed_by, allow_mixed_specializations=False):
+    def _process_students(self, batches, department, academic_year, default_level, default_specialization, performed_by, allow_mixed_specializations=False, progress=None):
         """Process student data and create accounts with multi-level and multi-specialization support"""
-        created_count = 0
-        updated_count = 0
-        errors = []
+        from .student_import import import_students
 
-        for index, row in df.iterrows():
-            try:
-                with transaction.atomic():
-                    national_id = str(row['national_id']).strip()
-                    full_name = str(row['full_name']).strip()
-                    email = row.get('email', '')
-                    if pd.notna(email):
-                        email = str(email).strip()
-                    else:
-                        email = ''
-
-                    # Validate national_id
-                    if not national_id or len(national_id) < 10:
-                        raise ValueError('الرقم القومي غير صالح')
-
-                    # Determine level for this row
-                    row_level = default_level
-                    if not default_level and 'level' in df.columns:
-                        level_value = str(row['level']).strip()
-                        # Try to find level by name - use filter to avoid MultipleObjectsReturned
-                        row_level = Level.objects.filter(
-                            Q(name__iexact=level_value) | 
-                            Q(name__iexact=level_value.replace(' ', '_'))
-                        ).first()
-                        
-                        if not row_level:
-                            errors.append(f"صف {index + 2}: الفرقة '{level_value}' غير موجودة")
-                            continue
-
-                    # Determine specialization for this row (supports mixed specializations)
-                    row_specialization = default_specialization
-                    if allow_mixed_specializations and 'specialization' in df.columns:
-                        spec_value = str(row['specialization']).strip()
-                        # Try to find specialization by code or name
-                        # Try by code first (ece, epm) - use filter to avoid MultipleObjectsReturned
-                        row_specialization = Specialization.objects.filter(
-                            Q(code__iexact=spec_value) | Q(name__iexact=spec_value),
-                            department=department
-                        ).first()
-                        
-                        if not row_specialization:
-                            # Try matching with helper function
-                            all_specs = Specialization.objects.filter(department=department)
-                            for spec in all_specs:
-                                if match_specialization(spec_value, spec):
-                                    row_specialization = spec
-                                    break
-                            else:
-                                errors.append(f"صف {index + 2}: التخصص '{spec_value}' غير موجود")
-                                continue
-
-                    # Check if student exists
-                    student_exists = Student.objects.filter(national_id=national_id).exists()
-                    user_exists = User.objects.filter(username=national_id).exists()
-
-                    if student_exists:
-                        # Update existing student - but ONLY if they belong to the same department
-                        student = Student.objects.get(national_id=national_id)
-                        
-                        # Safety check: prevent cross-department reassignment
-                        if student.department_id != department.id:
-                            errors.append(
-                                f"صف {index + 2}: الطالب '{full_name}' (الرقم القومي: {national_id}) "
-                                f"مسجل بالفعل في قسم '{student.department.name}'. "
-                                f"لا يمكن نقله إلى قسم '{department.name}' عبر رفع الملفات."
-                            )
-                            continue
-                        
-                        student.full_name = full_name
-                        student.level = row_level
-                        student.academic_year = academic_year
-                        if row_specialization:
-                            student.specialization = row_specialization
-                        student.save()
-                        
-                        # Update user email if provided
-                        if email and student.user:
-                            student.user.email = email
-                            student.user.save()
-                        
-                        updated_count += 1
-                    elif user_exists:
-                        # User exists but Student record was deleted
-                        user = User.objects.get(username=national_id)
-                        user.first_name = full_name.split()[0] if full_name else ''
-                        user.last_name = ' '.join(full_name.split()[1:]) if len(full_name.split()) > 1 else ''
-                        if email:
-                            user.email = email
-                        user.first_login_required = True
-                        user.save()
-
-                        Student.objects.create(
-                            national_id=national_id,
-                            full_name=full_name,
-                            user=user,
-                            level=row_level,
-                            academic_year=academic_year,
-                            department=department,
-                            specialization=row_specialization
-                        )
-                        updated_count += 1
-                    else:
-                        # Create new user and student
-                        user = User.objects.create_user(
-                            username=national_id,
-                            password=national_id,
-                            email=email or None,
-                            first_name=full_name.split()[0] if full_name else '',
-                            last_name=' '.join(full_name.split()[1:]) if len(full_name.split()) > 1 else '',
-                            national_id=national_id,
-                            role='STUDENT',
-                            first_login_required=True
-                        )
-
-                        Student.objects.create(
-                            national_id=national_id,
-                            full_name=full_name,
-                            user=user,
-                            level=row_level,
-                            academic_year=academic_year,
-                            department=department,
-                            specialization=row_specialization
-                        )
-                        created_count += 1
-
-            except Exception as e:
-                import traceback
-                error_msg = f"صف {index + 2}: {str(e)}"
-                errors.append(error_msg)
-                # Log the full traceback for debugging
-                print(f"ERROR in _process_students row {index + 2}: {str(e)}")
-                print(traceback.format_exc())
+        result = import_students(
+            batches, department, academic_year, default_level, default_specialization,
+            allow_mixed_specializations=allow_mixed_specializations, progress=progress
+        )
+        created_count = result['created']
+        updated_count = result['updated']
+        errors = result['errors']
 
         # Audit log
         try:
@@ -806,7 +786,7 @@ class UploadStudentsView(APIView):
                 upload_type='STUDENT',
                 file_name='students_upload',
                 uploaded_by=performed_by,
-                total_rows=len(df),
+                total_rows=result['total_rows'],
                 created_count=created_count,
                 updated_count=updated_count,
                 error_count=len(errors),
@@ -824,6 +804,22 @@ class UploadStudentsView(APIView):
 
 
 
+def run_student_upload_job(ctx):
+    """Background job: create/update the students of a validated upload"""
+    params = ctx.params
+    department = Department.objects.get(id=params['department_id'])
+    academic_year = AcademicYear.objects.get(id=params['academic_year_id'])
+    level = Level.objects.get(id=params['level_id']) if params.get('level_id') else None
+    specialization = Specialization.objects.get(id=params['specialization_id']) if params.get('specialization_id') else None
+    ctx.progress(0, params.get('total_rows'))
+    # The upload holds the rows validated by the view, streamed in batches
+    with ctx.open_upload() as f:
+        return UploadStudentsView()._process_students(
+            _iter_student_rows(f), department, academic_year, level, specialization, ctx.user,
+            params.get('allow_mixed_specializations', False), progress=ctx.progress
+        )
+
+
 class StudentListView(generics.ListAPIView):
     """List students with filtering by department, academic year, and level"""
     permission_classes = [IsStudentAffairsRole]
@@ -919,6 +915,7 @@ class StudentAffairsGradesView(APIView):
     Shows students with their subjects and grades (Midterm, Coursework, Final).
     """
     permission_classes = [IsStudentAffairsRole]
+    query_budget = 8
 
     def get(self, request):
         try:
@@ -933,130 +930,24 @@ class StudentAffairsGradesView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # Import models here to avoid circular imports
-            from .models import Subject, StudentGrade, CourseOffering, Department
-
-            try:
-                level = Level.objects.get(id=level_id)
-            except Level.DoesNotExist:
+            level = academic_structure().level(level_id)
+            if level is None:
                 return Response({'error': 'الفرقة غير موجودة'}, status=status.HTTP_404_NOT_FOUND)
 
-            # Check if department is preparatory
-            is_preparatory = False
-            if department_id and department_id not in ['null', 'undefined', '']:
-                try:
-                    department = Department.objects.get(id=department_id)
-                    is_preparatory = department.is_preparatory or department.code == 'PREP'
-                except Department.DoesNotExist:
-                    pass
-            else:
+            if department_id in ['null', 'undefined', '']:
                 department_id = None
 
-            # Also check level name for preparatory
-            level_is_prep = level.name == 'PREPARATORY' or (hasattr(Level, 'LevelName') and level.name == Level.LevelName.PREPARATORY)
-
-            # Get students in this level
-            if is_preparatory or level_is_prep:
-                # For preparatory, filter by level and academic year only (no department filter)
-                students = Student.objects.filter(
-                    level_id=level_id,
-                    academic_year_id=academic_year_id
-                ).select_related('user')
-            else:
-                # For regular departments
-                students = Student.objects.filter(
-                    level_id=level_id,
-                    department_id=department_id,
-                    academic_year_id=academic_year_id
-                ).select_related('user')
-                
-                # Apply specialization filter if provided
-                if specialization_id:
-                    students = students.filter(specialization_id=specialization_id)
-
-            # Get subjects for this level
-            if is_preparatory or level_is_prep:
-                # For preparatory, get subjects for PREPARATORY level
-                subjects = Subject.objects.filter(level='PREPARATORY')
+            # Polls share one snapshot per scope until a grade write bumps its version
+            etag, payload = get_grid_snapshot(
+                academic_year_id, level.id, department_id, specialization_id,
+                lambda: self._build_grid(level, academic_year_id, department_id, specialization_id)
+            )
+            if etag in request.headers.get('If-None-Match', ''):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
             else:
-                subjects = Subject.objects.filter(
-                    level=level.name,
-                    department_id=department_id
-                )
-                # Filter subjects by specialization if provided
-                if specialization_id:
-                    subjects = subjects.filter(
-                        Q(specialization_id=specialization_id) | 
-                        Q(specialization__isnull=True)
-                    )
-
-            # Get course offerings for these subjects
-            offerings = CourseOffering.objects.filter(
-                subject__in=subjects,
-                level=level,
-                academic_year_id=academic_year_id
-            ).select_related('grading_template')
-
-            offerings_max_total = {}
-            for off in offerings:
-                gt = off.grading_template
-                if gt:
-                    offerings_max_total[off.subject_id] = float(gt.attendance_weight or 0) + float(gt.quizzes_weight or 0) + float(gt.midterm_weight or 0) + float(gt.practical_weight or 0) + float(gt.final_weight or 0)
-                else:
-                    offerings_max_total[off.subject_id] = 100
-
-            # Get all grades for these students and offerings
-            grades = StudentGrade.objects.filter(
-                student__in=students,
-                course_offering__in=offerings
-            ).select_related('course_offering')
-
-            # Create a lookup dictionary: (student_id, subject_id) -> grade
-            grades_lookup = {}
-            for g in grades:
-                grades_lookup[(g.student_id, g.course_offering.subject_id)] = g
-
-            # Get grades for each student
-            result = []
-            for student in students:
-                student_data = {
-                    'id': student.id,
-                    'national_id': student.national_id,
-                    'full_name': student.full_name,
-                    'subjects': []
-                }
-
-                for subject in subjects:
-                    sg = grades_lookup.get((student.id, subject.id))
-                    grade_data = {
-                        'subject_id': subject.id,
-                        'subject_name': subject.name,
-                        'subject_code': subject.code,
-                        'midterm': float(sg.midterm) if sg and sg.midterm is not None else None,
-                        'coursework': float(sg.coursework) if sg and sg.coursework is not None else None,
-                        'practical': float(sg.practical) if sg and hasattr(sg, 'practical') and sg.practical is not None else None,
-                        'final': float(sg.final) if sg and sg.final is not None else None,
-                        'attendance': sg.attendance_grade() if sg else None,
-                        'quizzes': sg.quizzes_grade() if sg else None,
-                    }
-                    student_data['subjects'].append(grade_data)
-
-                result.append(student_data)
-
-            # Also return subjects list for table headers
-            subjects_list = []
-            for s in subjects:
-                subjects_list.append({
-                    'id': s.id,
-                    'name': s.name,
-                    'code': s.code,
-                    'max_total': offerings_max_total.get(s.id, 100)
-                })
-
-            return Response({
-                'students': result,
-                'subjects': subjects_list
-            })
+                response = Response(payload)
+            response['ETag'] = etag
+            return response
         except Exception as e:
             import traceback
             return Response({
@@ -1064,20 +955,134 @@ class StudentAffairsGradesView(APIView):
                 'details': traceback.format_exc()
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def _build_grid(self, level, academic_year_id, department_id, specialization_id):
+        """Build the students x subjects grades matrix for one scope"""
+        # Import models here to avoid circular imports
+        from .models import Subject, StudentGrade, CourseOffering
+
+        # Check if department is preparatory
+        is_preparatory = False
+        if department_id:
+            department = academic_structure().department(department_id)
+            if department:
+                is_preparatory = department.is_preparatory or department.code == 'PREP'
+
+        # Also check level name for preparatory
+        level_is_prep = level.name == 'PREPARATORY' or (hasattr(Level, 'LevelName') and level.name == Level.LevelName.PREPARATORY)
+
+        # Get students in this level
+        if is_preparatory or level_is_prep:
+            # For preparatory, filter by level and academic year only (no department filter)
+            students = Student.objects.filter(
+                level_id=level.id,
+                academic_year_id=academic_year_id
+            ).select_related('user')
+        else:
+            # For regular departments
+            students = Student.objects.filter(
+                level_id=level.id,
+                department_id=department_id,
+                academic_year_id=academic_year_id
+            ).select_related('user')
+            
+            # Apply specialization filter if provided
+            if specialization_id:
+                students = students.filter(specialization_id=specialization_id)
+
+        # Get subjects for this level
+        if is_preparatory or level_is_prep:
+            # For preparatory, get subjects for PREPARATORY level
+            subjects = Subject.objects.filter(level='PREPARATORY')
+        else:
+            subjects = Subject.objects.filter(
+                level=level.name,
+                department_id=department_id
+            )
+            # Filter subjects by specialization if provided
+            if specialization_id:
+                subjects = subjects.filter(
+                    Q(specialization_id=specialization_id) | 
+                    Q(specialization__isnull=True)
+                )
+        subjects = list(subjects)
+
+        # Get course offerings for these subjects
+        offerings = CourseOffering.objects.filter(
+            subject__in=subjects,
+            level=level,
+            academic_year_id=academic_year_id
+        ).select_related('grading_template')
+
+        offerings_max_total = {
+            off.subject_id: max_total(off.grading_template) for off in offerings
+        }
+        offering_subjects = {off.id: off.subject_id for off in offerings}
+
+        # Precomputed grade summaries for these students and offerings
+        grades = StudentGrade.objects.filter(
+            student__in=students,
+            course_offering__in=offerings
+        )
+
+        # Create a lookup dictionary: (student_id, subject_id) -> summary
+        grades_lookup = {}
+        for (student_id, offering_id), summary in summaries_for(grades).items():
+            grades_lookup[(student_id, offering_subjects[offering_id])] = summary
+
+        # Get grades for each student
+        result = []
+        for student in students:
+            student_data = {
+                'id': student.id,
+                'national_id': student.national_id,
+                'full_name': student.full_name,
+                'subjects': []
+            }
+
+            for subject in subjects:
+                sg = grades_lookup.get((student.id, subject.id))
+                grade_data = {
+                    'subject_id': subject.id,
+                    'subject_name': subject.name,
+                    'subject_code': subject.code,
+                    'midterm': float(sg.midterm) if sg and sg.midterm is not None else None,
+                    'coursework': float(sg.coursework) if sg else None,
+                    'practical': float(sg.practical) if sg and sg.practical is not None else None,
+                    'final': float(sg.final) if sg and sg.final is not None else None,
+                    'attendance': float(sg.attendance_grade) if sg else None,
+                    'quizzes': float(sg.quizzes_grade) if sg else None,
+                }
+                student_data['subjects'].append(grade_data)
+
+            result.append(student_data)
+
+        # Also return subjects list for table headers
+        subjects_list = []
+        for s in subjects:
+            subjects_list.append({
+                'id': s.id,
+                'name': s.name,
+                'code': s.code,
+                'max_total': offerings_max_total.get(s.id, 100)
+            })
+
+        return {
+            'students': result,
+            'subjects': subjects_list
+        }
+
 
 class BulkCertificateUploadView(APIView):
     """
-    Upload certificates in bulk via a CSV mapping file + PDF files.
-    CSV format: national_id, description (optional)
-    Each row maps to a PDF file named <national_id>.pdf in the uploaded ZIP.
-    Or upload individual PDFs with a CSV mapping.
+    Upload certificates in bulk via a ZIP file.
+    Each PDF in the ZIP is named <national_id>.pdf and is attached to that student.
+    The ZIP is ingested by the background job worker.
     """
     parser_classes = (MultiPartParser, FormParser)
     permission_classes = [IsStudentAffairsRole]
 
     def post(self, request):
         import zipfile
-        from django.core.files.base import ContentFile
 
         zip_file = request.FILES.get('file')
         if not zip_file:
@@ -1092,73 +1097,79 @@ class BulkCertificateUploadView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            zf = zipfile.ZipFile(io.BytesIO(zip_file.read()))
-        except zipfile.BadZipFile:
+        if not zipfile.is_zipfile(zip_file):
             return Response(
                 {'error': 'ملف ZIP غير صالح'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        created_count = 0
-        errors = []
-        pdf_names = [n for n in zf.namelist() if n.lower().endswith('.pdf')]
-
-        for pdf_name in pdf_names:
-            try:
-                # Extract national_id from filename (e.g., "12345678901234.pdf")
-                national_id = pdf_name.rsplit('.', 1)[0].strip()
-                # Handle nested folders (e.g., "certs/12345678901234.pdf")
-                if '/' in national_id:
-                    national_id = national_id.rsplit('/', 1)[1]
+        job = enqueue(BackgroundJob.JobType.CERTIFICATE_ZIP, request.user, upload=zip_file)
+        return job_accepted(job)
 
-                # Find student by national_id
-                try:
-                    student = Student.objects.get(national_id=national_id)
-                except Student.DoesNotExist:
-                    errors.append(f'{pdf_name}: الطالب بالرقم القومي {national_id} غير موجود')
-                    continue
 
-                if not student.user:
-                    errors.append(f'{pdf_name}: الطالب ليس لديه حساب مستخدم')
-                    continue
+def run_certificate_zip_job(ctx):
+    """Background job: create a Certificate for every <national_id>.pdf in an uploaded ZIP"""
+    import zipfile
+    from django.core.files.base import ContentFile
 
-                # Read PDF content
-                pdf_content = zf.read(pdf_name)
-                cert_file = ContentFile(pdf_content, name=f'{national_id}.pdf')
+    with ctx.open_upload() as upload:
+        zf = zipfile.ZipFile(io.BytesIO(upload.read()))
 
-                # Create certificate
-                Certificate.objects.create(
-                    student=student.user,
-                    file=cert_file,
-                    description=f'شهادة مرفوعة بالجملة - {student.full_name}',
-                )
-                created_count += 1
+    created_count = 0
+    errors = []
+    pdf_names = [n for n in zf.namelist() if n.lower().endswith('.pdf')]
 
-            except Exception as e:
-                errors.append(f'{pdf_name}: {str(e)}')
+    # Extract national_id from filename, handling nested folders (e.g., "certs/12345678901234.pdf")
+    national_ids = {name: name.rsplit('.', 1)[0].strip().rsplit('/', 1)[-1] for name in pdf_names}
+    students = {
+        s.national_id: s for s in Student.objects.filter(national_id__in=set(national_ids.values())).select_related('user')
+    }
 
-        # Track upload history
+    for position, pdf_name in enumerate(pdf_names):
+        ctx.progress(position, len(pdf_names))
         try:
-            UploadHistory.objects.create(
-                upload_type='CERTIFICATE',
-                file_name=zip_file.name,
-                uploaded_by=request.user,
-                total_rows=len(pdf_names),
-                created_count=created_count,
-                updated_count=0,
-                error_count=len(errors),
-                errors_json=errors if errors else None,
+            national_id = national_ids[pdf_name]
+            student = students.get(national_id)
+            if student is None:
+                errors.append(f'{pdf_name}: الطالب بالرقم القومي {national_id} غير موجود')
+                continue
+
+            if not student.user:
+                errors.append(f'{pdf_name}: الطالب ليس لديه حساب مستخدم')
+                continue
+
+            cert_file = ContentFile(zf.read(pdf_name), name=f'{national_id}.pdf')
+            Certificate.objects.create(
+                student=student.user,
+                file=cert_file,
+                description=f'شهادة مرفوعة بالجملة - {student.full_name}',
             )
-        except Exception:
-            pass
+            created_count += 1
 
-        return Response({
-            'message': f'تم رفع {created_count} شهادة بنجاح',
-            'created_count': created_count,
-            'error_count': len(errors),
-            'errors': errors,
-        }, status=status.HTTP_201_CREATED)
+        except Exception as e:
+            errors.append(f'{pdf_name}: {str(e)}')
+
+    # Track upload history
+    try:
+        UploadHistory.objects.create(
+            upload_type='CERTIFICATE',
+            file_name=ctx.job.file_name,
+            uploaded_by=ctx.user,
+            total_rows=len(pdf_names),
+            created_count=created_count,
+            updated_count=0,
+            error_count=len(errors),
+            errors_json=errors if errors else None,
+        )
+    except Exception:
+        pass
+
+    return {
+        'message': f'تم رفع {created_count} شهادة بنجاح',
+        'created_count': created_count,
+        'error_count': len(errors),
+        'errors': errors,
+    }
 
 
 class SyncCertificatesFromStorageView(APIView):
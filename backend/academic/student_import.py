@@ -0,0 +1,300 @@
+"""
+Batch import engine for student uploads.
+
+Each batch of rows is normalized and validated with pandas, levels and
+specializations are resolved from maps built once, existing students/users
+are fetched with one IN query per chunk and rows are written with
+bulk_create/bulk_update. Row errors keep the Arabic "صف N: ..." format of
+the old row-by-row import.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+import pandas as pd
+
+from users.hashers import make_initial_password
+from .models import Student
+from .structure_cache import academic_structure
+
+User = get_user_model()
+
+CHUNK_SIZE = 500
+
+
+def _text_column(df, column):
+    """Column as stripped strings ('' for missing cells)"""
+    if column not in df.columns:
+        return pd.Series('', index=df.index)
+    values = df[column].astype(object).where(df[column].notna(), '')
+    return values.astype(str).str.strip()
+
+
+def _split_name(full_name):
+    parts = full_name.split()
+    return (parts[0] if parts else ''), ' '.join(parts[1:])
+
+
+class _LevelMap:
+    """Resolve CSV level names; levels of the upload's year/department win"""
+
+    def __init__(self, department, academic_year):
+        self.scoped = {}
+        self.others = {}
+        for level in academic_structure().levels.values():
+            key = level.name.lower()
+            if level.department_id == department.id and level.academic_year_id == academic_year.id:
+                self.scoped.setdefault(key, level)
+            else:
+                self.others.setdefault(key, level)
+
+    def get(self, value):
+        for key in (value.lower(), value.replace(' ', '_').lower()):
+            level = self.scoped.get(key) or self.others.get(key)
+            if level:
+                return level
+        return None
+
+
+def _resolve_specializations(values, department):
+    """Map each distinct CSV specialization value to a Specialization (or None)"""
+    from .student_affairs_views import match_specialization
+
+    specs = academic_structure().specializations_of(department.id)
+    resolved = {}
+    for value in values:
+        lowered = value.lower()
+        spec = next(
+            (s for s in specs if (s.code or '').lower() == lowered or s.name.lower() == lowered),
+            None
+        )
+        if spec is None:
+            spec = next((s for s in specs if match_specialization(value, s)), None)
+        resolved[value] = spec
+    return resolved
+
+
+def import_students(batches, department, academic_year, default_level=None, default_specialization=None,
+                    allow_mixed_specializations=False, progress=None, chunk_size=CHUNK_SIZE):
+    """Create or update the students of an upload, one DataFrame batch at a time.
+
+    Returns {'created', 'updated', 'errors', 'total_rows'} like the old per-row import.
+    """
+    errors = []  # (row number, message)
+    level_map = None if default_level else _LevelMap(department, academic_year)
+    created_count = 0
+    updated_count = 0
+    total_rows = 0
+
+    for df in batches:
+        records = _prepare_records(
+            df, department, default_level, default_specialization,
+            allow_mixed_specializations, level_map, errors
+        )
+        for start in range(0, len(records), chunk_size):
+            if progress:
+                progress(total_rows + start)
+            chunk = records[start:start + chunk_size]
+            created, updated = _write_chunk(chunk, department, academic_year, errors)
+            created_count += created
+            updated_count += updated
+        total_rows += len(df)
+
+    errors.sort(key=lambda item: item[0])
+    return {
+        'created': created_count,
+        'updated': updated_count,
+        'errors': [message for _, message in errors],
+        'total_rows': total_rows,
+    }
+
+
+def _prepare_records(df, department, default_level, default_specialization,
+                     allow_mixed_specializations, level_map, errors):
+    """Normalized records of one batch; rows that cannot be imported go to errors"""
+    frame = pd.DataFrame({
+        'row': df.index + 2,
+        'national_id': _text_column(df, 'national_id').str.replace(r'\.0$', '', regex=True),
+        'full_name': _text_column(df, 'full_name'),
+        'email': _text_column(df, 'email'),
+    })
+
+    # National ID
+    invalid = frame['national_id'].str.len() < 10
+    errors.extend((row, f'صف {row}: الرقم القومي غير صالح') for row in frame.loc[invalid, 'row'])
+    frame = frame[~invalid]
+
+    # Level
+    if default_level:
+        frame['level'] = default_level
+    else:
+        level_values = _text_column(df, 'level').loc[frame.index]
+        frame['level'] = level_values.map({v: level_map.get(v) for v in level_values.unique()})
+        missing = frame['level'].isna()
+        errors.extend(
+            (row, f"صف {row}: الفرقة '{value}' غير موجودة")
+            for row, value in zip(frame.loc[missing, 'row'], level_values[missing])
+        )
+        frame = frame[~missing]
+
+    # Specialization (per row only for mixed uploads; blank cells keep the default)
+    frame['specialization'] = default_specialization
+    if allow_mixed_specializations and 'specialization' in df.columns:
+        spec_values = _text_column(df, 'specialization').loc[frame.index]
+        given = spec_values != ''
+        spec_map = _resolve_specializations(spec_values[given].unique(), department)
+        frame.loc[given, 'specialization'] = spec_values[given].map(spec_map)
+        missing = given & frame['specialization'].isna()
+        errors.extend(
+            (row, f"صف {row}: التخصص '{value}' غير موجود")
+            for row, value in zip(frame.loc[missing, 'row'], spec_values[missing])
+        )
+        frame = frame[~missing]
+
+    return frame.to_dict('records')
+
+
+def _write_chunk(chunk, department, academic_year, errors):
+    """Write one chunk in a transaction; retry row by row if the batch fails"""
+    chunk_errors = []
+    try:
+        with transaction.atomic():
+            result = _write_records(chunk, department, academic_year, chunk_errors)
+        errors.extend(chunk_errors)
+        return result
+    except Exception as e:
+        if len(chunk) == 1:
+            row = chunk[0]['row']
+            errors.append((row, f'صف {row}: {str(e)}'))
+            return 0, 0
+
+    created_count = updated_count = 0
+    for record in chunk:
+        created, updated = _write_chunk([record], department, academic_year, errors)
+        created_count += created
+        updated_count += updated
+    return created_count, updated_count
+
+
+def _write_records(chunk, department, academic_year, errors):
+    national_ids = {r['national_id'] for r in chunk}
+    students = {
+        s.national_id: s
+        for s in Student.objects.filter(national_id__in=national_ids).select_related('user', 'department')
+    }
+    users = {u.username: u for u in User.objects.filter(username__in=national_ids)}
+    taken_user_ids = set(
+        Student.objects.filter(user__in=users.values()).exclude(national_id__in=national_ids)
+        .values_list('user_id', flat=True)
+    )
+    # national_id is unique on users too; another account may already hold it
+    foreign_ids = dict(
+        User.objects.filter(national_id__in=national_ids).exclude(username__in=national_ids)
+        .values_list('national_id', 'username')
+    )
+
+    now = timezone.now()
+    created_count = 0
+    updated_count = 0
+    new_students = {}  # national_id -> Student
+    new_users = {}  # national_id -> User
+    updated_students = {}
+    updated_users = {}
+
+    for record in chunk:
+        row = record['row']
+        national_id = record['national_id']
+        full_name = record['full_name']
+        email = record['email']
+        first_name, last_name = _split_name(full_name)
+
+        student = students.get(national_id) or new_students.get(national_id)
+        user = users.get(national_id)
+
+        if student is not None:
+            # Update existing student - but ONLY if they belong to the same department
+            if student.department_id != department.id:
+                errors.append((row,
+                    f"صف {row}: الطالب '{full_name}' (الرقم القومي: {national_id}) "
+                    f"مسجل بالفعل في قسم '{student.department.name}'. "
+                    f"لا يمكن نقله إلى قسم '{department.name}' عبر رفع الملفات."
+                ))
+                continue
+
+            student.full_name = full_name
+            student.level = record['level']
+            student.academic_year = academic_year
+            if record['specialization']:
+                student.specialization = record['specialization']
+            student.updated_at = now
+            if student.pk:
+                updated_students[national_id] = student
+
+            # Update user email if provided
+            student_user = student.user if student.pk else (new_users.get(national_id) or user)
+            if email and student_user:
+                student_user.email = email
+                if student_user.pk:
+                    updated_users[national_id] = student_user
+            updated_count += 1
+            continue
+
+        if national_id in foreign_ids:
+            errors.append((row, f"صف {row}: الرقم القومي {national_id} مستخدم بالفعل للحساب '{foreign_ids[national_id]}'"))
+            continue
+
+        if user is not None:
+            # User exists but Student record was deleted
+            if user.id in taken_user_ids:
+                errors.append((row, f'صف {row}: الحساب {national_id} مرتبط بطالب آخر'))
+                continue
+            user.first_name = first_name
+            user.last_name = last_name
+            if email:
+                user.email = email
+            user.first_login_required = True
+            updated_users[national_id] = user
+            updated_count += 1
+        else:
+            # Create new user and student
+            new_users[national_id] = User(
+                username=national_id,
+                password=make_initial_password(national_id),
+                email=email,
+                first_name=first_name,
+                last_name=last_name,
+                national_id=national_id,
+                role='STUDENT',
+                first_login_required=True,
+            )
+            created_count += 1
+
+        new_students[national_id] = Student(
+            national_id=national_id,
+            full_name=full_name,
+            user=user,
+            level=record['level'],
+            academic_year=academic_year,
+            department=department,
+            specialization=record['specialization'],
+        )
+
+    if updated_users:
+        User.objects.bulk_update(
+            updated_users.values(), ['first_name', 'last_name', 'email', 'first_login_required']
+        )
+    if updated_students:
+        Student.objects.bulk_update(
+            updated_students.values(),
+            ['full_name', 'level', 'academic_year', 'specialization', 'updated_at']
+        )
+    if new_users:
+        User.objects.bulk_create(new_users.values())
+        # MySQL does not return ids from bulk_create
+        ids = dict(User.objects.filter(username__in=new_users).values_list('username', 'id'))
+        for national_id, student in new_students.items():
+            if national_id in new_users:
+                student.user_id = ids[national_id]
+    if new_students:
+        Student.objects.bulk_create(new_students.values())
+
+    return created_count, updated_count
@@ -2,14 +2,43 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from django.db import transaction
+from django.utils import timezone
+from django.urls import reverse
 
-from .models import ResultPublishing, Term, Level, AcademicYear, Specialization, CourseOffering, StudentGrade, Student
+from .models import ResultPublishing, BackgroundJob
+from .jobs import enqueue
+from .result_cards import bump_publish_version, get_result_card
+from .structure_cache import academic_structure
 from users.permissions import IsAdminRole, IsStudentAffairsRole, IsStudentRole, HasPaidTuition, IsDeanRole
 
 
+def _publishing_changed(publishings, user, transcripts=False):
+    """Invalidate the result cards of flipped ResultPublishing rows.
+
+    Newly published rows are pre-rendered by one background job, which is returned.
+    """
+    for academic_year_id, level_id in {(p.academic_year_id, p.level_id) for p in publishings}:
+        bump_publish_version(academic_year_id, level_id)
+    published = [p.id for p in publishings if p.is_published]
+    if not published:
+        return None
+    return enqueue(
+        BackgroundJob.JobType.RESULT_PUBLISH,
+        user,
+        params={'publishing_ids': published, 'transcripts': transcripts},
+    )
+
+
+def _publishing_flag(user):
+    """ResultPublishing approval field a role controls"""
+    return 'admin_approved' if user.role in ['DEAN', 'ADMIN'] else 'student_affairs_approved'
+
+
 class PublishingStatusView(APIView):
     """View and toggle publishing status for results (Dean and Student Affairs)"""
     permission_classes = [IsDeanRole | IsStudentAffairsRole]
+    query_budget = {'GET': 4}
 
     def get(self, request):
         """List result publishing status by specific academic tier (On-Demand Search)"""
@@ -22,48 +51,51 @@ class PublishingStatusView(APIView):
         if not all([year_name, level_name, term_name]):
             return Response([])
 
-        try:
-            academic_year = AcademicYear.objects.get(name=year_name)
-            term = Term.objects.get(name=term_name, academic_year=academic_year)
-            
-            # Find the exact Level based on level_name and department
-            level = None
-            if dept_name and dept_name != 'الفرقة الإعدادية' and dept_name != 'عام':
-                level = Level.objects.filter(name=level_name, department__name=dept_name, academic_year=academic_year).first()
-            else:
-                # For preparatory, check explicitly or check null
-                level = Level.objects.filter(name=level_name, department__name='الفرقة الإعدادية', academic_year=academic_year).first()
-                if not level:
-                    level = Level.objects.filter(name=level_name, department__isnull=True, academic_year=academic_year).first()
+        structure = academic_structure()
+        academic_year = structure.year_named(year_name)
+        term = academic_year and structure.term_named(academic_year.id, term_name)
+        if not term:
+            return Response([])
 
+        # Find the exact Level based on level_name and department
+        level = None
+        if dept_name and dept_name != 'الفرقة الإعدادية' and dept_name != 'عام':
+            department = structure.department_named(dept_name)
+            if department:
+                level = structure.level_named(level_name, department.id, academic_year.id)
+        else:
+            # For preparatory, check explicitly or check null
+            department = structure.department_named('الفرقة الإعدادية')
+            if department:
+                level = structure.level_named(level_name, department.id, academic_year.id)
             if not level:
-                return Response([])
-            spec = None
-            if spec_id:
-                spec = Specialization.objects.filter(id=spec_id).first()
-
-            s, created = ResultPublishing.objects.get_or_create(
-                academic_year=academic_year,
-                term=term,
-                level=level,
-                specialization=spec
-            )
+                level = structure.level_named(level_name, None, academic_year.id)
 
-            return Response([{
-                'id': s.id,
-                'academic_year': s.academic_year.name,
-                'term': s.term.get_name_display(),
-                'level': s.level.get_name_display(),
-                'department': s.level.department.name if s.level.department else 'عام',
-                'specialization': s.specialization.name if s.specialization else None,
-                'student_affairs_approved': s.student_affairs_approved,
-                'admin_approved': s.admin_approved,
-                'is_published': s.is_published,
-                'updated_at': s.updated_at
-            }])
-
-        except (AcademicYear.DoesNotExist, Term.DoesNotExist, Level.DoesNotExist):
+        if not level:
             return Response([])
+        spec = None
+        if spec_id:
+            spec = structure.specialization(spec_id)
+
+        s, created = ResultPublishing.objects.get_or_create(
+            academic_year=academic_year,
+            term=term,
+            level=level,
+            specialization=spec
+        )
+
+        return Response([{
+            'id': s.id,
+            'academic_year': academic_year.name,
+            'term': term.get_name_display(),
+            'level': level.get_name_display(),
+            'department': level.department.name if level.department else 'عام',
+            'specialization': spec.name if spec else None,
+            'student_affairs_approved': s.student_affairs_approved,
+            'admin_approved': s.admin_approved,
+            'is_published': s.is_published,
+            'updated_at': s.updated_at
+        }])
 
     def post(self, request):
         """Toggle publishing flag based on user role"""
@@ -80,13 +112,16 @@ class PublishingStatusView(APIView):
             # We allow Deans to publish results even if the term is closed (often happens end of year)
             pass
             
-        if request.user.role in ['DEAN', 'ADMIN']:
-            pub.admin_approved = not pub.admin_approved
-        elif request.user.role == 'STUDENT_AFFAIRS':
-            pub.student_affairs_approved = not pub.student_affairs_approved
+        was_published = pub.is_published
+        flag = _publishing_flag(request.user)
+        setattr(pub, flag, not getattr(pub, flag))
             
         pub.save()
-        
+
+        prerender_job = None
+        if pub.is_published != was_published:
+            prerender_job = _publishing_changed([pub], request.user, bool(request.data.get('transcripts')))
+
         # Log action
         try:
             from .models import AuditLog
@@ -101,103 +136,138 @@ class PublishingStatusView(APIView):
         except Exception:
             pass
             
-        return Response({'message': 'Status updated successfully', 'is_published': pub.is_published})
+        data = {'message': 'Status updated successfully', 'is_published': pub.is_published}
+        if prerender_job:
+            data['prerender_job_id'] = prerender_job.id
+            data['prerender_status_url'] = reverse('job-status', args=[prerender_job.id])
+        return Response(data)
 
 
 class StudentResultsQueryView(APIView):
     """Query student results by National ID. Enforces publishing and grading conditions."""
     permission_classes = [AllowAny]
+    query_budget = 6
 
     def get(self, request):
         national_id = request.query_params.get('national_id')
         if not national_id:
             return Response({'error': 'الرقم القومي مطلوب'}, status=status.HTTP_400_BAD_REQUEST)
-            
-        try:
-            student = Student.objects.get(national_id=national_id)
-        except Student.DoesNotExist:
+
+        results_data = get_result_card(national_id)
+        if results_data is None:
             return Response({'error': 'طالب غير موجود'}, status=status.HTTP_404_NOT_FOUND)
-            
-        # Get student's current level and academic year
-        level = student.level
-        academic_year = student.academic_year
-        
-        terms = Term.objects.filter(academic_year=academic_year)
-        
-        results_data = {
-            'student': {
-                'full_name': student.full_name,
-                'national_id': student.national_id,
-                'level': level.get_name_display(),
-                'department': student.department.name if student.department else 'إعدادي',
-                'academic_year': academic_year.name
-            },
-            'terms': []
-        }
-        
-        for term in terms:
-            term_data = {
-                'term_name': term.get_name_display(),
-                'is_published': False,
-                'is_fully_graded': False,
-                'courses': []
-            }
-            
-            # Check publishing status
-            try:
-                pub = ResultPublishing.objects.get(academic_year=academic_year, term=term, level=level)
-                term_data['is_published'] = pub.is_published
-            except ResultPublishing.DoesNotExist:
-                term_data['is_published'] = False
-                
-            # Get all CourseOfferings for this student's level, term, department/specialization
-            # Logic: filtering course offerings that apply to this student
-            offerings = CourseOffering.objects.filter(
-                academic_year=academic_year,
-                term=term,
-                level=level
-            )
-            
-            if student.department and level.department:
-                offerings = offerings.filter(subject__department=student.department)
-            if student.specialization:
-                offerings = offerings.filter(specialization=student.specialization)
-                
-            if not offerings.exists():
-                results_data['terms'].append(term_data)
-                continue
-                
-            # Check if fully graded and get grades
-            is_fully_graded = True
-            courses_grades = []
-            
-            for offering in offerings:
-                # Find StudentGrade
-                grade = StudentGrade.objects.filter(student=student, course_offering=offering).first()
-                if not grade or grade.final is None:
-                    is_fully_graded = False
-                    break # Optimization: If one is not graded, the whole term is not fully graded
-                    
-                total_grade = (grade.attendance or 0) + (grade.quizzes or 0) + (grade.coursework or 0) + (grade.midterm or 0) + grade.final
-                
-                courses_grades.append({
-                    'subject_name': offering.subject.name,
-                    'subject_code': offering.subject.code,
-                    'attendance': grade.attendance,
-                    'quizzes': grade.quizzes,
-                    'coursework': grade.coursework,
-                    'midterm': grade.midterm,
-                    'final': grade.final,
-                    'total': total_grade,
-                    'max_grade': offering.subject.max_grade
-                })
-                
-            term_data['is_fully_graded'] = is_fully_graded
-            
-            # Only include courses if both published and fully graded
-            if term_data['is_published'] and term_data['is_fully_graded']:
-                term_data['courses'] = courses_grades
-                
-            results_data['terms'].append(term_data)
-            
         return Response(results_data)
+
+
+class PublishingBulkView(APIView):
+    """Publish or unpublish results for many (level, specialization) scopes of one term at once.
+
+    POST body: {"academic_year": <id>, "term": <id>, "publish": true|false,
+                "scopes": [{"level": <id>, "specialization": <id or null>}, ...],
+                "transcripts": false}
+    Sets the approval flag of the caller's role on every scope (rows are created
+    if missing) in one transaction with a single audit entry.
+    """
+    permission_classes = [IsDeanRole | IsStudentAffairsRole]
+
+    def post(self, request):
+        scopes = request.data.get('scopes')
+        publish = request.data.get('publish')
+        if not isinstance(scopes, list) or not scopes or not isinstance(publish, bool):
+            return Response(
+                {'error': 'يجب تحديد الفرق المطلوبة وحالة الإعلان'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        structure = academic_structure()
+        academic_year = structure.year(request.data.get('academic_year'))
+        term = structure.term(request.data.get('term'))
+        if academic_year is None or term is None or term.academic_year_id != academic_year.id:
+            return Response({'error': 'العام الدراسي أو الفصل الدراسي غير موجود'}, status=status.HTTP_400_BAD_REQUEST)
+
+        keys = set()
+        for scope in scopes:
+            level = structure.level(scope.get('level')) if isinstance(scope, dict) else None
+            if level is None or level.academic_year_id != academic_year.id:
+                return Response({'error': 'الفرقة غير موجودة'}, status=status.HTTP_400_BAD_REQUEST)
+            spec = None
+            if scope.get('specialization'):
+                spec = structure.specialization(scope['specialization'])
+                if spec is None:
+                    return Response({'error': 'التخصص غير موجود'}, status=status.HTTP_400_BAD_REQUEST)
+            keys.add((level.id, spec.id if spec else None))
+
+        flag = _publishing_flag(request.user)
+        level_ids = {level_id for level_id, _ in keys}
+
+        with transaction.atomic():
+            def scope_rows():
+                rows = ResultPublishing.objects.select_for_update().filter(
+                    academic_year=academic_year, term=term, level_id__in=level_ids
+                )
+                return {(p.level_id, p.specialization_id): p for p in rows if (p.level_id, p.specialization_id) in keys}
+
+            existing = scope_rows()
+            missing = keys - existing.keys()
+            if missing:
+                ResultPublishing.objects.bulk_create([
+                    ResultPublishing(academic_year=academic_year, term=term, level_id=level_id, specialization_id=spec_id)
+                    for level_id, spec_id in missing
+                ], ignore_conflicts=True)
+                existing = scope_rows()
+
+            now = timezone.now()
+            changed = []
+            flipped = []
+            for pub in existing.values():
+                if getattr(pub, flag) == publish:
+                    continue
+                was_published = pub.is_published
+                setattr(pub, flag, publish)
+                pub.updated_at = now
+                changed.append(pub)
+                if pub.is_published != was_published:
+                    flipped.append(pub)
+            if changed:
+                ResultPublishing.objects.bulk_update(changed, [flag, 'updated_at'])
+
+            try:
+                from .models import AuditLog
+                AuditLog.objects.create(
+                    action='BULK_DEAN_PUBLISH' if request.user.role in ['DEAN', 'ADMIN'] else 'BULK_SA_PUBLISH',
+                    performed_by=request.user,
+                    entity_type='ResultPublishing',
+                    details={
+                        'academic_year': academic_year.name,
+                        'term': term.name,
+                        'publish': publish,
+                        'changed_ids': [p.id for p in changed],
+                        'published_ids': [p.id for p in flipped if p.is_published],
+                    }
+                )
+            except Exception:
+                pass
+
+            prerender_job = None
+            if flipped:
+                prerender_job = _publishing_changed(flipped, request.user, bool(request.data.get('transcripts')))
+
+        data = {
+            'message': f'تم تحديث حالة الإعلان لعدد {len(changed)} من {len(keys)}',
+            'updated': len(changed),
+            'results': [
+                {
+                    'id': p.id,
+                    'level': p.level_id,
+                    'specialization': p.specialization_id,
+                    'student_affairs_approved': p.student_affairs_approved,
+                    'admin_approved': p.admin_approved,
+                    'is_published': p.is_published,
+                }
+                for p in sorted(existing.values(), key=lambda p: p.id)
+            ],
+        }
+        if prerender_job:
+            data['prerender_job_id'] = prerender_job.id
+            data['prerender_status_url'] = reverse('job-status', args=[prerender_job.id])
+        return Response(data)
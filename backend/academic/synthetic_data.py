@@ -0,0 +1,463 @@
+"""
+Synthetic faculty-scale dataset for load and query-budget testing.
+
+generate_dataset() builds one academic year shaped like the real faculty:
+every department with its levels and specializations, students with their
+user accounts, course offerings for both terms with doctors and weekly
+schedules, a whole first term of attendance, quizzes with submitted
+attempts and answers, first-term grades (with summaries and standings
+refreshed through grade_engine), certificates and graduate requests for the
+fourth year, and one account for each administrative office. Second-term
+offerings are left without grades, as in a running year.
+
+Rows are written with bulk_create in batches; everything is drawn from a
+seeded random generator so the same (scale, seed) produces the same data.
+Synthetic students get 14-digit national IDs starting with 9 followed by the
+two-digit seed, which no real national ID does, and synthetic staff accounts
+use the username prefix syn<seed>-, so a dataset can be removed again with
+delete_dataset().
+"""
+import datetime
+import random
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from graduate_affairs.models import GraduateRequest
+from users.hashers import make_initial_password
+from .grade_engine import refresh_summaries_for
+from .models import (
+    AcademicYear, Attendance, Certificate, CourseOffering, Department, GradingTemplate,
+    LectureSchedule, Level, QuizChoice, QuizQuestion, Quiz, Specialization, Student,
+    StudentGrade, StudentQuizAnswer, StudentQuizAttempt, Subject, Term,
+)
+from .result_cards import student_offerings
+from .structure_cache import invalidate_academic_structure
+
+User = get_user_model()
+
+BATCH_SIZE = 2000
+
+# Same codes as seed_production.py / seed_subjects.py
+DEPARTMENTS = [
+    ('PREP', 'الفرقة الإعدادية', True, False),  # code, name, is_preparatory, has_specializations
+    ('ELEC', 'الهندسة الكهربية', False, True),
+    ('MECH', 'الهندسة الميكانيكية', False, False),
+    ('CIVIL', 'الهندسة المدنية', False, False),
+    ('ARCH', 'الهندسة المعمارية', False, False),
+]
+SPECIALIZATIONS = {
+    'ELEC': [('ECE', 'هندسة الإلكترونيات والاتصالات'), ('EPM', 'هندسة القوى والآلات الكهربية')],
+}
+DEPARTMENT_LEVELS = [Level.LevelName.FIRST, Level.LevelName.SECOND, Level.LevelName.THIRD, Level.LevelName.FOURTH]
+# Specializations start from the second year
+SPECIALIZED_LEVELS = {Level.LevelName.SECOND, Level.LevelName.THIRD, Level.LevelName.FOURTH}
+
+# Volumes at scale 1.0 (about 19,000 students)
+STUDENTS_PER_LEVEL = 1000
+PREPARATORY_STUDENTS = 3000
+DOCTORS = 120
+# One account each, so every office's endpoints have a user to run as
+STAFF_ROLES = ['STUDENT_AFFAIRS', 'STAFF_AFFAIRS', 'GRADUATE_AFFAIRS', 'DEAN', 'HOD']
+SUBJECTS_PER_TERM = 6  # Generated only where the curriculum has none
+QUIZZES_PER_OFFERING = 2
+QUESTIONS_PER_QUIZ = 5
+CHOICES_PER_QUESTION = 4
+QUIZ_ATTEMPT_RATE = 0.85
+MISSING_FINAL_RATE = 0.03
+CERTIFICATE_RATE = 0.25
+GRADUATE_REQUEST_RATE = 0.2
+
+TEMPLATE_NAME = 'Synthetic dataset'
+
+DAYS = [d for d, _ in LectureSchedule.DayOfWeek.choices if d != LectureSchedule.DayOfWeek.FRIDAY]
+SLOTS = [datetime.time(9), datetime.time(11), datetime.time(13), datetime.time(15)]
+
+
+def national_id_prefix(seed):
+    return f'9{seed % 100:02d}'
+
+
+def staff_username_prefix(seed):
+    return f'syn{seed}-'
+
+
+def delete_dataset(year_name, seed):
+    """Delete a generated year (cascading to its rows) and the synthetic accounts of a seed"""
+    with transaction.atomic():
+        AcademicYear.objects.filter(name=year_name).delete()
+        User.objects.filter(national_id__startswith=national_id_prefix(seed), role='STUDENT').delete()
+        User.objects.filter(username__startswith=staff_username_prefix(seed)).delete()
+    invalidate_academic_structure()
+
+
+def _bulk(model, objs):
+    model.objects.bulk_create(objs, batch_size=BATCH_SIZE)
+
+
+class DatasetGenerator:
+    """Build one synthetic academic year; see the module docstring"""
+
+    def __init__(self, year_name, scale=1.0, seed=42, weeks=14, log=print):
+        self.year_name = year_name
+        self.scale = scale
+        self.seed = seed
+        self.weeks = weeks
+        self.log = log
+        self.rng = random.Random(seed)
+        self.password = make_initial_password(f'syn{seed}')
+        self.counts = defaultdict(int)
+
+    def scaled(self, value, minimum=1):
+        return max(minimum, round(value * self.scale))
+
+    def run(self):
+        steps = [
+            ('structure', self.create_structure),
+            ('academic year', self.create_year),
+            ('subjects', self.create_subjects),
+            ('doctors', self.create_doctors),
+            ('staff', self.create_staff),
+            ('students', self.create_students),
+            ('course offerings', self.create_offerings),
+            ('attendance', self.create_attendance),
+            ('quizzes', self.create_quizzes),
+            ('grades', self.create_grades),
+            ('graduates', self.create_graduates),
+        ]
+        for name, step in steps:
+            started = timezone.now()
+            step()
+            self.log(f'{name}: {(timezone.now() - started).total_seconds():.1f}s')
+        invalidate_academic_structure()
+        return dict(self.counts)
+
+    # Structure ---------------------------------------------------------
+
+    def create_structure(self):
+        self.departments = []
+        for code, name, is_preparatory, has_specializations in DEPARTMENTS:
+            dept, _ = Department.objects.get_or_create(code=code, defaults={
+                'name': name, 'is_preparatory': is_preparatory, 'has_specializations': has_specializations,
+            })
+            self.departments.append(dept)
+            for spec_code, spec_name in SPECIALIZATIONS.get(code, []):
+                Specialization.objects.get_or_create(department=dept, code=spec_code, defaults={'name': spec_name})
+        self.specializations = defaultdict(list)
+        for spec in Specialization.objects.filter(department__in=self.departments).order_by('id'):
+            self.specializations[spec.department_id].append(spec)
+
+        self.template, _ = GradingTemplate.objects.get_or_create(
+            name=f'{TEMPLATE_NAME} ({self.weeks} weeks)',
+            defaults={
+                'attendance_weight': 10, 'attendance_slots': self.weeks,
+                'quizzes_weight': 10, 'quiz_count': QUIZZES_PER_OFFERING,
+                'midterm_weight': 20, 'practical_weight': 10, 'final_weight': 50,
+                'coursework_weight': 40, 'written_weight': 50,
+            },
+        )
+
+    def create_year(self):
+        self.year = AcademicYear.objects.create(name=self.year_name, status=AcademicYear.Status.OPEN)
+        self.terms = {
+            name: Term.objects.create(name=name, academic_year=self.year)
+            for name in (Term.TermName.FIRST, Term.TermName.SECOND)
+        }
+        self.levels = []
+        for dept in self.departments:
+            names = [Level.LevelName.PREPARATORY] if dept.is_preparatory else DEPARTMENT_LEVELS
+            for name in names:
+                self.levels.append(Level.objects.create(name=name, department=dept, academic_year=self.year))
+
+        start_year = int(self.year_name[:4]) if self.year_name[:4].isdigit() else timezone.now().year
+        # Teaching starts on the last Saturday of September
+        start = datetime.date(start_year, 9, 30)
+        self.term_start = start - datetime.timedelta(days=(start.weekday() - 5) % 7)
+
+    def create_subjects(self):
+        """{(department_id, level name, semester): [Subject]}, filling curriculum gaps with generated subjects"""
+        self.subjects = defaultdict(list)
+        for subject in Subject.objects.filter(department__in=self.departments).order_by('id'):
+            self.subjects[(subject.department_id, subject.level, subject.semester)].append(subject)
+
+        missing = []
+        for level in self.levels:
+            for semester in (1, 2):
+                key = (level.department_id, level.name, semester)
+                if self.subjects[key]:
+                    continue
+                specs = self.specializations[level.department_id] if level.name in SPECIALIZED_LEVELS else []
+                for n in range(SUBJECTS_PER_TERM):
+                    # Half of the subjects of specialized levels belong to one specialization
+                    spec = specs[n % len(specs)] if specs and n % 2 else None
+                    missing.append(Subject(
+                        code=f'SYN-{level.department.code}-{level.name[:2]}{semester}{n}',
+                        name=f'{level.department.code} {level.get_name_display()} - مقرر {semester}.{n + 1}',
+                        department_id=level.department_id,
+                        specialization=spec,
+                        level=level.name,
+                        semester=semester,
+                        max_grade=150 if level.name == Level.LevelName.PREPARATORY else 100,
+                    ))
+        if missing:
+            Subject.objects.bulk_create(missing, ignore_conflicts=True)
+            for subject in Subject.objects.filter(code__in=[s.code for s in missing]):
+                self.subjects[(subject.department_id, subject.level, subject.semester)].append(subject)
+        self.counts['subjects'] = len(missing)
+
+    # People ------------------------------------------------------------
+
+    def create_doctors(self):
+        prefix = staff_username_prefix(self.seed)
+        doctors = [
+            User(
+                username=f'{prefix}dr{n}', password=self.password, role='DOCTOR',
+                first_name='د.', last_name=f'عضو هيئة تدريس {n}',
+                department=self.departments[n % len(self.departments)],
+            )
+            for n in range(self.scaled(DOCTORS, minimum=5))
+        ]
+        _bulk(User, doctors)
+        self.doctors = list(User.objects.filter(username__startswith=f'{prefix}dr').order_by('id'))
+        self.counts['doctors'] = len(self.doctors)
+
+    def create_staff(self):
+        prefix = staff_username_prefix(self.seed)
+        _bulk(User, [
+            User(
+                username=f'{prefix}{role.lower()}', password=self.password, role=role,
+                first_name='موظف', last_name=User.Role(role).label, department=self.departments[0],
+            )
+            for role in STAFF_ROLES
+        ])
+        self.counts['staff'] = len(STAFF_ROLES)
+
+    def create_students(self):
+        """Students of every level with their accounts; ability drives attendance and grades"""
+        prefix = national_id_prefix(self.seed)
+        serial = 0
+        users = []
+        students = []
+        for level in self.levels:
+            count = self.scaled(PREPARATORY_STUDENTS if level.name == Level.LevelName.PREPARATORY else STUDENTS_PER_LEVEL)
+            specs = self.specializations[level.department_id] if level.name in SPECIALIZED_LEVELS else []
+            for _ in range(count):
+                serial += 1
+                national_id = f'{prefix}{serial:011d}'
+                first_name = f'طالب{serial}'
+                last_name = f'{level.department.code} {level.name}'
+                users.append(User(
+                    username=national_id, password=self.password, role='STUDENT', national_id=national_id,
+                    first_name=first_name, last_name=last_name, first_login_required=True,
+                ))
+                students.append(Student(
+                    national_id=national_id, full_name=f'{first_name} {last_name}', level=level,
+                    academic_year=self.year, department_id=level.department_id,
+                    specialization=self.rng.choice(specs) if specs else None,
+                    has_paid_tuition=self.rng.random() < 0.9,
+                ))
+        _bulk(User, users)
+        user_ids = dict(User.objects.filter(national_id__startswith=prefix).values_list('national_id', 'id'))
+        for student in students:
+            student.user_id = user_ids[student.national_id]
+        _bulk(Student, students)
+
+        self.students = defaultdict(list)  # level_id -> [Student]
+        self.ability = {}
+        for student in Student.objects.filter(academic_year=self.year).order_by('id'):
+            self.students[student.level_id].append(student)
+            self.ability[student.id] = min(0.98, max(0.2, self.rng.gauss(0.7, 0.15)))
+        self.counts['students'] = len(self.ability)
+
+    # Teaching ----------------------------------------------------------
+
+    def create_offerings(self):
+        offerings = []
+        for level in self.levels:
+            specs = self.specializations[level.department_id] if level.name in SPECIALIZED_LEVELS else []
+            for semester, term_name in ((1, Term.TermName.FIRST), (2, Term.TermName.SECOND)):
+                for subject in self.subjects[(level.department_id, level.name, semester)]:
+                    # Common subjects of specialized levels are offered once per specialization
+                    targets = [subject.specialization] if subject.specialization_id or not specs else specs
+                    for spec in targets:
+                        offerings.append(CourseOffering(
+                            subject=subject, academic_year=self.year, term=self.terms[term_name], level=level,
+                            specialization=spec, doctor=self.rng.choice(self.doctors), grading_template=self.template,
+                        ))
+        _bulk(CourseOffering, offerings)
+        self.offerings = list(
+            CourseOffering.objects.filter(academic_year=self.year).select_related('subject', 'term').order_by('id')
+        )
+
+        levels = {level.id: level for level in self.levels}
+        schedules = []
+        self.enrolment = {}  # offering_id -> [Student]
+        for offering in self.offerings:
+            offering.level = levels[offering.level_id]
+            self.enrolment[offering.id] = [
+                s for s in self.students[offering.level_id] if student_offerings([offering], s, offering.level)
+            ]
+            slot = self.rng.choice(SLOTS)
+            schedules.append(LectureSchedule(
+                course_offering=offering, day=self.rng.choice(DAYS), start_time=slot,
+                end_time=datetime.time(slot.hour + 2), location=f'مدرج {self.rng.randint(1, 12)}',
+            ))
+        _bulk(LectureSchedule, schedules)
+        self.schedules = {s.course_offering_id: s for s in LectureSchedule.objects.filter(course_offering__in=self.offerings)}
+        self.first_term = [o for o in self.offerings if o.term.name == Term.TermName.FIRST]
+        self.counts['course_offerings'] = len(self.offerings)
+
+    def create_attendance(self):
+        """One record per student and weekly session of every first-term offering"""
+        day_offsets = {day: n for n, (day, _) in enumerate(LectureSchedule.DayOfWeek.choices)}  # Week starts Saturday
+        total = 0
+        for offering in self.first_term:
+            schedule = self.schedules[offering.id]
+            first_day = self.term_start + datetime.timedelta(days=day_offsets[schedule.day])
+            rows = []
+            for week in range(self.weeks):
+                date = first_day + datetime.timedelta(weeks=week)
+                for student in self.enrolment[offering.id]:
+                    if self.rng.random() < self.ability[student.id] + 0.15:
+                        state = Attendance.AttendanceStatus.PRESENT
+                    elif self.rng.random() < 0.2:
+                        state = Attendance.AttendanceStatus.EXCUSED
+                    else:
+                        state = Attendance.AttendanceStatus.ABSENT
+                    rows.append(Attendance(
+                        student=student, course_offering=offering, lecture_schedule=schedule, date=date, status=state,
+                    ))
+            _bulk(Attendance, rows)
+            total += len(rows)
+        self.counts['attendance'] = total
+
+    def create_quizzes(self):
+        """MCQ quizzes on first-term offerings with graded attempts and their answers"""
+        quizzes = [
+            Quiz(course_offering=offering, title=f'Quiz {n + 1}', total_points=Decimal(QUESTIONS_PER_QUIZ * 2))
+            for offering in self.first_term
+            for n in range(QUIZZES_PER_OFFERING)
+        ]
+        _bulk(Quiz, quizzes)
+        quizzes = list(Quiz.objects.filter(course_offering__in=self.first_term).order_by('id'))
+
+        _bulk(QuizQuestion, [
+            QuizQuestion(quiz=quiz, question_text=f'سؤال {n + 1}', points=Decimal(2), order=n)
+            for quiz in quizzes
+            for n in range(QUESTIONS_PER_QUIZ)
+        ])
+        questions = defaultdict(list)
+        for question in QuizQuestion.objects.filter(quiz__in=quizzes).order_by('quiz_id', 'order'):
+            questions[question.quiz_id].append(question)
+
+        _bulk(QuizChoice, [
+            QuizChoice(question=question, choice_text=f'اختيار {n + 1}', is_correct=n == 0, order=n)
+            for quiz_questions in questions.values()
+            for question in quiz_questions
+            for n in range(CHOICES_PER_QUESTION)
+        ])
+        choices = defaultdict(list)  # question_id -> [correct, wrong...]
+        for choice in QuizChoice.objects.filter(question__quiz__in=quizzes).order_by('question_id', 'order'):
+            choices[choice.question_id].append(choice)
+
+        self.quiz_scores = defaultdict(dict)  # (student_id, offering_id) -> {quiz number: score}
+        submitted_at = timezone.now()
+        quiz_numbers = defaultdict(int)
+        attempts = answers = 0
+        for quiz in quizzes:
+            quiz_numbers[quiz.course_offering_id] += 1
+            number = str(quiz_numbers[quiz.course_offering_id])
+            attempt_rows = []
+            planned = {}  # student_id -> [(question, choice, points)]
+            for student in self.enrolment[quiz.course_offering_id]:
+                if self.rng.random() >= QUIZ_ATTEMPT_RATE:
+                    continue
+                picks = []
+                for question in questions[quiz.id]:
+                    correct = self.rng.random() < self.ability[student.id]
+                    choice = choices[question.id][0] if correct else self.rng.choice(choices[question.id][1:])
+                    picks.append((question, choice, question.points if correct else Decimal(0)))
+                score = sum(points for _, _, points in picks)
+                planned[student.id] = picks
+                attempt_rows.append(StudentQuizAttempt(
+                    student=student, quiz=quiz, score=score, status=StudentQuizAttempt.AttemptStatus.GRADED,
+                    submitted_at=submitted_at, is_graded=True,
+                ))
+                self.quiz_scores[(student.id, quiz.course_offering_id)][number] = score
+            _bulk(StudentQuizAttempt, attempt_rows)
+
+            attempt_ids = dict(StudentQuizAttempt.objects.filter(quiz=quiz).values_list('student_id', 'id'))
+            answer_rows = [
+                StudentQuizAnswer(attempt_id=attempt_ids[student_id], question=question, selected_choice=choice, points_earned=points)
+                for student_id, picks in planned.items()
+                for question, choice, points in picks
+            ]
+            _bulk(StudentQuizAnswer, answer_rows)
+            attempts += len(attempt_rows)
+            answers += len(answer_rows)
+        self.counts['quizzes'] = len(quizzes)
+        self.counts['quiz_attempts'] = attempts
+        self.counts['quiz_answers'] = answers
+
+    def _mark(self, student_id, weight):
+        """A grade out of weight around the student's ability"""
+        value = min(1.0, max(0.0, self.rng.gauss(self.ability[student_id], 0.1)))
+        return Decimal(str(round(value * weight * 2) / 2))
+
+    def create_grades(self):
+        """First-term grades, then summaries and standings through grade_engine"""
+        template = self.template
+        quiz_weight = Decimal(template.quizzes_weight) / QUIZZES_PER_OFFERING
+        max_quiz_points = Decimal(QUESTIONS_PER_QUIZ * 2)
+        rows = []
+        for offering in self.first_term:
+            for student in self.enrolment[offering.id]:
+                scores = self.quiz_scores.get((student.id, offering.id), {})
+                rows.append(StudentGrade(
+                    student=student, course_offering=offering,
+                    quiz_grades={n: float(score * quiz_weight / max_quiz_points) for n, score in scores.items()},
+                    midterm=self._mark(student.id, template.midterm_weight),
+                    practical=self._mark(student.id, template.practical_weight),
+                    final=None if self.rng.random() < MISSING_FINAL_RATE else self._mark(student.id, template.final_weight),
+                ))
+        _bulk(StudentGrade, rows)
+        self.counts['grades'] = len(rows)
+
+        by_level = defaultdict(list)
+        for offering in self.first_term:
+            by_level[offering.level_id].append(offering.id)
+        for offering_ids in by_level.values():
+            refresh_summaries_for(offering_ids)
+
+    def create_graduates(self):
+        """Certificates and graduate service requests of fourth-year students"""
+        fourth = [
+            student
+            for level in self.levels if level.name == Level.LevelName.FOURTH
+            for student in self.students[level.id]
+        ]
+        certificates = [
+            Certificate(student_id=s.user_id, file='certificates/synthetic.pdf', description='شهادة تخرج')
+            for s in fourth if self.rng.random() < CERTIFICATE_RATE
+        ]
+        _bulk(Certificate, certificates)
+
+        request_types = [value for value, _ in GraduateRequest.RequestType.choices]
+        statuses = [value for value, _ in GraduateRequest.Status.choices if value != GraduateRequest.Status.DRAFT]
+        requests = [
+            GraduateRequest(
+                graduate_id=s.user_id, request_type=self.rng.choice(request_types), status=self.rng.choice(statuses),
+            )
+            for s in fourth if self.rng.random() < GRADUATE_REQUEST_RATE
+        ]
+        _bulk(GraduateRequest, requests)
+        self.counts['certificates'] = len(certificates)
+        self.counts['graduate_requests'] = len(requests)
+
+
+def generate_dataset(year_name, scale=1.0, seed=42, weeks=14, log=print):
+    """Generate a synthetic academic year; returns the number of rows written per kind"""
+    return DatasetGenerator(year_name, scale=scale, seed=seed, weeks=weeks, log=log).run()
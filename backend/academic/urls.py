@@ -27,11 +27,13 @@ from .exam_grades_views import (
     PendingExamGradesCountView, StudentExamGradesView
 )
 from .quiz_views import (
-    QuizViewSet, StudentQuizListView, StudentQuizAttemptView, QuizResultsView,
+    QuizViewSet, StudentQuizListView, StudentQuizAttemptView, QuizAutosaveView, QuizResultsView,
     BulkQuizImportView, QuizAttemptDetailView, GradeQuizAttemptView
 )
-from .student_results_views import PublishingStatusView, StudentResultsQueryView
+from .student_results_views import PublishingStatusView, PublishingBulkView, StudentResultsQueryView
 from .export_views import ExportAcademicDataView
+from .job_views import JobListView, JobStatusView, JobDownloadView
+from .standing_views import ClassRankingView, StudentStandingView
 
 router = DefaultRouter()
 router.register(r'departments', DepartmentViewSet)
@@ -57,13 +59,21 @@ urlpatterns = [
     
     # Results Publishing and Querying
     path('results/publish-status/', PublishingStatusView.as_view(), name='publish-status'),
+    path('results/publish-status/bulk/', PublishingBulkView.as_view(), name='publish-status-bulk'),
     path('results/query/', StudentResultsQueryView.as_view(), name='results-query'),
+    path('standings/ranking/', ClassRankingView.as_view(), name='class-ranking'),
+    path('standings/students/<int:student_id>/', StudentStandingView.as_view(), name='student-standing'),
     
     path('', include(router.urls)),
     
     # Export endpoints
     path('export/', ExportAcademicDataView.as_view(), name='export-academic-data'),
 
+    # Background jobs
+    path('jobs/', JobListView.as_view(), name='job-list'),
+    path('jobs/<int:pk>/', JobStatusView.as_view(), name='job-status'),
+    path('jobs/<int:pk>/download/', JobDownloadView.as_view(), name='job-download'),
+
     # Student Affairs endpoints
     path('student-affairs/upload/', UploadStudentsView.as_view(), name='student-affairs-upload'),
     path('student-affairs/upload-preview/', PreviewStudentsUploadView.as_view(), name='student-affairs-upload-preview'),
@@ -102,6 +112,7 @@ urlpatterns = [
     # Quiz endpoints
     path('student/quizzes/', StudentQuizListView.as_view(), name='student-quizzes'),
     path('student/quizzes/<int:quiz_id>/attempt/', StudentQuizAttemptView.as_view(), name='quiz-attempt'),
+    path('student/quizzes/<int:quiz_id>/autosave/', QuizAutosaveView.as_view(), name='quiz-autosave'),
     path('student/quizzes/<int:quiz_id>/results/', QuizResultsView.as_view(), name='student-quiz-results'),
     path('quizzes/<int:quiz_id>/results/', QuizResultsView.as_view(), name='quiz-results'),
     path('quizzes/<int:quiz_id>/attempts/<int:attempt_id>/', QuizAttemptDetailView.as_view(), name='quiz-attempt-detail'),
@@ -7,13 +7,14 @@ from django.views.decorators.cache import cache_page
 from django.utils.decorators import method_decorator
 from django.conf import settings
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 from .models import (
     Department, Specialization, AcademicYear, Level, Subject,
     Student, TeachingAssignment, ExamGrade, Certificate,
     Term, GradingTemplate, CourseOffering, Lecture, Attendance, StudentGrade,
-    AuditLog, ContactMessage, Announcement, UploadHistory
+    AuditLog, ContactMessage, Announcement, UploadHistory, BackgroundJob
 )
 from .serializers import (
     DepartmentSerializer, SpecializationSerializer, AcademicYearSerializer,
@@ -24,13 +25,15 @@ from .serializers import (
     AuditLogSerializer, ContactMessageSerializer, AnnouncementSerializer,
     UploadHistorySerializer
 )
+from .grade_engine import prime_grades, grade_breakdown, refresh_summaries_for, refresh_offerings_on_commit
+from .structure_cache import InvalidatesAcademicStructure, invalidate_academic_structure
 from users.permissions import (
     IsAdminRole, IsDoctorRole, IsStudentRole, HasPaidTuition,
     IsStudentAffairsRole, IsStaffAffairsRole, IsHODRole
 )
 
 
-class DepartmentViewSet(viewsets.ModelViewSet):
+class DepartmentViewSet(InvalidatesAcademicStructure, viewsets.ModelViewSet):
     """Departments - Read-only for most users, Admin can edit"""
     queryset = Department.objects.all()
     serializer_class = DepartmentSerializer
@@ -42,7 +45,7 @@ class DepartmentViewSet(viewsets.ModelViewSet):
         return [permissions.IsAuthenticatedOrReadOnly()]
 
 
-class SpecializationViewSet(viewsets.ModelViewSet):
+class SpecializationViewSet(InvalidatesAcademicStructure, viewsets.ModelViewSet):
     """Specializations within departments - Admin only for modification"""
     queryset = Specialization.objects.all()
     serializer_class = SpecializationSerializer
@@ -61,7 +64,7 @@ class SpecializationViewSet(viewsets.ModelViewSet):
         return [permissions.IsAuthenticatedOrReadOnly()]
 
 
-class AcademicYearViewSet(viewsets.ModelViewSet):
+class AcademicYearViewSet(InvalidatesAcademicStructure, viewsets.ModelViewSet):
     """Academic Years - Admin can create/manage, others can read"""
     queryset = AcademicYear.objects.all().order_by('-name')
     serializer_class = AcademicYearSerializer
@@ -104,6 +107,7 @@ class AcademicYearViewSet(viewsets.ModelViewSet):
                         academic_year=academic_year
                     )
 
+        invalidate_academic_structure()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['post'])
@@ -115,6 +119,7 @@ class AcademicYearViewSet(viewsets.ModelViewSet):
         else:
             year.status = AcademicYear.Status.OPEN
         year.save()
+        invalidate_academic_structure()
         return Response(AcademicYearSerializer(year).data)
 
     @action(detail=True, methods=['post'])
@@ -123,10 +128,11 @@ class AcademicYearViewSet(viewsets.ModelViewSet):
         year = self.get_object()
         year.is_current = True
         year.save()  # save() method handles unsetting other years
+        invalidate_academic_structure()
         return Response(AcademicYearSerializer(year).data)
 
 
-class TermViewSet(viewsets.ModelViewSet):
+class TermViewSet(InvalidatesAcademicStructure, viewsets.ModelViewSet):
     """Terms - Auto-created with Academic Year, Admin can toggle status"""
     queryset = Term.objects.all()
     serializer_class = TermSerializer
@@ -153,6 +159,7 @@ class TermViewSet(viewsets.ModelViewSet):
         else:
             term.status = Term.Status.OPEN
         term.save()
+        invalidate_academic_structure()
         return Response(TermSerializer(term).data)
 
 
@@ -167,8 +174,21 @@ class GradingTemplateViewSet(viewsets.ModelViewSet):
             return [IsHODRole()]
         return [permissions.IsAuthenticated()]
 
+    def _offering_ids(self, template):
+        return CourseOffering.objects.filter(grading_template=template).values_list('id', flat=True)
 
-class LevelViewSet(viewsets.ModelViewSet):
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        # New weights change the stored totals of every offering using the template
+        refresh_offerings_on_commit(self._offering_ids(serializer.instance))
+
+    def perform_destroy(self, instance):
+        offering_ids = list(self._offering_ids(instance))
+        super().perform_destroy(instance)
+        refresh_offerings_on_commit(offering_ids)
+
+
+class LevelViewSet(InvalidatesAcademicStructure, viewsets.ModelViewSet):
     queryset = Level.objects.all()
     serializer_class = LevelSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -219,6 +239,7 @@ class LevelViewSet(viewsets.ModelViewSet):
                         academic_year_id=academic_year
                     )
                     created.append(obj)
+            invalidate_academic_structure()
             return Response(LevelSerializer(created, many=True).data, status=201)
         except Department.DoesNotExist:
             return Response({'error': 'Department not found'}, status=404)
@@ -348,6 +369,15 @@ class CourseOfferingViewSet(viewsets.ModelViewSet):
                 pass
         return super().create(request, *args, **kwargs)
 
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        refresh_offerings_on_commit([serializer.instance.id])
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        # The grading template may have changed
+        refresh_offerings_on_commit([serializer.instance.id])
+
     @action(detail=False, methods=['get'], permission_classes=[IsDoctorRole])
     def my_courses(self, request):
         """Get all courses assigned to the logged-in doctor"""
@@ -616,10 +646,11 @@ class BulkAttendanceView(APIView):
     permission_classes = [IsDoctorRole]
 
     def post(self, request):
-        from .attendance_export import export_attendance_to_excel
-        from django.conf import settings
-        import os
-        
+        from datetime import datetime
+        from django.db import transaction
+        from django.urls import reverse
+        from .db_utils import bulk_upsert
+
         attendance_list = request.data
         if not isinstance(attendance_list, list):
             return Response({'error': 'Expected list of attendance records'}, status=status.HTTP_400_BAD_REQUEST)
@@ -627,81 +658,90 @@ class BulkAttendanceView(APIView):
         if not attendance_list:
             return Response({'error': 'No attendance records provided'}, status=status.HTTP_400_BAD_REQUEST)
 
+        def parse_id(val):
+            try:
+                return int(val)
+            except (TypeError, ValueError):
+                return None
+
+        rows = [
+            (idx, parse_id(item.get('student_id')), parse_id(item.get('course_offering_id')), item)
+            for idx, item in enumerate(attendance_list) if isinstance(item, dict)
+        ]
+
+        # Validate each referenced offering and student once
+        offerings = {
+            o.id: o for o in CourseOffering.objects.filter(
+                id__in={offering_id for _, _, offering_id, _ in rows if offering_id}
+            ).select_related('academic_year')
+        }
+        known_students = set(Student.objects.filter(
+            id__in={student_id for _, student_id, _, _ in rows if student_id}
+        ).values_list('id', flat=True))
+        valid_statuses = set(Attendance.AttendanceStatus.values)
+
         created = 0
         updated = 0
         errors = []
-        course_offering = None
-        attendance_date = None
-        saved_attendance_records = []
-        
-        for idx, item in enumerate(attendance_list):
-            try:
-                student_id = item.get('student_id')
-                course_offering_id = item.get('course_offering_id')
-                date = item.get('date')
-                attendance_status = item.get('status', 'PRESENT')
-
-                student = Student.objects.get(id=student_id)
-                course_offering = CourseOffering.objects.get(id=course_offering_id)
-                attendance_date = date
-
-                # Verify doctor owns this course (skip check for admin)
-                if request.user.role != 'ADMIN' and course_offering.doctor != request.user:
-                    errors.append(f"Row {idx+1}: Permission denied for this course")
-                    continue
-
-                # Check if academic year is open
-                if course_offering.academic_year.status == 'CLOSED':
-                    errors.append(f"Row {idx+1}: Academic year is closed")
-                    continue
-
-                obj, is_created = Attendance.objects.update_or_create(
-                    student=student,
-                    course_offering=course_offering,
-                    date=date,
-                    defaults={'status': attendance_status}
-                )
-                
-                saved_attendance_records.append(obj)
-                
-                if is_created:
-                    created += 1
-                else:
-                    updated += 1
-
-            except Student.DoesNotExist:
+        pending = {}  # (student_id, course_offering_id, date) -> status
+        for idx, student_id, course_offering_id, item in rows:
+            if student_id not in known_students:
                 errors.append(f"Row {idx+1}: Student not found")
                 continue
-            except CourseOffering.DoesNotExist:
+            course_offering = offerings.get(course_offering_id)
+            if course_offering is None:
                 errors.append(f"Row {idx+1}: Course offering not found")
                 continue
-            except Exception as e:
-                errors.append(f"Row {idx+1}: {str(e)}")
+
+            # Verify doctor owns this course (skip check for admin)
+            if request.user.role != 'ADMIN' and course_offering.doctor_id != request.user.id:
+                errors.append(f"Row {idx+1}: Permission denied for this course")
+                continue
+
+            # Check if academic year is open
+            if course_offering.academic_year.status == 'CLOSED':
+                errors.append(f"Row {idx+1}: Academic year is closed")
                 continue
 
-        # Generate Excel file if any attendance was saved
-        excel_file_path = None
-        excel_url = None
-        
-        if saved_attendance_records and course_offering and attendance_date:
             try:
-                # Parse date string to date object for Excel export
-                from datetime import datetime
-                if isinstance(attendance_date, str):
-                    date_obj = datetime.strptime(attendance_date, '%Y-%m-%d').date()
-                else:
-                    date_obj = attendance_date
-                
-                # Export to Excel
-                excel_file_path = export_attendance_to_excel(
-                    course_offering, 
-                    date_obj,  # Use date object, not string
-                    saved_attendance_records
+                date = datetime.strptime(str(item.get('date')), '%Y-%m-%d').date()
+            except ValueError:
+                errors.append(f"Row {idx+1}: Invalid date")
+                continue
+
+            attendance_status = item.get('status', 'PRESENT')
+            if attendance_status not in valid_statuses:
+                errors.append(f"Row {idx+1}: Invalid status")
+                continue
+
+            pending[(student_id, course_offering_id, date)] = attendance_status
+
+        if pending:
+            existing = set(Attendance.objects.filter(
+                student_id__in={key[0] for key in pending},
+                course_offering_id__in={key[1] for key in pending},
+                date__in={key[2] for key in pending},
+            ).values_list('student_id', 'course_offering_id', 'date'))
+            updated = len(existing & pending.keys())
+            created = len(pending) - updated
+
+            # One upsert keyed on the (student, course_offering, date) unique constraint
+            with transaction.atomic():
+                bulk_upsert(
+                    Attendance,
+                    [
+                        Attendance(student_id=student_id, course_offering_id=offering_id, date=date, status=attendance_status)
+                        for (student_id, offering_id, date), attendance_status in pending.items()
+                    ],
+                    unique_fields=['student', 'course_offering', 'date'],
+                    update_fields=['status', 'recorded_at'],
                 )
-                # Generate URL for download
-                excel_url = f"{settings.MEDIA_URL}{excel_file_path}"
-            except Exception as e:
-                errors.append(f"Excel export failed: {str(e)}")
+
+            touched = {}  # course_offering_id -> {student_id}
+            for student_id, offering_id, _ in pending:
+                touched.setdefault(offering_id, set()).add(student_id)
+            for offering_id, student_ids in touched.items():
+                refresh_summaries_for([offering_id], student_ids)
 
         response_data = {
             'created': created,
@@ -709,17 +749,25 @@ class BulkAttendanceView(APIView):
             'total_saved': created + updated,
             'message': f'تم حفظ {created + updated} سجل حضور بنجاح'
         }
-        
-        if excel_url:
-            response_data['excel_file'] = excel_url
-            response_data['message'] += f' | تم إنشاء ملف Excel'
-        
+
+        # The Excel sheet of the saved lecture is built by a background job
+        if pending:
+            _, offering_id, date = next(reversed(pending.keys()))
+
+            from .jobs import enqueue
+            excel_job = enqueue(BackgroundJob.JobType.ATTENDANCE_EXCEL, request.user, params={
+                'course_offering_id': offering_id,
+                'date': date.isoformat(),
+            })
+            response_data['excel_job_id'] = excel_job.id
+            response_data['excel_job_status_url'] = reverse('job-status', args=[excel_job.id])
+            response_data['message'] += ' | ملف Excel متاح للتحميل'
+
         if errors:
             response_data['errors'] = errors
             response_data['error_count'] = len(errors)
-        
-        return Response(response_data)
 
+        return Response(response_data)
 
 
 # ========== Bulk Student Grades API ==========
@@ -740,79 +788,162 @@ class BulkStudentGradeView(APIView):
         except CourseOffering.DoesNotExist:
             return Response({'error': 'Course offering not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        grades = StudentGrade.objects.filter(course_offering=course_offering).select_related('student')
+        grades = prime_grades(StudentGrade.objects.filter(course_offering=course_offering))
         data = {}
         for g in grades:
-            data[g.student.id] = {
+            data[g.student_id] = {
                 'attendance': float(g.attendance) if g.attendance is not None else '',
                 'quizzes': float(g.quizzes) if g.quizzes is not None else '',
-                'coursework': float(g.coursework) if g.coursework is not None else '',
+                'coursework': grade_breakdown(g)['coursework'],
                 'practical': float(g.practical) if g.practical is not None else '',
                 'midterm': float(g.midterm) if g.midterm is not None else '',
                 'final': float(g.final) if g.final is not None else '',
             }
         return Response(data)
 
+    # Request keys -> StudentGrade fields. coursework is computed on the model and never written.
+    GRADE_FIELDS = {
+        'practical_grade': 'practical',
+        'midterm_grade': 'midterm',
+        'final_grade': 'final',
+        'attendance_grade': 'attendance',
+        'quizzes_grade': 'quizzes',
+    }
+
     def post(self, request):
+        from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+        from django.core.exceptions import ValidationError
+        from django.core.validators import DecimalValidator
+        from django.db import DatabaseError, transaction
+        from django.utils import timezone
+
         grades_list = request.data
         if not isinstance(grades_list, list):
             return Response({'error': 'Expected list of grade records'}, status=status.HTTP_400_BAD_REQUEST)
 
+        def parse_grade(field, val):
+            """Value for a StudentGrade decimal field (None clears it); raises ValueError"""
+            if val == "" or val is None:
+                return None
+            model_field = StudentGrade._meta.get_field(field)
+            try:
+                value = Decimal(str(val)).quantize(
+                    Decimal(1).scaleb(-model_field.decimal_places), rounding=ROUND_HALF_UP
+                )
+                DecimalValidator(model_field.max_digits, model_field.decimal_places)(value)
+            except (InvalidOperation, ValidationError):
+                raise ValueError(field)
+            if value < 0:
+                raise ValueError(field)
+            return value
+
+        def parse_id(val):
+            try:
+                return int(val)
+            except (TypeError, ValueError):
+                return None
+
+        rows = [
+            (parse_id(item.get('student_id')), parse_id(item.get('course_offering_id')), item)
+            if isinstance(item, dict) else (None, None, item)
+            for item in grades_list
+        ]
+
         created = 0
         updated = 0
         errors = []
-        for item in grades_list:
-            student_id = item.get('student_id')
-            course_offering_id = item.get('course_offering_id')
 
-            try:
-                student = Student.objects.get(id=student_id)
-                course_offering = CourseOffering.objects.get(id=course_offering_id)
+        # Validate every referenced offering once instead of once per row
+        offering_ids = {course_offering_id for _, course_offering_id, _ in rows if course_offering_id}
+        student_ids = {student_id for student_id, _, _ in rows if student_id}
+        offerings = CourseOffering.objects.filter(id__in=offering_ids).select_related('academic_year', 'term')
+        offering_errors = {
+            # Missing and foreign offerings answer alike, so ids of other doctors' courses don't leak
+            offering_id: f'المقرر {offering_id} غير موجود أو غير مسند إليك' for offering_id in offering_ids
+        }
+        writable_offerings = set()
+        for course_offering in offerings:
+            # Verify doctor owns this course OR user is Admin
+            if not request.user.is_superuser and course_offering.doctor_id != request.user.id:
+                continue
+            if course_offering.academic_year.status == 'CLOSED':
+                offering_errors[course_offering.id] = 'العام الأكاديمي مغلق - لا يمكن تعديل الدرجات'
+            elif course_offering.term and course_offering.term.status == 'CLOSED':
+                offering_errors[course_offering.id] = 'الترم مغلق - لا يمكن تعديل الدرجات'
+            else:
+                del offering_errors[course_offering.id]
+                writable_offerings.add(course_offering.id)
 
-                # Verify doctor owns this course OR user is Admin
-                if not request.user.is_superuser and course_offering.doctor != request.user:
-                    continue
+        known_students = set(Student.objects.filter(id__in=student_ids).values_list('id', flat=True))
+        existing = {
+            (g.student_id, g.course_offering_id): g
+            for g in StudentGrade.objects.filter(course_offering_id__in=writable_offerings, student_id__in=known_students)
+        }
 
-                # Check if academic year or term is closed
-                if course_offering.academic_year.status == 'CLOSED':
-                    errors.append(f'العام الأكاديمي مغلق - لا يمكن تعديل الدرجات')
-                    continue
-                if hasattr(course_offering, 'term') and course_offering.term and course_offering.term.status == 'CLOSED':
-                    errors.append(f'الترم مغلق - لا يمكن تعديل الدرجات')
+        to_create = {}
+        to_update = {}
+        changed_fields = set()
+        touched = {}  # course_offering_id -> {student_id}
+        for position, (student_id, course_offering_id, item) in enumerate(rows, start=1):
+            if student_id is None or course_offering_id is None:
+                errors.append(f'سجل {position}: student_id و course_offering_id مطلوبان')
+                continue
+            if course_offering_id in offering_errors:
+                errors.append(f'الطالب {student_id}: {offering_errors[course_offering_id]}')
+                continue
+            if student_id not in known_students:
+                errors.append(f'الطالب {student_id} غير موجود')
+                continue
+
+            values = {}
+            invalid = []
+            for key, field in self.GRADE_FIELDS.items():
+                if key not in item:
                     continue
+                try:
+                    values[field] = parse_grade(field, item[key])
+                except ValueError:
+                    invalid.append(key)
+            if invalid:
+                errors.append(f"الطالب {student_id}: قيمة غير صالحة في {', '.join(invalid)}")
+                continue
+            if not values:
+                continue
 
-                defaults = {}
-                
-                def parse_decimal(val):
-                    if val == "" or val is None: return None
-                    try:
-                        return float(val)
-                    except:
-                        return None
-
-                # coursework is a computed property on the model, do not try to set it.
-                if 'practical_grade' in item: defaults['practical'] = parse_decimal(item['practical_grade'])
-                if 'midterm_grade' in item: defaults['midterm'] = parse_decimal(item['midterm_grade'])
-                if 'final_grade' in item: defaults['final'] = parse_decimal(item['final_grade'])
-                if 'attendance_grade' in item: defaults['attendance'] = parse_decimal(item['attendance_grade'])
-                if 'quizzes_grade' in item: defaults['quizzes'] = parse_decimal(item['quizzes_grade'])
-
-                if defaults:
-                    obj, is_created = StudentGrade.objects.update_or_create(
-                        student=student,
-                        course_offering=course_offering,
-                        defaults=defaults
+            key = (student_id, course_offering_id)
+            grade = existing.get(key) or to_create.get(key)
+            if grade is None:
+                to_create[key] = StudentGrade(student_id=student_id, course_offering_id=course_offering_id, **values)
+                created += 1
+            else:
+                for field, val in values.items():
+                    setattr(grade, field, val)
+                if key in existing:
+                    to_update[key] = grade
+                    changed_fields.update(values)
+                updated += 1
+            touched.setdefault(course_offering_id, set()).add(student_id)
+
+        try:
+            with transaction.atomic():
+                StudentGrade.objects.bulk_create(list(to_create.values()), batch_size=500)
+                if to_update:
+                    now = timezone.now()
+                    for grade in to_update.values():
+                        grade.updated_at = now
+                    StudentGrade.objects.bulk_update(
+                        list(to_update.values()), sorted(changed_fields) + ['updated_at'], batch_size=500
                     )
-                    if is_created:
-                        created += 1
-                    else:
-                        updated += 1
+        except DatabaseError as e:
+            # The transaction rolled back: report the failure instead of a 200 with nothing saved
+            logger.error(f"Error saving grades in bulk: {e}", exc_info=True)
+            return Response(
+                {'error': 'تعذر حفظ الدرجات، لم يتم حفظ أي درجة. يرجى المحاولة مرة أخرى', 'errors': errors},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
 
-            except (Student.DoesNotExist, CourseOffering.DoesNotExist):
-                continue
-            except Exception as e:
-                logger.error(f"Error saving grade for student {student_id}: {e}", exc_info=True)
-                errors.append(f"Student {student_id}: {str(e)}")
+        for offering_id, ids in touched.items():
+            refresh_summaries_for([offering_id], ids)
 
         return Response({'created': created, 'updated': updated, 'errors': errors})
 
@@ -1,4 +1,24 @@
+import logging
+
+from django.conf import settings
 from django.utils.cache import patch_vary_headers, patch_cache_control
+from prometheus_client import Counter, Histogram
+
+from .query_counter import QueryCollector, query_budget_of
+
+logger = logging.getLogger(__name__)
+
+REQUEST_QUERIES = Histogram(
+    'django_http_request_queries', 'Database queries per request', ['view'],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+REPEATED_QUERY_REQUESTS = Counter(
+    'django_http_requests_repeated_queries_total', 'Requests that repeated a query shape (N+1 pattern)', ['view'],
+)
+OVER_BUDGET_REQUESTS = Counter(
+    'django_http_requests_over_query_budget_total', "Requests that exceeded their view's query budget", ['view'],
+)
+
 
 class VaryCookieMiddleware:
     """
@@ -16,3 +36,40 @@ class VaryCookieMiddleware:
             patch_cache_control(response, no_store=True, no_cache=True, must_revalidate=True)
             response['Pragma'] = 'no-cache'
         return response
+
+
+class QueryCountMiddleware:
+    """
+    Counts the database queries of each request and flags repeated query
+    shapes (N+1 patterns) and views going over their declared query_budget.
+    Results go to Prometheus and the log; in DEBUG they are also returned as
+    X-Query-Count, X-Query-Budget and X-Query-Repeated headers.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        collector = QueryCollector()
+        with collector.installed():
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else '<unresolved>'
+        budget = query_budget_of(match.func, request.method) if match else None
+        repeated = collector.repeated()
+
+        REQUEST_QUERIES.labels(view).observe(collector.count)
+        if repeated:
+            REPEATED_QUERY_REQUESTS.labels(view).inc()
+            logger.warning('%s repeated a query %d times: %s', view, repeated[0][1], repeated[0][0][:300])
+        if budget is not None and collector.count > budget:
+            OVER_BUDGET_REQUESTS.labels(view).inc()
+            logger.warning('%s ran %d queries (budget %d)', view, collector.count, budget)
+
+        if settings.DEBUG:
+            response['X-Query-Count'] = str(collector.count)
+            if budget is not None:
+                response['X-Query-Budget'] = str(budget)
+            if repeated:
+                response['X-Query-Repeated'] = ', '.join(str(n) for _, n in repeated)
+        return response
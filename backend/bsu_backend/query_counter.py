@@ -0,0 +1,91 @@
+"""
+Per-request query counting and N+1 detection.
+
+QueryCollector is a database execute wrapper: it counts the queries run while
+it is installed and groups them by shape (the parametrized SQL with IN lists
+collapsed), so the same statement issued once per row of a loop shows up as
+one shape repeated many times.
+
+Views declare the number of queries a request may take with a class
+attribute, e.g. ``query_budget = 6`` or ``query_budget = {'GET': 4}``.
+QueryCountMiddleware reports every request to Prometheus and, in DEBUG, adds
+X-Query-* response headers; assert_max_queries() enforces a budget in tests
+and in the check_query_budgets command.
+"""
+import re
+from collections import Counter
+from contextlib import contextmanager, ExitStack
+
+from django.db import connections
+
+# A shape issued this many times in one request is reported as an N+1 pattern
+REPEATED_QUERY_THRESHOLD = 5
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+def query_shape(sql):
+    """The SQL of a query with the length of IN (...) lists normalized away"""
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+class QueryCollector:
+    """Execute wrapper recording the number and shapes of queries"""
+
+    def __init__(self):
+        self.count = 0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        self.shapes[query_shape(sql)] += 1
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold=REPEATED_QUERY_THRESHOLD):
+        """[(shape, times)] of the shapes issued at least threshold times, most repeated first"""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+    @contextmanager
+    def installed(self):
+        """Collect the queries of every configured database while the block runs"""
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+
+def query_budget_of(view_func, method='GET'):
+    """The query_budget declared by the view class behind a resolved view function.
+
+    A view declares either one budget for every method or a {method: budget} dict.
+    """
+    view_class = getattr(view_func, 'view_class', None) or getattr(view_func, 'cls', None)
+    budget = getattr(view_class, 'query_budget', None)
+    if isinstance(budget, dict):
+        return budget.get(method.upper())
+    return budget
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def assert_max_queries(budget, threshold=REPEATED_QUERY_THRESHOLD, label=''):
+    """Fail when the block runs more than budget queries or repeats a query shape.
+
+        with assert_max_queries(6, label='graduate-database'):
+            client.get(url)
+    """
+    collector = QueryCollector()
+    with collector.installed():
+        yield collector
+
+    problems = []
+    if budget is not None and collector.count > budget:
+        problems.append(f'{collector.count} queries, budget is {budget}')
+    for shape, times in collector.repeated(threshold):
+        problems.append(f'repeated {times}x: {shape[:300]}')
+    if problems:
+        prefix = f'{label}: ' if label else ''
+        raise QueryBudgetExceeded(prefix + '\n  '.join(problems))
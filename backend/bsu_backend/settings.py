@@ -61,6 +61,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django_prometheus.middleware.PrometheusBeforeMiddleware',
+    'bsu_backend.middleware.QueryCountMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -168,6 +169,18 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Initial (national ID) passwords of bulk-created accounts use a cheap hasher
+# and are upgraded to the default on first login - see users/hashers.py
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'users.hashers.InitialPasswordHasher',
+]
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
 
@@ -193,6 +206,11 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Background job uploads and generated files (student lists, grade exports,
+# result transcripts). Kept outside MEDIA_ROOT so nothing serves them publicly;
+# they are only streamed through the job download endpoint.
+JOB_FILES_ROOT = os.environ.get('JOB_FILES_ROOT', str(BASE_DIR / 'private'))
+
 # Azure Blob Storage for media files (production on Azure Container Apps)
 # Set AZURE_STORAGE_CONNECTION_STRING env var to enable
 AZURE_STORAGE_CONNECTION_STRING = os.environ.get('AZURE_STORAGE_CONNECTION_STRING')
@@ -204,6 +222,14 @@ if AZURE_STORAGE_CONNECTION_STRING:
         "staticfiles": {
             "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
         },
+        # Job files go to their own container, which must not allow public access
+        "jobs": {
+            "BACKEND": "storages.backends.azure_storage.AzureStorage",
+            "OPTIONS": {
+                "azure_container": os.environ.get('AZURE_JOBS_CONTAINER', 'jobs'),
+                "expiration_secs": 300,
+            },
+        },
     }
     AZURE_CONTAINER = os.environ.get('AZURE_STORAGE_CONTAINER', 'media')
     AZURE_URL_EXPIRATION_SECS = None  # Public blobs, no expiration
@@ -245,6 +271,10 @@ else:
         "http://127.0.0.1",
     ]
 CORS_ALLOW_CREDENTIALS = True
+# Conditional polling (ETag / If-None-Match) on the grades grid
+from corsheaders.defaults import default_headers
+CORS_ALLOW_HEADERS = (*default_headers, 'if-none-match')
+CORS_EXPOSE_HEADERS = ['ETag']
 # CSRF - read from environment or use defaults for development
 CSRF_TRUSTED_ORIGINS_ENV = os.getenv('CSRF_TRUSTED_ORIGINS', '')
 if CSRF_TRUSTED_ORIGINS_ENV:
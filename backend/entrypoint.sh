@@ -35,6 +35,13 @@ else:
     print('WARNING: Could not connect to Redis. Sessions will fall back to database.')
 "
 
+# Background job worker: the backend container runs migrations and seeds
+# ("with-worker" runs the worker next to gunicorn for single-service deploys like Railway)
+if [ "$1" = "worker" ]; then
+    echo "Starting background job worker..."
+    exec python manage.py run_jobs
+fi
+
 # Ensure all migration directories are proper Python packages
 # (needed because .gitignore may exclude __init__.py files)
 for dir in */migrations/; do
@@ -94,6 +101,18 @@ if [ -f "seed_subjects.py" ]; then
     python seed_subjects.py || echo "Warning: seed_subjects.py failed"
 fi
 
+# Single-service deploys have no worker container: keep one running alongside gunicorn
+if [ "$1" = "with-worker" ]; then
+    echo "Starting background job worker alongside the server..."
+    (
+        while true; do
+            python manage.py run_jobs || true
+            echo "Background job worker exited, restarting in 5 seconds..."
+            sleep 5
+        done
+    ) &
+fi
+
 # Start the server
 echo "Starting gunicorn on port ${PORT:-8000}..."
 exec gunicorn bsu_backend.wsgi:application --bind 0.0.0.0:${PORT:-8000} --workers 2 --timeout 120 --access-logfile - --error-logfile -
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('graduate_affairs', '0002_notification'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='graduaterequest',
+            index=models.Index(fields=['status', 'request_type'], name='graduate_af_status_bfd8c0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='graduaterequest',
+            index=models.Index(fields=['graduate', 'created_at'], name='graduate_af_graduat_a6dfcf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'is_read'], name='graduate_af_recipie_f3f7b0_idx'),
+        ),
+    ]
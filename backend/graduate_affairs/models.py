@@ -51,6 +51,10 @@ class GraduateRequest(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'request_type']),
+            models.Index(fields=['graduate', 'created_at']),
+        ]
 
     def __str__(self):
         return f"{self.get_request_type_display()} - {self.graduate.username} ({self.get_status_display()})"
@@ -345,6 +349,9 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipient', 'is_read']),
+        ]
 
     def __str__(self):
         return f"[{self.get_notification_type_display()}] {self.recipient.username}: {self.title}"
@@ -2,7 +2,6 @@
 Graduate Affairs API Views
 Handles graduate requests, certificate management, clearance, database, and stats.
 """
-import io
 import os
 import zipfile
 
@@ -11,7 +10,6 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from django.db.models import Q, Count
 from django.utils import timezone
@@ -24,7 +22,8 @@ from .serializers import (
     GraduateRequestSerializer, GraduationClearanceSerializer,
     GraduateInfoUpdateRequestSerializer, StudentGraduateRequestSerializer
 )
-from academic.models import Student, Certificate, AuditLog, UploadHistory
+from academic.models import Student, Certificate, AuditLog, UploadHistory, BackgroundJob
+from academic.jobs import enqueue, job_accepted
 from users.permissions import IsGraduateAffairsRole, IsStudentRole
 from rest_framework.permissions import IsAuthenticated
 
@@ -238,6 +237,7 @@ class StudentGraduateRequestViewSet(viewsets.ModelViewSet):
 class GraduateDatabaseView(APIView):
     """List and search graduates (fourth-year students)"""
     permission_classes = [IsGraduateAffairsRole]
+    query_budget = 8
 
     def get(self, request):
         queryset = Student.objects.filter(
@@ -265,10 +265,17 @@ class GraduateDatabaseView(APIView):
         if graduation_status:
             queryset = queryset.filter(user__graduation_status=graduation_status)
 
+        students = list(queryset)
+        user_ids = [s.user_id for s in students if s.user_id]
+        certificates = {}
+        for cert in Certificate.objects.filter(student_id__in=user_ids).order_by('id'):
+            certificates.setdefault(cert.student_id, cert)
+        clearances = {c.graduate_id: c for c in GraduationClearance.objects.filter(graduate_id__in=user_ids)}
+
         graduates = []
-        for student in queryset:
-            cert = Certificate.objects.filter(student=student.user).first()
-            clearance = GraduationClearance.objects.filter(graduate=student.user).first()
+        for student in students:
+            cert = certificates.get(student.user_id)
+            clearance = clearances.get(student.user_id)
 
             graduates.append({
                 'id': student.id,
@@ -371,6 +378,7 @@ class StudentClearanceView(APIView):
 class CertificateListView(APIView):
     """List all certificates with graduate info"""
     permission_classes = [IsGraduateAffairsRole]
+    query_budget = 6
 
     def get(self, request):
         certificates = Certificate.objects.select_related('student').all()
@@ -383,9 +391,16 @@ class CertificateListView(APIView):
                 Q(student__username__icontains=search)
             )
 
+        certificates = list(certificates)
+        student_records = {}
+        for record in Student.objects.filter(
+            user_id__in={cert.student_id for cert in certificates}
+        ).select_related('department').order_by('id'):
+            student_records.setdefault(record.user_id, record)
+
         result = []
         for cert in certificates:
-            student_record = Student.objects.filter(user=cert.student).first()
+            student_record = student_records.get(cert.student_id)
             result.append({
                 'id': cert.id,
                 'student_id': cert.student.id,
@@ -404,6 +419,7 @@ class BulkCertificateUploadView(APIView):
     """
     Upload certificates in bulk via ZIP file.
     Each PDF in the ZIP is named <national_id>.pdf.
+    The ZIP is ingested by the background job worker.
     """
     parser_classes = (MultiPartParser, FormParser)
     permission_classes = [IsGraduateAffairsRole]
@@ -422,67 +438,14 @@ class BulkCertificateUploadView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            zf = zipfile.ZipFile(io.BytesIO(zip_file.read()))
-        except zipfile.BadZipFile:
+        if not zipfile.is_zipfile(zip_file):
             return Response(
                 {'error': 'ملف ZIP غير صالح'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        created_count = 0
-        errors = []
-        pdf_names = [n for n in zf.namelist() if n.lower().endswith('.pdf')]
-
-        for pdf_name in pdf_names:
-            try:
-                national_id = pdf_name.rsplit('.', 1)[0].strip()
-                if '/' in national_id:
-                    national_id = national_id.rsplit('/', 1)[1]
-
-                try:
-                    student = Student.objects.get(national_id=national_id)
-                except Student.DoesNotExist:
-                    errors.append(f'{pdf_name}: الطالب بالرقم القومي {national_id} غير موجود')
-                    continue
-
-                if not student.user:
-                    errors.append(f'{pdf_name}: الطالب ليس لديه حساب مستخدم')
-                    continue
-
-                pdf_content = zf.read(pdf_name)
-                cert_file = ContentFile(pdf_content, name=f'{national_id}.pdf')
-
-                Certificate.objects.create(
-                    student=student.user,
-                    file=cert_file,
-                    description=f'شهادة مرفوعة بالجملة - {student.full_name}',
-                )
-                created_count += 1
-
-            except Exception as e:
-                errors.append(f'{pdf_name}: {str(e)}')
-
-        try:
-            UploadHistory.objects.create(
-                upload_type='CERTIFICATE',
-                file_name=zip_file.name,
-                uploaded_by=request.user,
-                total_rows=len(pdf_names),
-                created_count=created_count,
-                updated_count=0,
-                error_count=len(errors),
-                errors_json=errors if errors else None,
-            )
-        except Exception:
-            pass
-
-        return Response({
-            'message': f'تم رفع {created_count} شهادة بنجاح',
-            'created_count': created_count,
-            'error_count': len(errors),
-            'errors': errors,
-        }, status=status.HTTP_201_CREATED)
+        job = enqueue(BackgroundJob.JobType.CERTIFICATE_ZIP, request.user, upload=zip_file)
+        return job_accepted(job)
 
 
 class SyncCertificatesFromStorageView(APIView):
@@ -0,0 +1,22 @@
+"""
+Password hashing for provisioned accounts.
+
+Bulk uploads create accounts whose initial password is the national ID.
+Hashing those with the full PBKDF2 work factor dominated large imports, so
+they are stored with InitialPasswordHasher instead. The hasher is listed
+after the default in PASSWORD_HASHERS, so Django re-hashes the password
+with the default hasher on the first successful login, and users must
+change the password on first login anyway (first_login_required).
+"""
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+
+
+class InitialPasswordHasher(PBKDF2PasswordHasher):
+    """Low work-factor PBKDF2 for initial passwords, upgraded on first login"""
+    algorithm = 'pbkdf2_sha256_initial'
+    iterations = 1000
+
+
+def make_initial_password(raw_password):
+    """Encoded initial password for a new or reset account"""
+    return make_password(raw_password, hasher=InitialPasswordHasher.algorithm)
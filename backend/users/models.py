@@ -37,7 +37,8 @@ class User(AbstractUser):
         if is_new and not self.is_superuser:
             # Set default password to national_id or username if not provided
             if not self.password or self.password == '!':
-                self.set_password(self.national_id or self.username)
+                from .hashers import make_initial_password
+                self.password = make_initial_password(self.national_id or self.username)
             
             # Require password change on first login for staff users AND students
             if self.role in ['STUDENT', 'STUDENT_AFFAIRS', 'STAFF_AFFAIRS', 'DOCTOR', 'HOD', 'DEAN', 'GRADUATE_AFFAIRS']:
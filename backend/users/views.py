@@ -47,19 +47,24 @@ class GetCSRFToken(APIView):
 class PublicStaffView(APIView):
     """Public endpoint to list staff with department info"""
     permission_classes = [permissions.AllowAny]
+    query_budget = 4
 
     def get(self, request):
         from academic.models import CourseOffering
         
-        users = User.objects.filter(role__in=['DOCTOR', 'STAFF'])
+        users = list(User.objects.filter(role__in=['DOCTOR', 'STAFF']))
+
+        # Department of each doctor's first course offering
+        departments = {}
+        for doctor_id, dept_name in CourseOffering.objects.filter(
+            doctor__in=users
+        ).order_by('doctor_id', 'id').values_list('doctor_id', 'level__department__name'):
+            departments.setdefault(doctor_id, dept_name)
+
         result = []
         
         for user in users:
-            # Get department from first course offering
-            dept_name = None
-            offering = CourseOffering.objects.filter(doctor=user).select_related('level__department').first()
-            if offering and offering.level and offering.level.department:
-                dept_name = offering.level.department.name
+            dept_name = departments.get(user.id)
             
             result.append({
                 'id': user.id,
@@ -328,67 +333,71 @@ class UploadUsersView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        from django.db import transaction
+        from academic.spreadsheet import iter_spreadsheet, check_upload, SpreadsheetError
         try:
-            import openpyxl
-            import csv
-            import io
+            check_upload(file)
+        except SpreadsheetError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
             users_created = []
             errors = []
 
-            if file.name.endswith('.csv'):
-                decoded = file.read().decode('utf-8')
-                reader = csv.DictReader(io.StringIO(decoded))
-                rows = list(reader)
-            else:
-                wb = openpyxl.load_workbook(file)
-                ws = wb.active
-                headers = [cell.value for cell in ws[1]]
-                rows = []
-                for row in ws.iter_rows(min_row=2, values_only=True):
-                    rows.append(dict(zip(headers, row)))
-
-            for i, row in enumerate(rows, start=2):
-                try:
-                    username = str(row.get('username', '') or '').strip()
-                    national_id = str(row.get('national_id', '') or '').strip()
-                    first_name = str(row.get('first_name', '') or '').strip()
-                    last_name = str(row.get('last_name', '') or '').strip()
-                    email = str(row.get('email', '') or '').strip()
-                    role = str(row.get('role', 'STUDENT') or 'STUDENT').strip().upper()
-
-                    if not username:
-                        errors.append(f'Row {i}: username is required')
-                        continue
-
-                    if User.objects.filter(username=username).exists():
-                        errors.append(f'Row {i}: username "{username}" already exists')
-                        continue
-
-                    if national_id and User.objects.filter(national_id=national_id).exists():
-                        errors.append(f'Row {i}: national_id "{national_id}" already exists')
-                        continue
-
-                    # Validate role
-                    valid_roles = [choice[0] for choice in User.Role.choices]
-                    if role not in valid_roles:
-                        errors.append(f'Row {i}: invalid role "{role}". Valid roles: {", ".join(valid_roles)}')
-                        continue
-
-                    user = User(
-                        username=username,
-                        national_id=national_id or None,
-                        first_name=first_name,
-                        last_name=last_name,
-                        email=email,
-                        role=role,
-                    )
-                    # Password defaults to national_id via the model's save() method
-                    user.save()
-                    users_created.append(username)
+            # Rows are read in bounded batches; empty cells come back as None
+            rows = (
+                (index + 2, row)
+                for batch in iter_spreadsheet(file, text_columns=('username', 'national_id'))
+                for index, row in zip(batch.index, batch.to_dict('records'))
+            )
 
-                except Exception as e:
-                    errors.append(f'Row {i}: {str(e)}')
+            # A file over the limits is rejected as a whole: no user is kept
+            try:
+                with transaction.atomic():
+                    for i, row in rows:
+                        try:
+                            username = str(row.get('username', '') or '').strip()
+                            national_id = str(row.get('national_id', '') or '').strip()
+                            first_name = str(row.get('first_name', '') or '').strip()
+                            last_name = str(row.get('last_name', '') or '').strip()
+                            email = str(row.get('email', '') or '').strip()
+                            role = str(row.get('role', 'STUDENT') or 'STUDENT').strip().upper()
+
+                            if not username:
+                                errors.append(f'Row {i}: username is required')
+                                continue
+
+                            if User.objects.filter(username=username).exists():
+                                errors.append(f'Row {i}: username "{username}" already exists')
+                                continue
+
+                            if national_id and User.objects.filter(national_id=national_id).exists():
+                                errors.append(f'Row {i}: national_id "{national_id}" already exists')
+                                continue
+
+                            # Validate role
+                            valid_roles = [choice[0] for choice in User.Role.choices]
+                            if role not in valid_roles:
+                                errors.append(f'Row {i}: invalid role "{role}". Valid roles: {", ".join(valid_roles)}')
+                                continue
+
+                            user = User(
+                                username=username,
+                                national_id=national_id or None,
+                                first_name=first_name,
+                                last_name=last_name,
+                                email=email,
+                                role=role,
+                            )
+                            # Password defaults to national_id via the model's save() method
+                            with transaction.atomic():
+                                user.save()
+                            users_created.append(username)
+
+                        except Exception as e:
+                            errors.append(f'Row {i}: {str(e)}')
+            except SpreadsheetError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
             return Response({
                 'message': f'Successfully created {len(users_created)} users',
@@ -7,6 +7,7 @@ import FileDownloadIcon from '@mui/icons-material/FileDownload';
 import ArrowBackIcon from '@mui/icons-material/ArrowBack';
 import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
+import { waitForJob, downloadJobFile } from '../../../utils/jobs';
 
 export default function DeanExportData() {
     const navigate = useNavigate();
@@ -55,19 +56,10 @@ export default function DeanExportData() {
                 ? `/api/academic/export/?academic_year_id=${id}` 
                 : `/api/academic/export/?term_id=${id}`;
                 
-            const response = await axios.get(url, {
-                ...config,
-                responseType: 'blob'
-            });
-            
-            const blob = new Blob([response.data], { type: 'application/zip' });
-            const downloadUrl = window.URL.createObjectURL(blob);
-            const link = document.createElement('a');
-            link.href = downloadUrl;
-            link.setAttribute('download', `${type}_${id}_database_export.zip`);
-            document.body.appendChild(link);
-            link.click();
-            link.remove();
+            // The ZIP is built by a background job
+            const response = await axios.get(url, config);
+            const job = await waitForJob(response, { config });
+            await downloadJobFile(job, job.result?.file_name || `${type}_${id}_database_export.zip`, config);
         } catch (err) {
             console.error('Export error:', err);
             setError('فشل في تصدير البيانات');
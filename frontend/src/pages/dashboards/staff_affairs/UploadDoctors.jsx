@@ -16,6 +16,7 @@ import {
 } from '@mui/icons-material';
 import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
+import { waitForJob } from '../../../utils/jobs';
 
 // Animations
 const float = keyframes`
@@ -63,7 +64,8 @@ const UploadDoctors = () => {
                     },
                 }
             );
-            setResult(response.data);
+            const job = await waitForJob(response);
+            setResult(job.result);
         } catch (err) {
             setError(err.response?.data?.error || 'حدث خطأ أثناء رفع الملف');
         } finally {
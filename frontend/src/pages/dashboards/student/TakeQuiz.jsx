@@ -43,6 +43,9 @@ const confetti = keyframes`
   100% { transform: translateY(-100px) rotate(360deg); opacity: 0; }
 `;
 
+// Answers are autosaved this long after the last change
+const AUTOSAVE_DELAY_MS = 3000;
+
 export default function TakeQuiz() {
     const { quizId } = useParams();
     const navigate = useNavigate();
@@ -56,6 +59,7 @@ export default function TakeQuiz() {
     const [currentQuestion, setCurrentQuestion] = useState(0);
     const [timeLeft, setTimeLeft] = useState(null);
     const [showAllQuestions, setShowAllQuestions] = useState(false);
+    const [unsaved, setUnsaved] = useState(false);
 
     const token = localStorage.getItem('access_token');
     const config = { headers: { Authorization: `Bearer ${token}` }, withCredentials: true };
@@ -67,7 +71,11 @@ export default function TakeQuiz() {
     // Timer effect
     useEffect(() => {
         if (quiz?.time_limit_minutes && timeLeft === null) {
-            setTimeLeft(quiz.time_limit_minutes * 60);
+            // The server enforces the deadline; reloading the page doesn't restart the timer
+            const remaining = quiz.expires_at
+                ? Math.floor((new Date(quiz.expires_at).getTime() - Date.now()) / 1000)
+                : quiz.time_limit_minutes * 60;
+            setTimeLeft(Math.max(remaining, 1));
         }
     }, [quiz]);
 
@@ -92,6 +100,12 @@ export default function TakeQuiz() {
         try {
             const res = await axios.get(`/api/academic/student/quizzes/${quizId}/attempt/`, config);
             setQuiz(res.data);
+            // Restore the answers autosaved before a reload or crash
+            const saved = {};
+            (res.data.saved_answers || []).forEach(({ question_id, ...answer }) => {
+                saved[question_id] = answer;
+            });
+            setAnswers(saved);
         } catch (err) {
             setError(err.response?.data?.error || 'فشل في تحميل الكويز');
         } finally {
@@ -104,21 +118,42 @@ export default function TakeQuiz() {
             ...prev,
             [questionId]: isEssay ? { essay_answer: value } : { choice_id: value }
         }));
+        setUnsaved(true);
     };
 
+    const formatAnswers = () => Object.entries(answers).map(([questionId, answer]) => ({
+        question_id: parseInt(questionId),
+        ...answer
+    }));
+
+    // Autosave effect
+    useEffect(() => {
+        if (!unsaved || result) return;
+
+        const timer = setTimeout(async () => {
+            setUnsaved(false);
+            try {
+                await axios.post(
+                    `/api/academic/student/quizzes/${quizId}/autosave/`,
+                    { answers: formatAnswers() },
+                    config
+                );
+            } catch (err) {
+                // Best effort: the final submit carries every answer anyway
+            }
+        }, AUTOSAVE_DELAY_MS);
+
+        return () => clearTimeout(timer);
+    }, [answers, unsaved]);
+
     const handleSubmit = async () => {
         setSubmitting(true);
         setError('');
 
-        const formattedAnswers = Object.entries(answers).map(([questionId, answer]) => ({
-            question_id: parseInt(questionId),
-            ...answer
-        }));
-
         try {
             const res = await axios.post(
                 `/api/academic/student/quizzes/${quizId}/attempt/`,
-                { answers: formattedAnswers },
+                { answers: formatAnswers() },
                 config
             );
             setResult(res.data);
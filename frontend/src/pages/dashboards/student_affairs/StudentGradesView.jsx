@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
     Box, Container, Typography, Paper, Button, FormControl, Select, MenuItem,
     Table, TableBody, TableCell, TableContainer, TableHead, TableRow,
@@ -41,6 +41,7 @@ export default function StudentGradesView() {
     const [loadingData, setLoadingData] = useState(true);
     const [error, setError] = useState('');
     const [gradesData, setGradesData] = useState(null);
+    const gradesEtag = useRef(null); // ETag of the grid currently displayed
 
     const token = localStorage.getItem('access_token');
     const config = { headers: { Authorization: `Bearer ${token}` }, withCredentials: true };
@@ -133,6 +134,7 @@ export default function StudentGradesView() {
             setLoading(true);
             setError('');
             setGradesData(null);
+            gradesEtag.current = null;
         }
 
         try {
@@ -144,7 +146,17 @@ export default function StudentGradesView() {
                 url += `&specialization=${selectedSpecialization}`;
             }
 
-            const res = await axios.get(url, config);
+            // Polls revalidate with the last ETag; 304 means the grid is unchanged
+            const pollConfig = {
+                ...config,
+                headers: silent && gradesEtag.current
+                    ? { ...config.headers, 'If-None-Match': gradesEtag.current }
+                    : config.headers,
+                validateStatus: (s) => (s >= 200 && s < 300) || s === 304,
+            };
+            const res = await axios.get(url, pollConfig);
+            if (res.status === 304) return;
+            gradesEtag.current = res.headers.etag || null;
             setGradesData(res.data);
         } catch (err) {
             console.error(err);
@@ -17,6 +17,7 @@ import InsertDriveFileIcon from '@mui/icons-material/InsertDriveFile';
 import CheckCircleIcon from '@mui/icons-material/CheckCircle';
 import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
+import { waitForJob } from '../../../utils/jobs';
 
 // Animations
 const float = keyframes`
@@ -116,9 +117,10 @@ export default function UploadExamGrades() {
                 withCredentials: true,
                 headers: { 'Content-Type': 'multipart/form-data' }
             });
-            setSuccess(res.data.message);
-            if (res.data.errors && res.data.errors.length > 0) {
-                setError(`بعض الأخطاء: ${res.data.errors.join(', ')}`);
+            const { result } = await waitForJob(res);
+            setSuccess(result.message);
+            if (result.errors && result.errors.length > 0) {
+                setError(`بعض الأخطاء: ${result.errors.join(', ')}`);
             }
             setFile(null);
         } catch (err) {
@@ -23,6 +23,7 @@ import WarningIcon from '@mui/icons-material/Warning';
 import CancelIcon from '@mui/icons-material/Cancel';
 import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
+import { waitForJob } from '../../../utils/jobs';
 
 // Animations
 const float = keyframes`
@@ -198,7 +199,12 @@ export default function UploadStudents() {
         }
 
         const formData = new FormData();
-        formData.append('file', file);
+        // The preview already parsed the file; commit it by token and send the file only as fallback
+        if (previewData?.upload_token) {
+            formData.append('upload_token', previewData.upload_token);
+        } else {
+            formData.append('file', file);
+        }
         formData.append('department_id', selectedDepartment);
         formData.append('academic_year_id', selectedYear);
         if (selectedLevel !== 'multi') {
@@ -218,7 +224,8 @@ export default function UploadStudents() {
                 ...config,
                 headers: { ...config.headers, 'Content-Type': 'multipart/form-data' }
             });
-            setResult(response.data);
+            const job = await waitForJob(response, { config });
+            setResult(job.result);
             setFile(null);
             setPreviewData(null);
         } catch (err) {
@@ -680,7 +687,7 @@ export default function UploadStudents() {
                                 )}
                                 <Chip
                                     icon={previewData.can_upload ? <CheckCircleIcon /> : <WarningIcon />}
-                                    label={previewData.can_upload ? 'يمكن الرفع' : 'يوجد أخطاء'}
+                                    label={previewData.can_upload ? 'يمكن الرفع' : `يوجد أخطاء في ${previewData.invalid_rows || 0} صف`}
                                     color={previewData.can_upload ? 'success' : 'error'}
                                     sx={{ fontFamily: 'Cairo', fontWeight: 'bold', fontSize: '1rem', py: 1 }}
                                 />
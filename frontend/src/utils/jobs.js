@@ -0,0 +1,52 @@
+import axios from 'axios';
+
+/**
+ * Heavy uploads and exports run as background jobs on the backend.
+ * Those endpoints answer 202 with a `status_url`; these helpers poll it
+ * until the job finishes.
+ */
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+/**
+ * Wait for the job behind a 202 response and return the finished job.
+ * Responses without a job are returned as-is (their data is the result).
+ * A failed job throws an error shaped like an axios error so callers can keep
+ * reading `err.response.data.error`.
+ */
+export async function waitForJob(response, { config = { withCredentials: true }, onProgress, interval = 1500 } = {}) {
+    const statusUrl = response?.data?.status_url;
+    if (response?.status !== 202 || !statusUrl) {
+        return { result: response?.data };
+    }
+
+    for (;;) {
+        await sleep(interval);
+        const { data: job } = await axios.get(statusUrl, config);
+        if (onProgress) onProgress(job);
+
+        if (job.status === 'SUCCEEDED') {
+            return job;
+        }
+        if (job.status === 'FAILED') {
+            const error = new Error(job.error || 'Job failed');
+            error.response = { data: { error: job.error || 'فشلت العملية. يرجى المحاولة مرة أخرى.' } };
+            throw error;
+        }
+    }
+}
+
+/**
+ * Download the file produced by a finished job.
+ */
+export async function downloadJobFile(job, fileName, config = { withCredentials: true }) {
+    const response = await axios.get(job.download_url, { ...config, responseType: 'blob' });
+    const url = window.URL.createObjectURL(new Blob([response.data]));
+    const link = document.createElement('a');
+    link.href = url;
+    link.setAttribute('download', fileName || job.result?.file_name || 'download');
+    document.body.appendChild(link);
+    link.click();
+    link.remove();
+    window.URL.revokeObjectURL(url);
+}